@@ -0,0 +1,53 @@
+"""
+Indexed storage for the /activities endpoints.
+
+Activities are appended to a single log in the order they are created, which is
+also their time order, so the log never needs sorting. Each agent_id keeps an
+`array('q')` of positions into that log, so a filtered, limited query walks
+only that agent's rows, newest first.
+"""
+from array import array
+from typing import Dict, Iterator, List, Optional
+import itertools
+import threading
+
+
+class ActivityStore:
+    """Append-only activity log with a per-agent secondary index"""
+
+    def __init__(self):
+        self._log: List[dict] = []
+        self._by_agent: Dict[str, array] = {}
+        self._lock = threading.Lock()
+
+    def append(self, activity: dict) -> dict:
+        with self._lock:
+            position = len(self._log)
+            self._log.append(activity)
+            index = self._by_agent.get(activity["agent_id"])
+            if index is None:
+                index = self._by_agent[activity["agent_id"]] = array("q")
+            index.append(position)
+        return activity
+
+    def latest(self, agent_id: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """Return the newest `limit` activities, optionally for one agent"""
+        with self._lock:
+            return list(itertools.islice(self._newest(agent_id), limit))
+
+    def _newest(self, agent_id: Optional[str]) -> Iterator[dict]:
+        if agent_id is None:
+            return reversed(self._log)
+        index = self._by_agent.get(agent_id)
+        if index is None:
+            return iter(())
+        return (self._log[position] for position in reversed(index))
+
+    def count(self, agent_id: Optional[str] = None) -> int:
+        if agent_id is None:
+            return len(self._log)
+        index = self._by_agent.get(agent_id)
+        return len(index) if index is not None else 0
+
+    def __len__(self) -> int:
+        return len(self._log)
@@ -0,0 +1,130 @@
+"""
+Bulk ingest helpers for the `POST /metrics:batch` and `POST /activities:batch`
+endpoints.
+
+A batch body is either a JSON array of records or, with
+`Content-Type: application/x-ndjson`, one JSON record per line. NDJSON bodies
+are consumed as a stream, so a request with many thousands of records is
+validated and handed to storage in chunks instead of being buffered whole.
+Every item gets its own status in the response; one bad record does not fail
+the batch.
+"""
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import json
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class ItemError:
+    """Marks a batch item that could not be decoded"""
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+async def read_items(request: Request, max_items: int) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (index, item) pairs from a JSON array or NDJSON body"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        async for index, item in _ndjson_items(request):
+            if index >= max_items:
+                # Earlier chunks may already be stored, so no 413: report the
+                # overflow once and leave the rest of the body unread
+                yield index, ItemError(f"Batch limit of {max_items} items exceeded; "
+                                       f"this line and any after it were not read")
+                return
+            yield index, item
+        return
+
+    try:
+        data = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array")
+    if not isinstance(data, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array")
+    if len(data) > max_items:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {max_items} items")
+    for index, item in enumerate(data):
+        yield index, item
+
+
+async def _ndjson_items(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    index = 0
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield index, _decode_line(line)
+                index += 1
+    if pending.strip():
+        yield index, _decode_line(pending)
+
+
+def _decode_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return ItemError(f"Invalid JSON: {exc}")
+
+
+async def ingest(
+    request: Request,
+    model: type,
+    build_record: Callable[[BaseModel, str], dict],
+    sink: Callable[[List[dict]], Optional[Dict[str, str]]],
+    max_items: int = 10000,
+    chunk_size: int = 1000,
+) -> dict:
+    """Validate every item of a batch body and insert the valid ones in chunks.
+
+    `sink` may return {record id: reason} for records the storage schema
+    refused; those items are reported as errors.
+    """
+    now = datetime.now().isoformat()  # one timestamp for the whole batch
+    results = []
+    chunk: List[dict] = []
+    chunk_results: List[dict] = []  # the "created" results of the records in `chunk`
+    created = 0
+
+    async def store(records: List[dict], stored: List[dict]) -> int:
+        rejected = await run_in_threadpool(sink, records) or {}
+        for result in stored:
+            if result["id"] in rejected:
+                reason = rejected[result.pop("id")]
+                result.update(status="error", errors=[{"msg": reason}])
+        return len(records) - len(rejected)
+
+    async for index, item in read_items(request, max_items):
+        if isinstance(item, ItemError):
+            results.append({"index": index, "status": "error", "errors": [{"msg": item.message}]})
+            continue
+        if not isinstance(item, dict):
+            results.append({"index": index, "status": "error", "errors": [{"msg": "Item must be a JSON object"}]})
+            continue
+        try:
+            parsed = model(**item)
+        except ValidationError as exc:
+            # NaN/Infinity inputs are echoed back as strings, so the response stays valid JSON
+            results.append({"index": index, "status": "error", "errors": json.loads(exc.json(), parse_constant=str)})
+            continue
+
+        record = build_record(parsed, now)
+        chunk.append(record)
+        chunk_results.append({"index": index, "status": "created", "id": record["id"]})
+        results.append(chunk_results[-1])
+        if len(chunk) >= chunk_size:
+            created += await store(chunk, chunk_results)
+            chunk, chunk_results = [], []
+
+    if chunk:
+        created += await store(chunk, chunk_results)
+
+    return {"created": created, "failed": len(results) - created, "results": results}
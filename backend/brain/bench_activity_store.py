@@ -0,0 +1,80 @@
+"""
+Benchmark: GET /activities query cost as the activity log grows.
+
+Compares the old copy + filter + sort approach with ActivityStore for a
+filtered (per-agent) and an unfiltered query at several log sizes.
+
+Usage: python bench_activity_store.py [--sizes 10000,100000,1000000] [--agents 50]
+"""
+from datetime import datetime, timedelta
+import argparse
+import random
+import time
+import uuid
+
+from activity_store import ActivityStore
+
+
+def build_rows(count, agents):
+    start = datetime(2026, 1, 1)
+    agent_ids = [str(uuid.uuid4()) for _ in range(agents)]
+    rows = [
+        {
+            "id": str(i),
+            "agent_id": random.choice(agent_ids),
+            "activity_type": "decision",
+            "description": "benchmark row",
+            "metadata": {},
+            "created_at": (start + timedelta(milliseconds=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+    return rows, agent_ids
+
+
+def linear_query(rows, agent_id, limit):
+    """The pre-index implementation of get_activities"""
+    activities = list(rows)
+    if agent_id:
+        activities = [a for a in activities if a.get("agent_id") == agent_id]
+    activities.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+    return activities[:limit]
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e6  # microseconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'query':>10} {'linear (us)':>14} {'indexed (us)':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rows, agent_ids = build_rows(size, args.agents)
+        store = ActivityStore()
+        for row in rows:
+            store.append(row)
+        agent = agent_ids[0]
+
+        # The linear path is O(rows); don't spend minutes repeating it
+        linear_repeat = 1 if size >= 1_000_000 else args.repeat
+        for label, agent_id in (("by_agent", agent), ("all", None)):
+            linear = timed(lambda: linear_query(rows, agent_id, args.limit), linear_repeat)
+            indexed = timed(lambda: store.latest(agent_id, args.limit), args.repeat)
+            assert [a["id"] for a in store.latest(agent_id, args.limit)] == \
+                [a["id"] for a in linear_query(rows, agent_id, args.limit)]
+            print(f"{size:>10} {label:>10} {linear:>14.1f} {indexed:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
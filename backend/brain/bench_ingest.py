@@ -0,0 +1,70 @@
+"""
+Benchmark: ingest throughput of POST /metrics vs POST /metrics:batch.
+
+Runs the app in-process through FastAPI's TestClient, so the numbers exclude
+real network latency; the single-record path only gets worse over a network.
+Set STORAGE_URL to benchmark a durable backend (e.g. sqlite:///bench.db).
+
+Usage: python bench_ingest.py [--records 20000] [--batch-size 1000]
+"""
+import argparse
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def make_records(count):
+    return [{"metric_type": f"type_{i % 8}", "value": float(i), "metadata": {"i": i}}
+            for i in range(count)]
+
+
+def run_single(client, records):
+    for record in records:
+        client.post("/metrics", json=record).raise_for_status()
+
+
+def run_batch_json(client, records, batch_size):
+    for start in range(0, len(records), batch_size):
+        client.post("/metrics:batch", json=records[start:start + batch_size]).raise_for_status()
+
+
+def run_batch_ndjson(client, records, batch_size):
+    for start in range(0, len(records), batch_size):
+        body = "\n".join(json.dumps(r) for r in records[start:start + batch_size])
+        client.post("/metrics:batch", content=body,
+                    headers={"content-type": "application/x-ndjson"}).raise_for_status()
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    # The single-record path is slow; time it on a slice and extrapolate the rate
+    single_records = records[:min(len(records), 2000)]
+
+    with TestClient(main.app) as client:
+        runs = [
+            ("POST /metrics (1 per request)", lambda: run_single(client, single_records), len(single_records)),
+            ("POST /metrics:batch (JSON)", lambda: run_batch_json(client, records, args.batch_size), len(records)),
+            ("POST /metrics:batch (NDJSON)", lambda: run_batch_ndjson(client, records, args.batch_size), len(records)),
+        ]
+        baseline = None
+        print(f"{'path':<34} {'records':>8} {'seconds':>9} {'records/s':>11} {'speedup':>8}")
+        for label, fn, count in runs:
+            t0 = time.perf_counter()
+            fn()
+            main.storage.flush()
+            elapsed = time.perf_counter() - t0
+            rate = count / elapsed
+            baseline = baseline or rate
+            print(f"{label:<34} {count:>8} {elapsed:>9.2f} {rate:>11.0f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run()
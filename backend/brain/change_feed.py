@@ -0,0 +1,338 @@
+"""
+Change feed for the API's tables (campaigns, agents, metrics, activities).
+
+Handlers call `changes.publish(table, op, records)` after every create,
+update or delete. Each change gets the next version of a single,
+monotonically increasing counter and is serialized once; every subscriber
+of `GET /changes` receives the same pre-built Server-Sent Events frame, so
+N clients cost one JSON encoding instead of N polls of the full list.
+
+Changes to campaigns and agents carry the full records; the append-only
+metrics and activities streams publish only the new ids (with the
+version), since a batch can hold thousands of records: a client fetches
+the records it wants.
+
+A client resumes with `?since=<version>` (or the `Last-Event-ID` header an
+EventSource sends on reconnect) and is replayed the changes it missed from
+an in-memory history bounded by both `history` changes and
+`history_bytes` of frames (each change is kept only as its SSE frame). When that history no longer reaches back far
+enough, or the client falls `queue_size` changes behind, it gets a `reset`
+event carrying the current version: refetch the lists, then follow the feed
+from there.
+
+With Redis, versions come from one shared counter and changes are fanned
+out to every worker over pub/sub. A Lua script takes the version and
+publishes in one step, so workers see changes in version order; it also
+records each table's latest version in a hash, which a worker loads on
+start so its ETags reflect changes made before it came up. Each worker
+applies changes only as they arrive from its subscription; `publish` waits
+(up to `publish_timeout`) for its own change to come back, so a client that
+wrote and then reads sees a version that includes its write. Redis errors
+degrade to a per-worker feed.
+
+`epoch` names the version sequence (per process, or shared through Redis)
+and `table_versions` the latest version per table; together they make the
+list endpoints' ETags, and `delta()` turns the history into the records
+(or, for id-only changes, the ids) changed since a version.
+
+publish() is called from threadpool handlers; everything else runs on the
+event loop that called `start()`.
+"""
+from collections import deque
+from typing import AsyncIterator, Iterable, List, NamedTuple, Optional
+import asyncio
+import json
+import threading
+import uuid
+
+PUBLISH_SCRIPT = """
+local version = redis.call('incr', KEYS[1])
+redis.call('hset', KEYS[3], ARGV[2], version)
+redis.call('publish', KEYS[2], version .. ' ' .. ARGV[1])
+return version
+"""
+
+KEEPALIVE_SECONDS = 15
+
+
+class Change(NamedTuple):
+    version: int
+    table: str
+    frame: str  # the complete SSE frame, built once
+
+    def data(self) -> dict:
+        """The published JSON object, decoded from the frame"""
+        return json.loads(self.frame.split("data: ", 1)[1])
+
+
+def _frame(version: int, data: str) -> str:
+    # `data` is the JSON object published for the change; put the version first
+    return f'id: {version}\nevent: change\ndata: {{"version": {version}, {data[1:]}\n\n'
+
+
+def _reset_frame(version: int) -> str:
+    return f'id: {version}\nevent: reset\ndata: {{"version": {version}}}\n\n'
+
+
+class _Subscriber:
+    def __init__(self, tables: Optional[frozenset], queue_size: int):
+        self.tables = tables
+        self.queue = asyncio.Queue(queue_size)
+        self.last_version = 0
+        self.lagged = False
+
+
+class ChangeFeed:
+    def __init__(self, history: int = 10000, queue_size: int = 1000, prefix: str = "changes:",
+                 publish_timeout: float = 1.0, history_bytes: int = 32 * 1024 * 1024):
+        self.prefix = prefix
+        self.queue_size = queue_size
+        self.publish_timeout = publish_timeout
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]  # versions are only comparable within one epoch
+        self.table_versions = {}  # table -> version of its latest change
+        self.history = history
+        self.history_bytes = history_bytes
+        self._history = deque()
+        self._history_size = 0  # bytes of the frames in _history
+        self._floor = 0  # history holds every change after this version
+        self._cond = threading.Condition()
+        self._subscribers = set()
+        self._loop = None
+        self.redis = None
+        self._script = None
+        self._listener = None
+        self._stats = {"published": 0, "delivered": 0, "replayed": 0, "resets": 0,
+                       "lagged_subscribers": 0, "redis_errors": 0}
+
+    # ==================== LIFECYCLE ====================
+
+    async def start(self, redis_client=None):
+        """Bind to the serving loop; with a Redis client, share the feed across workers"""
+        self._loop = asyncio.get_running_loop()
+        if redis_client is None:
+            return
+        try:
+            self._script = redis_client.register_script(PUBLISH_SCRIPT)
+            await redis_client.set(f"{self.prefix}epoch", self.epoch, nx=True)
+            epoch = await redis_client.get(f"{self.prefix}epoch")
+            pubsub = redis_client.pubsub()
+            await pubsub.subscribe(self._channel())
+            # Versions published before this worker subscribed can't be replayed here,
+            # but the per-table versions still seed the ETags
+            async with redis_client.pipeline(transaction=True) as pipe:
+                version, tables = await pipe.get(self._version_key()).hgetall(self._tables_key()).execute()
+            with self._cond:
+                self.version = self._floor = int(version or 0)
+                self.table_versions = {table: int(v) for table, v in tables.items()}
+                self.epoch = epoch
+        except Exception as exc:
+            self._redis_error(exc)
+            return
+        self.redis = redis_client
+        self._listener = self._loop.create_task(self._listen(pubsub))
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def _version_key(self):
+        return f"{self.prefix}version"
+
+    def _tables_key(self):
+        return f"{self.prefix}tables"
+
+    def _channel(self):
+        return f"{self.prefix}events"
+
+    # ==================== PUBLISHING ====================
+
+    def publish(self, table: str, op: str, records: Iterable[dict] = (), ids: Iterable[str] = ()):
+        """Record a create/update/delete of `records` (or of `ids` alone: deletes, append-only streams)"""
+        records = list(records)
+        ids = list(ids) or [r["id"] for r in records]
+        data = json.dumps({"table": table, "op": op, "ids": ids, "records": records}, default=str)
+        self._stats["published"] += 1
+        if self.redis is not None and self._publish_redis(data, table):
+            return
+        with self._cond:
+            self._apply(self.version + 1, table, data)
+
+    def _publish_redis(self, data, table) -> bool:
+        """Publish through Redis and wait for the change to come back; False to publish locally"""
+        future = asyncio.run_coroutine_threadsafe(
+            self._script(keys=[self._version_key(), self._channel(), self._tables_key()],
+                         args=[data, table]), self._loop)
+        if self._on_loop():
+            return True  # can't block the loop; the listener applies it shortly
+        try:
+            version = int(future.result(self.publish_timeout))
+        except Exception as exc:
+            self._redis_error(exc)
+            return False
+        with self._cond:
+            self._cond.wait_for(lambda: self.version >= version, self.publish_timeout)
+        return True
+
+    async def _listen(self, pubsub):
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message or message["type"] != "message":
+                    continue
+                version, data = message["data"].split(" ", 1)
+                table = json.loads(data)["table"]
+                with self._cond:
+                    self._apply(int(version), table, data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            # Later changes are versioned locally, after the last one we saw
+            self._redis_error(exc)
+            self.redis = None
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+    def _apply(self, version: int, table: str, data: str):
+        """Append a change to the history and hand it to subscribers; caller holds _cond"""
+        if version <= self.version:
+            return  # already applied, or from before this worker subscribed
+        change = Change(version, table, _frame(version, data))
+        self._history.append(change)
+        self._history_size += len(change.frame)
+        while len(self._history) > self.history or self._history_size > self.history_bytes:
+            dropped = self._history.popleft()
+            self._history_size -= len(dropped.frame)
+            self._floor = dropped.version
+        self.version = version
+        self.table_versions[table] = version
+        self._cond.notify_all()
+        if self._loop is None or not self._subscribers:
+            return
+        if self._on_loop():
+            self._fanout(change)
+        else:
+            # Scheduled while holding the lock, so subscribers get changes in order
+            self._loop.call_soon_threadsafe(self._fanout, change)
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    # ==================== SUBSCRIBING ====================
+
+    def _fanout(self, change: Change):
+        for sub in list(self._subscribers):
+            if change.version <= sub.last_version or (sub.tables and change.table not in sub.tables):
+                continue
+            try:
+                sub.queue.put_nowait(change)
+            except asyncio.QueueFull:
+                # Too far behind to catch up from the queue: drop it and send a reset
+                self._subscribers.discard(sub)
+                self._stats["lagged_subscribers"] += 1
+                sub.lagged = True
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sub.queue.put_nowait(None)
+                continue
+            sub.last_version = change.version
+
+    def changes_since(self, since: int, tables: Optional[frozenset] = None) -> Optional[List[Change]]:
+        """Changes after `since`, or None when they are no longer all in the history"""
+        with self._cond:
+            if since < self._floor or since > self.version:
+                return None
+            return [c for c in self._history
+                    if c.version > since and (not tables or c.table in tables)]
+
+    def delta(self, table: str, since: int) -> Optional[dict]:
+        """Changes to `table` after `since`, None if not replayable:
+        {"changed": records created/updated, "changed_ids": ids of id-only changes, "deleted": ids}"""
+        backlog = self.changes_since(since, frozenset([table]))
+        if backlog is None:
+            return None
+        changed, changed_ids, deleted = {}, {}, set()
+        for change in backlog:
+            data = change.data()
+            if data["op"] == "delete":
+                for record_id in data["ids"]:
+                    changed.pop(record_id, None)
+                    changed_ids.pop(record_id, None)
+                    deleted.add(record_id)
+            elif data["records"]:
+                for record in data["records"]:
+                    changed[record["id"]] = record
+                    deleted.discard(record["id"])
+            else:
+                for record_id in data["ids"]:
+                    changed_ids[record_id] = None
+                    deleted.discard(record_id)
+        return {"changed": list(changed.values()), "changed_ids": list(changed_ids),
+                "deleted": sorted(deleted)}
+
+    async def stream(self, since: Optional[int] = None, tables: Optional[Iterable[str]] = None) -> AsyncIterator[str]:
+        """SSE frames: missed changes after `since`, then live ones, with keep-alives"""
+        tables = frozenset(tables) if tables else None
+        sub = _Subscriber(tables, self.queue_size)
+        yield "retry: 1000\n\n"
+
+        with self._cond:
+            current = self.version
+            sub.last_version = current
+            backlog = self.changes_since(since, tables) if since is not None else []
+            self._subscribers.add(sub)
+        try:
+            if backlog is None:
+                self._stats["resets"] += 1
+                yield _reset_frame(current)
+            else:
+                self._stats["replayed"] += len(backlog)
+                for change in backlog:
+                    yield change.frame
+
+            while True:
+                if sub.queue.empty():
+                    try:
+                        change = await asyncio.wait_for(sub.queue.get(), KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+                        continue
+                else:
+                    change = sub.queue.get_nowait()  # skip wait_for's task when already queued
+                if change is None:
+                    self._stats["resets"] += 1
+                    yield _reset_frame(self.version)
+                    return
+                self._stats["delivered"] += 1
+                yield change.frame
+        finally:
+            self._subscribers.discard(sub)
+
+    # ==================== STATS ====================
+
+    def _redis_error(self, exc: Exception):
+        self._stats["redis_errors"] += 1
+        if self._stats["redis_errors"] == 1:
+            print(f"Warning: change feed Redis fan-out unavailable ({exc}); "
+                  f"clients only see changes made through this worker")
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["version"] = self.version
+        stats["epoch"] = self.epoch
+        stats["history"] = len(self._history)
+        stats["history_bytes"] = self._history_size
+        stats["subscribers"] = len(self._subscribers)
+        stats["shared"] = self.redis is not None
+        return stats
@@ -1,13 +1,25 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict
+from typing import Callable, List, Optional
 from datetime import datetime
 import redis
+import redis.asyncio as aioredis
 import os
 import json
 import uuid
 
+from batch_ingest import ingest
+from change_feed import ChangeFeed
+from lock_manager import AsyncLockManager
+from storage import InvalidRecord, create_storage
+from storage.memory import MemoryStorage
+from storage.write_behind import BufferedStorage
+from telemetry import CONTENT_TYPE, PrometheusMiddleware, Registry, instrumented_redis, stats_callbacks
+
 # Initialize App & Redis
 app = FastAPI(title="Digital Marketing Brain API", version="1.0.0")
 
@@ -20,23 +32,111 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Try to connect to Redis (use 'redis' for Docker, 'localhost' for local dev)
+# Prometheus metrics, served at /metrics/prometheus
+metrics = Registry("api")
+app.add_middleware(PrometheusMiddleware, registry=metrics)
+
+# Redis (use 'redis' for Docker, 'localhost' for local dev): one async client
+# over a shared connection pool, so the analyze handlers never park a
+# threadpool worker on a Redis round trip. Every command is timed into
+# api_redis_command_duration_seconds
 redis_host = os.getenv('REDIS_HOST', 'localhost')
-try:
-    r = redis.Redis(host=redis_host, port=6379, decode_responses=True)
-    r.ping()  # Test connection
-except redis.ConnectionError:
-    print(f"Warning: Could not connect to Redis at {redis_host}:6379. Running without Redis locks.")
-    r = None
-
-# In-memory storage (replace with database in production)
-campaigns_db = {}
-agents_db = {}
-metrics_db = []
-activities_db = []
+redis_pool = aioredis.BlockingConnectionPool(
+    host=redis_host,
+    port=6379,
+    decode_responses=True,
+    max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '100')),
+    timeout=5,
+)
+r = instrumented_redis(metrics)(connection_pool=redis_pool)
+
+# Campaign locks: SET NX PX with owner tokens (see lock_manager.py)
+locks = AsyncLockManager(r, prefix="lock:campaign:", ttl_ms=60000)
+
+@app.on_event("startup")
+async def connect_redis():
+    global locks
+    try:
+        await r.ping()  # Test connection
+    except redis.RedisError:
+        print(f"Warning: Could not connect to Redis at {redis_host}:6379. Running without Redis locks.")
+        locks = None
+    # Share the change feed across workers through Redis when it is there
+    await changes.start(r if locks else None)
+
+@app.on_event("shutdown")
+async def close_redis():
+    await changes.close()
+    await redis_pool.disconnect()
+
+# Upper bound on records accepted by one /metrics:batch or /activities:batch call
+MAX_BATCH_ITEMS = int(os.getenv('MAX_BATCH_ITEMS', '10000'))
+
+# Storage backend (memory:// by default, see storage/__init__.py for STORAGE_URL)
+storage = create_storage()
+
+@app.on_event("shutdown")
+def close_storage():
+    storage.close()
+
+# Change feed: every write below is published to GET /changes subscribers
+# (see change_feed.py), so clients can follow deltas instead of polling lists
+changes = ChangeFeed(
+    history=int(os.getenv('CHANGE_FEED_HISTORY', '10000')),
+    history_bytes=int(os.getenv('CHANGE_FEED_HISTORY_MB', '32')) * 1024 * 1024,
+    queue_size=int(os.getenv('CHANGE_FEED_QUEUE', '1000')),
+)
+
+def save_record(table: str, record: dict, op: str) -> dict:
+    saved = storage.save(table, record)
+    changes.publish(table, op, [saved])
+    return saved
+
+def delete_record(table: str, record_id: str) -> bool:
+    if not storage.delete(table, record_id):
+        return False
+    changes.publish(table, "delete", ids=[record_id])
+    return True
+
+def accepted(table: str, records: List[dict]) -> tuple:
+    """Split stream records into those the schema takes and {id: reason} for the rest"""
+    rejected = storage.reject(table, records)
+    return [r for r in records if r["id"] not in rejected], rejected
+
+def add_metrics(metrics: List[dict]) -> dict:
+    metrics, rejected = accepted("metrics", metrics)
+    storage.add_metrics(metrics)
+    changes.publish("metrics", "create", ids=[m["id"] for m in metrics])
+    return rejected
+
+def add_activities(activities: List[dict]) -> dict:
+    activities, rejected = accepted("activities", activities)
+    storage.add_activities(activities)
+    changes.publish("activities", "create", ids=[a["id"] for a in activities])
+    return rejected
+
+def add_one(add: Callable[[List[dict]], dict], record: dict) -> dict:
+    rejected = add([record])
+    if rejected:
+        raise InvalidRecord(rejected[record["id"]])
+    return record
+
+@app.exception_handler(InvalidRecord)
+async def invalid_record(request: Request, exc: InvalidRecord):
+    return JSONResponse({"detail": str(exc)}, status_code=422)
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    # Like FastAPI's default 422, but a rejected NaN/Infinity input is echoed as a string
+    errors = json.loads(json.dumps(jsonable_encoder(exc.errors()), default=str), parse_constant=str)
+    return JSONResponse({"detail": errors}, status_code=422)
 
 # Data Models
-class CampaignData(BaseModel):
+class RequestModel(BaseModel):
+    # NaN/Infinity aren't valid JSON and break SQL backends' NOT NULL columns
+    model_config = ConfigDict(allow_inf_nan=False)
+
+class CampaignData(RequestModel):
     campaign_id: str
     cpa: float
     spend: float
@@ -54,7 +154,7 @@ class Campaign(BaseModel):
     created_at: str
     updated_at: str
 
-class CampaignCreate(BaseModel):
+class CampaignCreate(RequestModel):
     platform: str
     current_budget: float
     roi: float = 0.0
@@ -63,7 +163,7 @@ class CampaignCreate(BaseModel):
     cpa: float = 0.0
     metadata: dict = {}
 
-class CampaignUpdate(BaseModel):
+class CampaignUpdate(RequestModel):
     platform: Optional[str] = None
     current_budget: Optional[float] = None
     suggested_budget: Optional[float] = None
@@ -86,7 +186,7 @@ class Agent(BaseModel):
     created_at: str
     updated_at: str
 
-class AgentCreate(BaseModel):
+class AgentCreate(RequestModel):
     name: str
     type: str
     icon: str
@@ -96,7 +196,7 @@ class AgentCreate(BaseModel):
     mode: str = "auto"
     status: str = "idle"
 
-class AgentUpdate(BaseModel):
+class AgentUpdate(RequestModel):
     name: Optional[str] = None
     type: Optional[str] = None
     icon: Optional[str] = None
@@ -114,7 +214,7 @@ class Metric(BaseModel):
     recorded_at: str
     created_at: str
 
-class MetricCreate(BaseModel):
+class MetricCreate(RequestModel):
     metric_type: str
     value: float
     metadata: dict = {}
@@ -127,7 +227,7 @@ class Activity(BaseModel):
     metadata: dict = {}
     created_at: str
 
-class ActivityCreate(BaseModel):
+class ActivityCreate(RequestModel):
     agent_id: str
     activity_type: str
     description: str
@@ -136,7 +236,7 @@ class ActivityCreate(BaseModel):
 # Initialize with sample data
 def init_sample_data():
     """Initialize with sample data for development"""
-    if not campaigns_db:
+    if not storage.list("campaigns"):
         sample_campaigns = [
             {"id": "1", "platform": "Google Ads", "current_budget": 35000, "roi": 287, "impressions": 125000, "conversions": 850, "cpa": 45.5, "metadata": {}, "created_at": datetime.now().isoformat(), "updated_at": datetime.now().isoformat()},
             {"id": "2", "platform": "Facebook", "current_budget": 28000, "roi": 198, "impressions": 98000, "conversions": 520, "cpa": 52.3, "metadata": {}, "created_at": datetime.now().isoformat(), "updated_at": datetime.now().isoformat()},
@@ -145,9 +245,9 @@ def init_sample_data():
             {"id": "5", "platform": "TikTok", "current_budget": 7000, "roi": 89, "impressions": 32000, "conversions": 120, "cpa": 55.1, "metadata": {}, "created_at": datetime.now().isoformat(), "updated_at": datetime.now().isoformat()},
         ]
         for camp in sample_campaigns:
-            campaigns_db[camp["id"]] = camp
+            save_record("campaigns", camp, "create")
     
-    if not agents_db:
+    if not storage.list("agents"):
         sample_agents = [
             {"id": "1", "name": "User Behavior Agent", "type": "behavioral", "icon": "users", "confidence": 94, "current_task": "Analyzing session drop-off patterns", "progress": 75, "mode": "auto", "status": "active", "created_at": datetime.now().isoformat(), "updated_at": datetime.now().isoformat()},
             {"id": "2", "name": "Content Optimizer", "type": "content", "icon": "message", "confidence": 89, "current_task": "Testing headline variations", "progress": 62, "mode": "auto", "status": "processing", "created_at": datetime.now().isoformat(), "updated_at": datetime.now().isoformat()},
@@ -159,49 +259,41 @@ def init_sample_data():
             {"id": "8", "name": "Market Trends", "type": "market", "icon": "chart", "confidence": 85, "current_task": "Monitoring competitor activity", "progress": 38, "mode": "manual", "status": "idle", "created_at": datetime.now().isoformat(), "updated_at": datetime.now().isoformat()},
         ]
         for agent in sample_agents:
-            agents_db[agent["id"]] = agent
+            save_record("agents", agent, "create")
 
 @app.get("/")
 def health_check():
     # Initialize sample data on first health check if not already done
-    if not campaigns_db or not agents_db:
+    try:
         init_sample_data()
+    except InvalidRecord as exc:
+        # e.g. a database created by the Supabase migration, whose ids are uuids
+        print(f"Warning: sample data not loaded ({exc})")
     return {"status": "Brain is active", "version": "1.0.0"}
 
 @app.post("/analyze")
-def analyze_campaign(data: CampaignData):
-    # 1. CHECK LOCKS (The "Nervous System")
-    if r:
-        lock_key = f"lock:campaign:{data.campaign_id}"
+async def analyze_campaign(data: CampaignData):
+    # 1. TAKE LOCK (The "Nervous System") - one atomic SET NX, held for up to 60 seconds
+    lock = None
+    if locks:
         try:
-            if r.exists(lock_key):
+            lock = await locks.acquire(data.campaign_id)
+            if lock is None:
                 return {
                     "campaign_id": data.campaign_id,
                     "decision": "skip",
                     "reason": "Campaign is locked/optimizing"
                 }
-            # 2. SET LOCK (Prevent other agents from interfering)
-            r.set(lock_key, "processing", ex=60)  # Lock for 60 seconds
         except redis.RedisError:
             pass  # Continue without locks if Redis fails
 
     # 3. LOGIC (Simple Rule-Based for now, replace with LangGraph later)
-    # "If CPA > $50, lower bid. If CPA < $30, raise bid."
-    decision = "maintain"
-    new_bid_factor = 1.0
-
-    if data.cpa > 50.0:
-        decision = "lower_bid"
-        new_bid_factor = 0.85
-    elif data.cpa < 30.0:
-        decision = "raise_bid"
-        new_bid_factor = 1.15
-
-    # 4. RELEASE LOCK
-    if r:
+    decision, new_bid_factor = decide_bids([data.cpa])[0]
+
+    # 4. RELEASE LOCK (only if it is still ours)
+    if lock:
         try:
-            lock_key = f"lock:campaign:{data.campaign_id}"
-            r.delete(lock_key)
+            await lock.release()
         except redis.RedisError:
             pass
 
@@ -215,19 +307,183 @@ def analyze_campaign(data: CampaignData):
         }
     }
 
+# "If CPA > $50, lower bid. If CPA < $30, raise bid."
+BID_RULES = {
+    "raise_bid": 1.15,   # cpa < 30
+    "maintain": 1.0,     # 30 <= cpa <= 50
+    "lower_bid": 0.85,   # cpa > 50
+}
+_BID_OUTCOMES = [(name, factor) for name, factor in BID_RULES.items()]
+
+def decide_bids(cpas: List[float]) -> List[tuple]:
+    """Apply the bid rules to a whole batch of CPAs at once"""
+    # Each CPA maps to an outcome index: 0 below $30, 1 in band, 2 above $50
+    return [_BID_OUTCOMES[(cpa >= 30.0) + (cpa > 50.0)] for cpa in cpas]
+
+@app.post("/analyze:batch")
+async def analyze_campaigns_batch(batch: List[CampaignData]):
+    """Analyze many campaigns with one Redis round trip to lock and one to unlock"""
+    # 1. ACQUIRE every lock in one pipelined round trip (SET NX PX per key);
+    # duplicates within the batch only get the lock on their first occurrence
+    acquired = [True] * len(batch)
+    first_seen = {}
+    for i, data in enumerate(batch):
+        if data.campaign_id in first_seen:
+            acquired[i] = False
+        else:
+            first_seen[data.campaign_id] = i
+    held = []
+    if locks:
+        try:
+            held = await locks.acquire_many(first_seen)
+            for i, lock in zip(first_seen.values(), held):
+                acquired[i] = lock is not None
+        except redis.RedisError:
+            pass  # Continue without locks if Redis fails
+
+    # 2. DECIDE for every campaign we hold the lock for
+    runnable = [i for i, ok in enumerate(acquired) if ok]
+    decisions = dict(zip(runnable, decide_bids([batch[i].cpa for i in runnable])))
+
+    # 3. RELEASE the locks we took in one round trip (compare-and-delete)
+    if held:
+        try:
+            await locks.release_many(held)
+        except redis.RedisError:
+            pass
+
+    results = []
+    for i, data in enumerate(batch):
+        if i not in decisions:
+            results.append({
+                "campaign_id": data.campaign_id,
+                "decision": "skip",
+                "reason": "Campaign is locked/optimizing"
+            })
+            continue
+        decision, factor = decisions[i]
+        results.append({
+            "campaign_id": data.campaign_id,
+            "decision": decision,
+            "suggested_action": {
+                "type": "update_bid",
+                "factor": factor
+            }
+        })
+    return {"processed": len(runnable), "skipped": len(batch) - len(runnable), "results": results}
+
+@app.get("/locks/stats")
+def get_lock_stats():
+    """Get lock contention and wait-time stats"""
+    if not locks:
+        return {"enabled": False}
+    return {"enabled": True, **locks.stats()}
+
+# ==================== CHANGE FEED ====================
+
+FEED_TABLES = ("campaigns", "agents", "metrics", "activities")
+
+@app.get("/changes")
+async def change_stream(
+    request: Request,
+    since: Optional[int] = Query(None, description="Resume after this version"),
+    tables: Optional[str] = Query(None, description="Comma-separated tables to follow (default: all)")
+):
+    """Server-Sent Events stream of create/update/delete changes"""
+    wanted = [t for t in tables.split(",") if t] if tables else None
+    if wanted and not set(wanted) <= set(FEED_TABLES):
+        raise HTTPException(status_code=400, detail=f"tables must be among {', '.join(FEED_TABLES)}")
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)  # EventSource reconnect
+    return StreamingResponse(changes.stream(since, wanted), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/changes/stats")
+def change_feed_stats():
+    return changes.stats()
+
+# ==================== CONDITIONAL LISTS ====================
+# List endpoints send a strong ETag naming the collection's change-feed
+# version; a poll with a matching If-None-Match gets 304 before anything is
+# loaded or serialized. `?since=<version>` returns only what changed after
+# that version (from the feed history), `?since=<ISO timestamp>` the records
+# stamped later than it (no deletes). ETags assume every write goes through
+# this API and, with several workers, that the feed is shared via Redis.
+# Metrics retention (METRICS_RETENTION_SECONDS) drops points without a write,
+# so the metrics ETag also carries the number of points expired so far.
+
+SINCE_DESCRIPTION = "Only records changed after this change-feed version or ISO timestamp"
+
+def collection_etag(table: str) -> str:
+    etag = f"{changes.epoch}-{table}-{changes.table_versions.get(table, 0)}"
+    if table == "metrics":
+        expired = metrics_expired()
+        if expired is not None:
+            etag += f"-{expired}"
+    return f'"{etag}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+def parse_time(value: str) -> datetime:
+    stamp = datetime.fromisoformat(value)
+    # Compare naive local times; Postgres hands back offset-aware ones
+    return stamp.astimezone().replace(tzinfo=None) if stamp.tzinfo else stamp
+
+def collection_delta(table: str, since: str, load: Callable[[], List[dict]],
+                     keep: Callable[[dict], bool], stamp: str) -> dict:
+    version = changes.table_versions.get(table, 0)
+    if since.isdigit():
+        delta = changes.delta(table, int(since))
+        if delta is None:  # too old for the history (or another epoch): send everything
+            return {"version": version, "epoch": changes.epoch, "reset": True,
+                    "changed": load(), "deleted": []}
+        changed = delta["changed"]
+        if delta["changed_ids"]:  # streams publish ids only; their records come from the list
+            ids = set(delta["changed_ids"])
+            changed = changed + [r for r in load() if r["id"] in ids]
+        return {"version": version, "epoch": changes.epoch, "reset": False,
+                "changed": [r for r in changed if keep(r)], "deleted": delta["deleted"]}
+    try:
+        cutoff = parse_time(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be a version or an ISO timestamp")
+    changed = [r for r in load() if r.get(stamp) and parse_time(r[stamp]) > cutoff]
+    return {"version": version, "epoch": changes.epoch, "reset": False, "changed": changed, "deleted": []}
+
+def conditional_list(table: str, request: Request, response: Response, since: Optional[str],
+                     load: Callable[[], List[dict]], keep: Callable[[dict], bool] = lambda r: True,
+                     stamp: str = "updated_at"):
+    etag = collection_etag(table)  # read before the data, so a racing write only costs a 200
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    if since is not None:
+        return JSONResponse(collection_delta(table, since, load, keep, stamp), headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return load()
+
 # ==================== CAMPAIGNS ENDPOINTS ====================
 
 @app.get("/campaigns", response_model=List[Campaign])
-def get_campaigns():
+def get_campaigns(
+    request: Request,
+    response: Response,
+    since: Optional[str] = Query(None, description=SINCE_DESCRIPTION)
+):
     """Get all campaigns"""
-    return list(campaigns_db.values())
+    return conditional_list("campaigns", request, response, since, lambda: storage.list("campaigns"))
 
 @app.get("/campaigns/{campaign_id}", response_model=Campaign)
 def get_campaign(campaign_id: str):
     """Get a specific campaign"""
-    if campaign_id not in campaigns_db:
+    existing = storage.get("campaigns", campaign_id)
+    if existing is None:
         raise HTTPException(status_code=404, detail="Campaign not found")
-    return campaigns_db[campaign_id]
+    return existing
 
 @app.post("/campaigns", response_model=Campaign, status_code=201)
 def create_campaign(campaign: CampaignCreate):
@@ -247,46 +503,48 @@ def create_campaign(campaign: CampaignCreate):
         "created_at": now,
         "updated_at": now
     }
-    campaigns_db[campaign_id] = new_campaign
-    return new_campaign
+    return save_record("campaigns", new_campaign, "create")
 
 @app.put("/campaigns/{campaign_id}", response_model=Campaign)
 def update_campaign(campaign_id: str, campaign_update: CampaignUpdate):
     """Update a campaign"""
-    if campaign_id not in campaigns_db:
+    existing = storage.get("campaigns", campaign_id)
+    if existing is None:
         raise HTTPException(status_code=404, detail="Campaign not found")
-    
-    existing = campaigns_db[campaign_id]
+
     update_data = campaign_update.dict(exclude_unset=True)
     
     for key, value in update_data.items():
         existing[key] = value
     
     existing["updated_at"] = datetime.now().isoformat()
-    campaigns_db[campaign_id] = existing
-    return existing
+    return save_record("campaigns", existing, "update")
 
 @app.delete("/campaigns/{campaign_id}", status_code=204)
 def delete_campaign(campaign_id: str):
     """Delete a campaign"""
-    if campaign_id not in campaigns_db:
+    if not delete_record("campaigns", campaign_id):
         raise HTTPException(status_code=404, detail="Campaign not found")
-    del campaigns_db[campaign_id]
     return None
 
 # ==================== AGENTS ENDPOINTS ====================
 
 @app.get("/agents", response_model=List[Agent])
-def get_agents():
+def get_agents(
+    request: Request,
+    response: Response,
+    since: Optional[str] = Query(None, description=SINCE_DESCRIPTION)
+):
     """Get all agents"""
-    return list(agents_db.values())
+    return conditional_list("agents", request, response, since, lambda: storage.list("agents"))
 
 @app.get("/agents/{agent_id}", response_model=Agent)
 def get_agent(agent_id: str):
     """Get a specific agent"""
-    if agent_id not in agents_db:
+    existing = storage.get("agents", agent_id)
+    if existing is None:
         raise HTTPException(status_code=404, detail="Agent not found")
-    return agents_db[agent_id]
+    return existing
 
 @app.post("/agents", response_model=Agent, status_code=201)
 def create_agent(agent: AgentCreate):
@@ -306,95 +564,175 @@ def create_agent(agent: AgentCreate):
         "created_at": now,
         "updated_at": now
     }
-    agents_db[agent_id] = new_agent
-    return new_agent
+    return save_record("agents", new_agent, "create")
 
 @app.put("/agents/{agent_id}", response_model=Agent)
 def update_agent(agent_id: str, agent_update: AgentUpdate):
     """Update an agent"""
-    if agent_id not in agents_db:
+    existing = storage.get("agents", agent_id)
+    if existing is None:
         raise HTTPException(status_code=404, detail="Agent not found")
-    
-    existing = agents_db[agent_id]
+
     update_data = agent_update.dict(exclude_unset=True)
     
     for key, value in update_data.items():
         existing[key] = value
     
     existing["updated_at"] = datetime.now().isoformat()
-    agents_db[agent_id] = existing
-    return existing
+    return save_record("agents", existing, "update")
 
 @app.delete("/agents/{agent_id}", status_code=204)
 def delete_agent(agent_id: str):
     """Delete an agent"""
-    if agent_id not in agents_db:
+    if not delete_record("agents", agent_id):
         raise HTTPException(status_code=404, detail="Agent not found")
-    del agents_db[agent_id]
     return None
 
 # ==================== METRICS ENDPOINTS ====================
 
 @app.get("/metrics", response_model=List[Metric])
 def get_metrics(
+    request: Request,
+    response: Response,
     metric_type: Optional[str] = Query(None, description="Filter by metric type"),
-    limit: int = Query(100, ge=1, le=1000, description="Limit number of results")
+    limit: int = Query(100, ge=1, le=1000, description="Limit number of results"),
+    since: Optional[str] = Query(None, description=SINCE_DESCRIPTION)
 ):
     """Get metrics, optionally filtered by type"""
-    metrics = list(metrics_db)
-    
-    if metric_type:
-        metrics = [m for m in metrics if m.get("metric_type") == metric_type]
-    
-    # Sort by recorded_at descending and limit
-    metrics.sort(key=lambda x: x.get("recorded_at", ""), reverse=True)
-    return metrics[:limit]
+    return conditional_list("metrics", request, response, since,
+                            lambda: storage.latest_metrics(metric_type or None, limit),
+                            keep=lambda m: not metric_type or m["metric_type"] == metric_type,
+                            stamp="created_at")
+
+@app.get("/metrics/stats")
+def get_metrics_stats():
+    """Get size and buffering stats of the storage backend"""
+    return storage.stats()
 
 @app.post("/metrics", response_model=Metric, status_code=201)
 def create_metric(metric: MetricCreate):
     """Create a new metric"""
-    metric_id = str(uuid.uuid4())
-    now = datetime.now().isoformat()
-    new_metric = {
-        "id": metric_id,
+    new_metric = build_metric(metric, datetime.now().isoformat())
+    return add_one(add_metrics, new_metric)
+
+@app.post("/metrics:batch")
+async def create_metrics_batch(request: Request):
+    """Create many metrics from a JSON array or an NDJSON stream"""
+    result = await ingest(request, MetricCreate, build_metric, add_metrics, MAX_BATCH_ITEMS)
+    return JSONResponse(result, status_code=201 if not result["failed"] else 207)
+
+def build_metric(metric: MetricCreate, now: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
         "metric_type": metric.metric_type,
         "value": metric.value,
         "metadata": metric.metadata,
         "recorded_at": now,
         "created_at": now
     }
-    metrics_db.append(new_metric)
-    return new_metric
 
 # ==================== ACTIVITIES ENDPOINTS ====================
 
 @app.get("/activities", response_model=List[Activity])
 def get_activities(
+    request: Request,
+    response: Response,
     agent_id: Optional[str] = Query(None, description="Filter by agent ID"),
-    limit: int = Query(50, ge=1, le=1000, description="Limit number of results")
+    limit: int = Query(50, ge=1, le=1000, description="Limit number of results"),
+    since: Optional[str] = Query(None, description=SINCE_DESCRIPTION)
 ):
     """Get activities, optionally filtered by agent ID"""
-    activities = list(activities_db)
-    
-    if agent_id:
-        activities = [a for a in activities if a.get("agent_id") == agent_id]
-    
-    # Sort by created_at descending and limit
-    activities.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return activities[:limit]
+    return conditional_list("activities", request, response, since,
+                            lambda: storage.latest_activities(agent_id or None, limit),
+                            keep=lambda a: not agent_id or a["agent_id"] == agent_id,
+                            stamp="created_at")
 
 @app.post("/activities", response_model=Activity, status_code=201)
 def create_activity(activity: ActivityCreate):
     """Create a new activity"""
-    activity_id = str(uuid.uuid4())
-    now = datetime.now().isoformat()
-    new_activity = {
-        "id": activity_id,
+    new_activity = build_activity(activity, datetime.now().isoformat())
+    return add_one(add_activities, new_activity)
+
+@app.post("/activities:batch")
+async def create_activities_batch(request: Request):
+    """Create many activities from a JSON array or an NDJSON stream"""
+    result = await ingest(request, ActivityCreate, build_activity, add_activities, MAX_BATCH_ITEMS)
+    return JSONResponse(result, status_code=201 if not result["failed"] else 207)
+
+def build_activity(activity: ActivityCreate, now: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
         "agent_id": activity.agent_id,
         "activity_type": activity.activity_type,
         "description": activity.description,
         "metadata": activity.metadata,
         "created_at": now
     }
-    activities_db.append(new_activity)
-    return new_activity
\ No newline at end of file
+
+# ==================== PROMETHEUS ====================
+# Scrape-time views of the stats the components already keep. Store sizes
+# come from the in-process counters only; SQL backends would need a
+# count(*) per table on every scrape, so they report write-behind stats only
+
+stats_callbacks(metrics, "lock", lambda: locks.stats() if locks else None, {
+    "acquired": ("counter", "Campaign locks acquired"),
+    "contended": ("counter", "Lock attempts that found the campaign locked"),
+    "timeouts": ("counter", "Lock waits that timed out"),
+    "lost": ("counter", "Auto-extended locks lost before release"),
+    "held": ("gauge", "Locks currently held by this worker"),
+})
+
+stats_callbacks(metrics, "change_feed", changes.stats, {
+    "published": ("counter", "Changes published by this worker"),
+    "delivered": ("counter", "Change events sent to subscribers"),
+    "resets": ("counter", "Subscribers told to refetch instead of replaying"),
+    "subscribers": ("gauge", "Open /changes streams"),
+    "version": ("gauge", "Latest change feed version"),
+})
+
+def memory_storage() -> Optional[MemoryStorage]:
+    inner = storage.inner if isinstance(storage, BufferedStorage) else storage
+    return inner if isinstance(inner, MemoryStorage) else None
+
+def metrics_expired() -> Optional[int]:
+    store = memory_storage()
+    if store is None or not store.metrics_store.max_age_seconds:
+        return None
+    return store.metrics_store.expire()
+
+def store_records() -> Optional[dict]:
+    store = memory_storage()
+    if store is None:
+        return None
+    stats = store.stats()
+    return {"campaigns": stats["campaigns"], "agents": stats["agents"],
+            "activities": stats["activities"], "metrics": stats["metrics"]["points"]}
+
+def store_bytes() -> Optional[int]:
+    store = memory_storage()
+    return store.metrics_store.memory_usage()["bytes"] if store is not None else None
+
+def write_behind(field: str):
+    def read():
+        if not isinstance(storage, BufferedStorage):
+            return None
+        return {"metrics": storage.metrics_buffer.stats()[field],
+                "activities": storage.activities_buffer.stats()[field]}
+    return read
+
+metrics.callback("store_records", "Records held by the in-memory store", store_records,
+                 labelnames=("table",))
+metrics.callback("store_metric_bytes", "Approximate bytes held by the in-memory metric buffers", store_bytes)
+metrics.callback("write_behind_pending", "Records waiting in a write-behind buffer",
+                 write_behind("pending"), labelnames=("stream",))
+metrics.callback("write_behind_flushed_total", "Records flushed by a write-behind buffer",
+                 write_behind("flushed"), kind="counter", labelnames=("stream",))
+metrics.callback("write_behind_failures_total", "Failed write-behind flushes",
+                 write_behind("failures"), kind="counter", labelnames=("stream",))
+metrics.callback("write_behind_dead_lettered_total", "Records dropped after repeated failed writes",
+                 write_behind("dead_lettered"), kind="counter", labelnames=("stream",))
+
+@app.get("/metrics/prometheus")
+def prometheus_metrics():
+    """Prometheus text exposition of request, Redis, lock and store metrics"""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
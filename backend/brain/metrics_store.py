@@ -0,0 +1,175 @@
+"""
+Time-series storage for the /metrics endpoints.
+
+Every metric_type gets its own bounded ring buffer. Values and epoch timestamps
+live in flat `array('d')` columns; ids and metadata sit in parallel lists.
+Points are appended in arrival order, so "latest N of type X" is a backwards
+walk over N slots with no copy and no sort.
+"""
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+import heapq
+import itertools
+import sys
+import threading
+import time
+
+
+class RingBuffer:
+    """Fixed-capacity, append-ordered buffer of metric points for one metric_type"""
+
+    __slots__ = ("capacity", "values", "timestamps", "ids", "metadata", "slot_bytes",
+                 "object_bytes", "head", "size")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values = array("d", bytes(8 * capacity))
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.ids: List[Optional[str]] = [None] * capacity
+        self.metadata: List[Optional[dict]] = [None] * capacity
+        # Sizes of each slot's id and metadata objects, and their running total,
+        # so nbytes() doesn't have to walk the slots
+        self.slot_bytes = array("L", bytes(array("L").itemsize * capacity))
+        self.object_bytes = 0
+        self.head = 0  # next slot to write
+        self.size = 0
+
+    def append(self, point_id: str, value: float, ts: float, metadata: Optional[dict]):
+        slot = self.head
+        metadata = metadata or None  # don't keep a dict per empty metadata
+        size = sys.getsizeof(point_id) + (sys.getsizeof(metadata) if metadata is not None else 0)
+        self.object_bytes += size - self.slot_bytes[slot]
+        self.slot_bytes[slot] = size
+        self.values[slot] = value
+        self.timestamps[slot] = ts
+        self.ids[slot] = point_id
+        self.metadata[slot] = metadata
+        self.head = (slot + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def expire(self, cutoff: float) -> int:
+        """Drop points older than `cutoff` from the tail; returns how many went"""
+        dropped = 0
+        while self.size:
+            tail = (self.head - self.size) % self.capacity
+            if self.timestamps[tail] >= cutoff:
+                break
+            self.ids[tail] = None
+            self.metadata[tail] = None
+            self.object_bytes -= self.slot_bytes[tail]
+            self.slot_bytes[tail] = 0
+            self.size -= 1
+            dropped += 1
+        return dropped
+
+    def newest_slots(self) -> Iterator[int]:
+        """Yield slot indexes newest first"""
+        slot = self.head
+        for _ in range(self.size):
+            slot = (slot - 1) % self.capacity
+            yield slot
+
+    def nbytes(self) -> int:
+        size = sum(column.buffer_info()[1] * column.itemsize
+                   for column in (self.values, self.timestamps, self.slot_bytes))
+        return size + sys.getsizeof(self.ids) + sys.getsizeof(self.metadata) + self.object_bytes
+
+
+class MetricsStore:
+    """Per-metric_type ring buffers with configurable retention"""
+
+    def __init__(self, max_points: int = 10000, max_age_seconds: float = 0):
+        if max_points < 1:
+            raise ValueError("max_points must be >= 1")
+        self.max_points = max_points
+        self.max_age_seconds = max_age_seconds
+        self._buffers: Dict[str, RingBuffer] = {}
+        self._lock = threading.Lock()
+        self.expired = 0  # points dropped by max_age_seconds so far
+
+    def append(self, point_id: str, metric_type: str, value: float,
+               metadata: Optional[dict] = None, ts: Optional[float] = None) -> dict:
+        """Store one point and return it in the API's Metric shape"""
+        if ts is None:
+            ts = time.time()
+        with self._lock:
+            buf = self._buffers.get(metric_type)
+            if buf is None:
+                buf = self._buffers[metric_type] = RingBuffer(self.max_points)
+            buf.append(point_id, value, ts, metadata)
+            if self.max_age_seconds:
+                self.expired += buf.expire(ts - self.max_age_seconds)
+        return _to_record(metric_type, point_id, value, ts, metadata)
+
+    def latest(self, metric_type: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Return the newest `limit` points, optionally for a single metric_type"""
+        with self._lock:
+            self._expire()
+            if metric_type is not None:
+                buf = self._buffers.get(metric_type)
+                if buf is None:
+                    return []
+                return [_slot_record(metric_type, buf, slot)
+                        for slot in itertools.islice(buf.newest_slots(), limit)]
+
+            # Merge the per-type streams, each already newest first
+            streams = [_stream(mtype, buf) for mtype, buf in self._buffers.items()]
+            merged = heapq.merge(*streams, key=lambda item: item[0], reverse=True)
+            return [_slot_record(mtype, self._buffers[mtype], slot)
+                    for _, mtype, slot in itertools.islice(merged, limit)]
+
+    def expire(self) -> int:
+        """Apply max_age_seconds now; returns the number of points expired so far"""
+        with self._lock:
+            self._expire()
+            return self.expired
+
+    def _expire(self):
+        if self.max_age_seconds:
+            cutoff = time.time() - self.max_age_seconds
+            for buf in self._buffers.values():
+                self.expired += buf.expire(cutoff)
+
+    def __len__(self) -> int:
+        return sum(buf.size for buf in self._buffers.values())
+
+    def memory_usage(self) -> dict:
+        """Approximate resident size of the store, per metric_type and in total"""
+        with self._lock:
+            per_type = {
+                mtype: {"points": buf.size, "capacity": buf.capacity, "bytes": buf.nbytes()}
+                for mtype, buf in self._buffers.items()
+            }
+        return {
+            "max_points": self.max_points,
+            "max_age_seconds": self.max_age_seconds,
+            "metric_types": len(per_type),
+            "points": sum(t["points"] for t in per_type.values()),
+            "bytes": sum(t["bytes"] for t in per_type.values()),
+            "by_type": per_type,
+        }
+
+
+def _stream(metric_type: str, buf: RingBuffer) -> Iterator[tuple]:
+    for slot in buf.newest_slots():
+        yield buf.timestamps[slot], metric_type, slot
+
+
+def _to_record(metric_type: str, point_id: str, value: float, ts: float,
+               metadata: Optional[dict]) -> dict:
+    recorded_at = datetime.fromtimestamp(ts).isoformat()
+    return {
+        "id": point_id,
+        "metric_type": metric_type,
+        "value": value,
+        "metadata": metadata or {},
+        "recorded_at": recorded_at,
+        "created_at": recorded_at,
+    }
+
+
+def _slot_record(metric_type: str, buf: RingBuffer, slot: int) -> dict:
+    return _to_record(metric_type, buf.ids[slot], buf.values[slot],
+                      buf.timestamps[slot], buf.metadata[slot])
@@ -0,0 +1,53 @@
+"""
+Pluggable persistence for the Brain API.
+
+Select a backend with STORAGE_URL:
+  memory://                      process-local (default)
+  sqlite:///path/to/brain.db     embedded SQLite in WAL mode
+  postgresql://user:pw@host/db   Postgres with the Supabase dashboard schema
+
+Durable backends buffer metric/activity inserts through a write-behind
+batcher, tuned with WRITE_BEHIND_BATCH and WRITE_BEHIND_INTERVAL_MS.
+"""
+import os
+
+from storage.base import COLUMNS, KEYED_TABLES, InvalidRecord, Storage
+from storage.memory import MemoryStorage
+from storage.write_behind import BufferedStorage, WriteBehindBuffer
+
+
+def create_storage(url: str = None) -> Storage:
+    url = url or os.getenv("STORAGE_URL", "memory://")
+
+    if url.startswith("memory"):
+        return MemoryStorage(
+            metrics_max_points=int(os.getenv("METRICS_RETENTION_POINTS", "10000")),
+            metrics_max_age_seconds=float(os.getenv("METRICS_RETENTION_SECONDS", "0")),
+        )
+
+    if url.startswith("sqlite:///"):
+        from storage.sqlite import SQLiteStorage
+        inner = SQLiteStorage(url[len("sqlite:///"):])
+    elif url.startswith(("postgres://", "postgresql://")):
+        from storage.postgres import PostgresStorage
+        inner = PostgresStorage(url)
+    else:
+        raise ValueError(f"Unsupported STORAGE_URL: {url}")
+
+    return BufferedStorage(
+        inner,
+        max_batch=int(os.getenv("WRITE_BEHIND_BATCH", "500")),
+        flush_interval=int(os.getenv("WRITE_BEHIND_INTERVAL_MS", "200")) / 1000,
+    )
+
+
+__all__ = [
+    "COLUMNS",
+    "KEYED_TABLES",
+    "BufferedStorage",
+    "InvalidRecord",
+    "MemoryStorage",
+    "Storage",
+    "WriteBehindBuffer",
+    "create_storage",
+]
@@ -0,0 +1,82 @@
+"""
+Storage interface shared by every backend.
+
+Campaigns and agents are keyed records (get/save/delete by id). Metrics and
+activities are append-only streams that are only ever read newest first, so
+they get bulk `add_*` methods and `latest_*` queries instead.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+# Column layout of each table, matching
+# frontend/supabase/migrations/20260103110006_create_marketing_dashboard_schema.sql
+COLUMNS = {
+    "campaigns": ("id", "platform", "current_budget", "suggested_budget", "roi",
+                  "impressions", "conversions", "cpa", "metadata", "created_at", "updated_at"),
+    "agents": ("id", "name", "type", "icon", "confidence", "current_task", "progress",
+               "mode", "status", "created_at", "updated_at"),
+    "metrics": ("id", "metric_type", "value", "metadata", "recorded_at", "created_at"),
+    "activities": ("id", "agent_id", "activity_type", "description", "metadata", "created_at"),
+}
+
+# Tables addressed by id through get/save/delete
+KEYED_TABLES = ("campaigns", "agents")
+
+
+class InvalidRecord(ValueError):
+    """A record the backend's schema rejects (bad id format, failed constraint); maps to HTTP 422"""
+
+
+class Storage(ABC):
+    """Persistence for campaigns, agents, metrics and activities"""
+
+    # Errors that mean the records themselves were refused, not that the
+    # backend is unavailable: writing them again would fail the same way
+    rejected_errors: Tuple[type, ...] = (InvalidRecord,)
+
+    @abstractmethod
+    def list(self, table: str) -> List[dict]:
+        """Return every record of a keyed table"""
+
+    @abstractmethod
+    def get(self, table: str, record_id: str) -> Optional[dict]:
+        """Return one record of a keyed table, or None"""
+
+    @abstractmethod
+    def save(self, table: str, record: dict) -> dict:
+        """Insert or replace a record of a keyed table"""
+
+    @abstractmethod
+    def delete(self, table: str, record_id: str) -> bool:
+        """Delete a record of a keyed table; False if it did not exist"""
+
+    @abstractmethod
+    def add_metrics(self, metrics: List[dict]) -> None:
+        """Append metric records"""
+
+    @abstractmethod
+    def latest_metrics(self, metric_type: Optional[str], limit: int) -> List[dict]:
+        """Return the newest metrics, optionally of one metric_type"""
+
+    @abstractmethod
+    def add_activities(self, activities: List[dict]) -> None:
+        """Append activity records"""
+
+    @abstractmethod
+    def latest_activities(self, agent_id: Optional[str], limit: int) -> List[dict]:
+        """Return the newest activities, optionally of one agent"""
+
+    def reject(self, table: str, records: List[dict]) -> Dict[str, str]:
+        """Records of a stream the schema would refuse, as id -> reason; checked before buffering"""
+        return {}
+
+    def stats(self) -> dict:
+        """Backend-specific size / health information"""
+        return {}
+
+    def flush(self) -> None:
+        """Persist anything buffered in memory"""
+
+    def close(self) -> None:
+        """Flush and release connections"""
+        self.flush()
@@ -0,0 +1,61 @@
+"""
+Process-local storage: dicts for campaigns/agents, MetricsStore ring buffers
+for metrics and the indexed ActivityStore for activities. Nothing survives a
+restart and nothing is shared between uvicorn workers.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from activity_store import ActivityStore
+from metrics_store import MetricsStore
+from storage.base import KEYED_TABLES, Storage
+
+
+class MemoryStorage(Storage):
+
+    def __init__(self, metrics_max_points: int = 10000, metrics_max_age_seconds: float = 0):
+        self._tables = {table: {} for table in KEYED_TABLES}
+        self.metrics_store = MetricsStore(metrics_max_points, metrics_max_age_seconds)
+        self.activity_store = ActivityStore()
+
+    def list(self, table: str) -> List[dict]:
+        return list(self._tables[table].values())
+
+    def get(self, table: str, record_id: str) -> Optional[dict]:
+        return self._tables[table].get(record_id)
+
+    def save(self, table: str, record: dict) -> dict:
+        self._tables[table][record["id"]] = record
+        return record
+
+    def delete(self, table: str, record_id: str) -> bool:
+        return self._tables[table].pop(record_id, None) is not None
+
+    def add_metrics(self, metrics: List[dict]) -> None:
+        for metric in metrics:
+            self.metrics_store.append(
+                metric["id"],
+                metric["metric_type"],
+                metric["value"],
+                metric.get("metadata"),
+                ts=datetime.fromisoformat(metric["recorded_at"]).timestamp(),
+            )
+
+    def latest_metrics(self, metric_type: Optional[str], limit: int) -> List[dict]:
+        return self.metrics_store.latest(metric_type, limit)
+
+    def add_activities(self, activities: List[dict]) -> None:
+        for activity in activities:
+            self.activity_store.append(activity)
+
+    def latest_activities(self, agent_id: Optional[str], limit: int) -> List[dict]:
+        return self.activity_store.latest(agent_id, limit)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "campaigns": len(self._tables["campaigns"]),
+            "agents": len(self._tables["agents"]),
+            "activities": len(self.activity_store),
+            "metrics": self.metrics_store.memory_usage(),
+        }
@@ -0,0 +1,197 @@
+"""
+Postgres backend matching the Supabase schema in
+frontend/supabase/migrations/20260103110006_create_marketing_dashboard_schema.sql.
+
+The migration owns the DDL (RLS policies, seed rows); `ensure_schema` only
+creates the bare tables and indexes when pointed at an empty database. Those
+use text ids and no activities -> agents foreign key, so they accept the same
+ids as the other backends (the API's sample rows are "1".."8").
+
+A database created by the migration keeps uuid ids and the foreign key. The
+id types are read at startup: a lookup by a non-uuid id is a miss, a write the
+schema refuses raises InvalidRecord (422), and `reject` filters metric and
+activity rows before they reach the write-behind buffer.
+Requires psycopg2 (psycopg2-binary in requirements.txt).
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+import uuid
+
+from storage.base import COLUMNS, InvalidRecord
+from storage.sql import SQLStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+  id text PRIMARY KEY DEFAULT gen_random_uuid()::text,
+  name text NOT NULL,
+  type text NOT NULL,
+  icon text NOT NULL DEFAULT 'brain',
+  confidence numeric(5,2) NOT NULL DEFAULT 0 CHECK (confidence >= 0 AND confidence <= 100),
+  current_task text DEFAULT '',
+  progress numeric(5,2) NOT NULL DEFAULT 0 CHECK (progress >= 0 AND progress <= 100),
+  mode text NOT NULL DEFAULT 'auto' CHECK (mode IN ('auto', 'semi-auto', 'manual')),
+  status text NOT NULL DEFAULT 'idle' CHECK (status IN ('active', 'idle', 'processing')),
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS metrics (
+  id text PRIMARY KEY DEFAULT gen_random_uuid()::text,
+  metric_type text NOT NULL,
+  value numeric NOT NULL,
+  metadata jsonb DEFAULT '{}'::jsonb,
+  recorded_at timestamptz DEFAULT now(),
+  created_at timestamptz DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS campaigns (
+  id text PRIMARY KEY DEFAULT gen_random_uuid()::text,
+  platform text NOT NULL,
+  current_budget numeric NOT NULL DEFAULT 0,
+  suggested_budget numeric NOT NULL DEFAULT 0,
+  roi numeric(6,2) NOT NULL DEFAULT 0,
+  impressions bigint NOT NULL DEFAULT 0,
+  conversions integer NOT NULL DEFAULT 0,
+  cpa numeric(10,2) NOT NULL DEFAULT 0,
+  metadata jsonb DEFAULT '{}'::jsonb,
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS activities (
+  id text PRIMARY KEY DEFAULT gen_random_uuid()::text,
+  agent_id text,
+  activity_type text NOT NULL,
+  description text NOT NULL,
+  metadata jsonb DEFAULT '{}'::jsonb,
+  created_at timestamptz DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_type_time ON metrics(metric_type, recorded_at DESC);
+CREATE INDEX IF NOT EXISTS idx_activities_agent ON activities(agent_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_campaigns_platform ON campaigns(platform);
+"""
+
+
+class PostgresStorage(SQLStorage):
+    placeholder = "%s"
+
+    def __init__(self, dsn: str, min_connections: int = 1, max_connections: int = 10):
+        try:
+            from psycopg2.extras import execute_batch
+            from psycopg2.pool import ThreadedConnectionPool
+        except ImportError as exc:
+            raise RuntimeError("PostgresStorage requires psycopg2 (pip install psycopg2-binary)") from exc
+        from psycopg2 import DataError, IntegrityError
+        self._execute_batch = execute_batch
+        self._schema_errors = (DataError, IntegrityError)
+        self.rejected_errors = (InvalidRecord,) + self._schema_errors
+        self._pool = ThreadedConnectionPool(min_connections, max_connections, dsn)
+        self._uuid_columns = set()  # (table, column) typed uuid by an existing schema
+        self._agent_fk = False
+        self.ensure_schema()
+
+    def ensure_schema(self) -> None:
+        with self.cursor() as cur:
+            cur.execute(SCHEMA)
+            cur.execute(
+                "SELECT table_name, column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND column_name IN ('id', 'agent_id') "
+                "AND data_type = 'uuid'")
+            self._uuid_columns = {(table, column) for table, column in cur.fetchall()}
+            cur.execute(
+                "SELECT 1 FROM information_schema.table_constraints "
+                "WHERE table_schema = current_schema() AND table_name = 'activities' "
+                "AND constraint_type = 'FOREIGN KEY'")
+            self._agent_fk = cur.fetchone() is not None
+
+    def _fits(self, table: str, column: str, value) -> bool:
+        """Whether `value` can be stored in (or compared with) a uuid-typed column"""
+        if (table, column) not in self._uuid_columns:
+            return True
+        try:
+            uuid.UUID(str(value))
+        except ValueError:
+            return False
+        return True
+
+    # ---- keyed tables ----
+
+    def get(self, table: str, record_id: str) -> Optional[dict]:
+        if not self._fits(table, "id", record_id):
+            return None
+        return super().get(table, record_id)
+
+    def delete(self, table: str, record_id: str) -> bool:
+        if not self._fits(table, "id", record_id):
+            return False
+        return super().delete(table, record_id)
+
+    def save(self, table: str, record: dict) -> dict:
+        if not self._fits(table, "id", record.get("id")):
+            raise InvalidRecord(f"{table} ids must be UUIDs in this database")
+        try:
+            return super().save(table, record)
+        except self._schema_errors as exc:
+            raise InvalidRecord(str(exc).strip()) from exc
+
+    # ---- append-only streams ----
+
+    def reject(self, table: str, records: List[dict]) -> Dict[str, str]:
+        rejected = {}
+        for record in records:
+            for column in ("id", "agent_id"):
+                if column in record and not self._fits(table, column, record[column]):
+                    rejected[record["id"]] = f"{column} must be a UUID in this database"
+        if table == "activities" and self._agent_fk:
+            agent_ids = {r["agent_id"] for r in records if r["id"] not in rejected}
+            if agent_ids:
+                with self.cursor() as cur:
+                    cur.execute("SELECT id::text FROM agents WHERE id::text = ANY(%s)", (list(agent_ids),))
+                    known = {row[0] for row in cur.fetchall()}
+                for record in records:
+                    if record["id"] not in rejected and record["agent_id"] not in known:
+                        rejected[record["id"]] = f"Unknown agent_id {record['agent_id']}"
+        return rejected
+
+    @contextmanager
+    def cursor(self):
+        conn = self._pool.getconn()
+        try:
+            with conn:  # commits on success, rolls back on error
+                with conn.cursor() as cur:
+                    yield cur
+        finally:
+            # A connection the server dropped stays closed; don't hand it out again
+            self._pool.putconn(conn, close=bool(conn.closed))
+
+    def _encode(self, table: str, record: dict) -> tuple:
+        values = super()._encode(table, record)
+        if table == "campaigns" and record.get("suggested_budget") is None:
+            # NOT NULL DEFAULT 0 in the migration
+            index = COLUMNS["campaigns"].index("suggested_budget")
+            values = values[:index] + (0,) + values[index + 1:]
+        return values
+
+    def _decode(self, table: str, row) -> dict:
+        record = super()._decode(table, row)
+        for key, value in record.items():
+            if isinstance(value, Decimal):
+                record[key] = float(value)
+            elif isinstance(value, datetime):
+                record[key] = value.isoformat()
+            elif key in ("id", "agent_id") and value is not None:
+                record[key] = str(value)
+        return record
+
+    def _add_many(self, table, records):
+        if not records:
+            return
+        # execute_batch packs many rows per network round trip
+        with self.cursor() as cur:
+            self._execute_batch(cur, self._insert_sql(table, upsert=False),
+                                [self._encode(table, r) for r in records], page_size=500)
+
+    def stats(self) -> dict:
+        return {"backend": "postgres", **super().stats()}
+
+    def close(self) -> None:
+        self._pool.closeall()
@@ -0,0 +1,111 @@
+"""
+Shared SQL implementation for the SQLite and Postgres backends.
+
+Subclasses provide a cursor (one transaction per `with` block), the driver's
+parameter placeholder and DDL; the queries themselves are portable because
+both engines support `INSERT ... ON CONFLICT (id) DO UPDATE`.
+"""
+from abc import abstractmethod
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+import json
+
+from storage.base import COLUMNS, Storage
+
+
+class SQLStorage(Storage):
+    placeholder = "?"
+
+    @abstractmethod
+    @contextmanager
+    def cursor(self) -> Iterator:
+        """Yield a cursor inside a transaction that commits on exit"""
+
+    def _encode(self, table: str, record: dict) -> tuple:
+        return tuple(
+            json.dumps(record.get(col) or {}) if col == "metadata" else record.get(col)
+            for col in COLUMNS[table]
+        )
+
+    def _decode(self, table: str, row) -> dict:
+        record = dict(zip(COLUMNS[table], row))
+        if isinstance(record.get("metadata"), str):
+            record["metadata"] = json.loads(record["metadata"])
+        return record
+
+    def _insert_sql(self, table: str, upsert: bool) -> str:
+        cols = COLUMNS[table]
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            table, ", ".join(cols), ", ".join([self.placeholder] * len(cols))
+        )
+        if upsert:
+            sql += " ON CONFLICT (id) DO UPDATE SET " + ", ".join(
+                f"{col} = excluded.{col}" for col in cols if col != "id"
+            )
+        return sql
+
+    def _select_sql(self, table: str) -> str:
+        return "SELECT {} FROM {}".format(", ".join(COLUMNS[table]), table)
+
+    # ---- keyed tables ----
+
+    def list(self, table: str) -> List[dict]:
+        with self.cursor() as cur:
+            cur.execute(self._select_sql(table) + " ORDER BY created_at")
+            return [self._decode(table, row) for row in cur.fetchall()]
+
+    def get(self, table: str, record_id: str) -> Optional[dict]:
+        with self.cursor() as cur:
+            cur.execute(self._select_sql(table) + f" WHERE id = {self.placeholder}", (record_id,))
+            row = cur.fetchone()
+        return self._decode(table, row) if row else None
+
+    def save(self, table: str, record: dict) -> dict:
+        with self.cursor() as cur:
+            cur.execute(self._insert_sql(table, upsert=True), self._encode(table, record))
+        return record
+
+    def delete(self, table: str, record_id: str) -> bool:
+        with self.cursor() as cur:
+            cur.execute(f"DELETE FROM {table} WHERE id = {self.placeholder}", (record_id,))
+            return cur.rowcount > 0
+
+    # ---- append-only streams ----
+
+    def _add_many(self, table: str, records: List[dict]) -> None:
+        if not records:
+            return
+        with self.cursor() as cur:
+            cur.executemany(self._insert_sql(table, upsert=False),
+                            [self._encode(table, r) for r in records])
+
+    def _latest(self, table: str, key: str, value: Optional[str], order: str, limit: int) -> List[dict]:
+        sql = self._select_sql(table)
+        params: tuple = ()
+        if value is not None:
+            sql += f" WHERE {key} = {self.placeholder}"
+            params = (value,)
+        sql += f" ORDER BY {order} DESC LIMIT {self.placeholder}"
+        with self.cursor() as cur:
+            cur.execute(sql, params + (limit,))
+            return [self._decode(table, row) for row in cur.fetchall()]
+
+    def add_metrics(self, metrics: List[dict]) -> None:
+        self._add_many("metrics", metrics)
+
+    def latest_metrics(self, metric_type: Optional[str], limit: int) -> List[dict]:
+        return self._latest("metrics", "metric_type", metric_type, "recorded_at", limit)
+
+    def add_activities(self, activities: List[dict]) -> None:
+        self._add_many("activities", activities)
+
+    def latest_activities(self, agent_id: Optional[str], limit: int) -> List[dict]:
+        return self._latest("activities", "agent_id", agent_id, "created_at", limit)
+
+    def stats(self) -> dict:
+        counts = {}
+        with self.cursor() as cur:
+            for table in COLUMNS:
+                cur.execute(f"SELECT count(*) FROM {table}")
+                counts[table] = cur.fetchone()[0]
+        return counts
@@ -0,0 +1,114 @@
+"""
+Embedded SQLite backend for local runs.
+
+The database runs in WAL mode so readers never block the writer and several
+uvicorn workers can share one file. Each thread gets its own connection.
+"""
+from contextlib import contextmanager
+import os
+import sqlite3
+import threading
+
+from storage.base import InvalidRecord
+from storage.sql import SQLStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+  id TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  type TEXT NOT NULL,
+  icon TEXT NOT NULL DEFAULT 'brain',
+  confidence REAL NOT NULL DEFAULT 0,
+  current_task TEXT DEFAULT '',
+  progress REAL NOT NULL DEFAULT 0,
+  mode TEXT NOT NULL DEFAULT 'auto',
+  status TEXT NOT NULL DEFAULT 'idle',
+  created_at TEXT,
+  updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+  id TEXT PRIMARY KEY,
+  metric_type TEXT NOT NULL,
+  value REAL NOT NULL,
+  metadata TEXT DEFAULT '{}',
+  recorded_at TEXT,
+  created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS campaigns (
+  id TEXT PRIMARY KEY,
+  platform TEXT NOT NULL,
+  current_budget REAL NOT NULL DEFAULT 0,
+  suggested_budget REAL,
+  roi REAL NOT NULL DEFAULT 0,
+  impressions INTEGER NOT NULL DEFAULT 0,
+  conversions INTEGER NOT NULL DEFAULT 0,
+  cpa REAL NOT NULL DEFAULT 0,
+  metadata TEXT DEFAULT '{}',
+  created_at TEXT,
+  updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS activities (
+  id TEXT PRIMARY KEY,
+  agent_id TEXT,
+  activity_type TEXT NOT NULL,
+  description TEXT NOT NULL,
+  metadata TEXT DEFAULT '{}',
+  created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_type_time ON metrics(metric_type, recorded_at DESC);
+CREATE INDEX IF NOT EXISTS idx_metrics_time ON metrics(recorded_at DESC);
+CREATE INDEX IF NOT EXISTS idx_activities_agent ON activities(agent_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_activities_time ON activities(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_campaigns_platform ON campaigns(platform);
+"""
+
+
+class SQLiteStorage(SQLStorage):
+    placeholder = "?"
+    rejected_errors = (InvalidRecord, sqlite3.IntegrityError, sqlite3.DataError)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL only fsyncs at checkpoints; a crash loses at most
+            # the last few transactions, never corrupts the file
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def cursor(self):
+        conn = self._connect()
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        try:
+            yield cur
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            cur.close()
+
+    def stats(self) -> dict:
+        info = {"backend": "sqlite", "path": self.path, **super().stats()}
+        if os.path.exists(self.path):
+            info["bytes"] = os.path.getsize(self.path)
+        return info
+
+    def close(self) -> None:
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+        self._local = threading.local()
@@ -0,0 +1,222 @@
+"""
+Write-behind batching for append-only streams.
+
+`submit` only appends to an in-memory list; a background thread hands the
+pending records to the backend in bulk (one transaction per batch) whenever
+`max_batch` records are waiting or `flush_interval` seconds have passed.
+Ingest throughput is then bounded by batch inserts, not per-row commits.
+
+The API has already acknowledged buffered records, so a failed write never
+drops them by itself:
+
+- When the backend refuses the records (`rejected_errors`, e.g. a failed
+  constraint), the batch is written row by row; the rows it still refuses
+  are dead-lettered (dropped from the stream, counted and kept in a bounded
+  list for inspection) and the rest are stored.
+- Any other error (connection lost, database down) puts the whole batch
+  back at the head of the queue and backs off, doubling from
+  `flush_interval` up to `max_backoff` seconds. Nothing is written, and no
+  read forces a write, until the backoff has passed; records stay in memory
+  for as long as the outage lasts.
+"""
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+from storage.base import Storage
+
+
+class WriteBehindBuffer:
+
+    def __init__(self, flush_fn: Callable[[List[dict]], None], max_batch: int = 500,
+                 flush_interval: float = 0.2, max_pending: int = 100000, name: str = "write-behind",
+                 rejected_errors: Tuple[type, ...] = (), max_backoff: float = 5.0,
+                 dead_letter_size: int = 1000):
+        self._flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.rejected_errors = rejected_errors
+        self.max_backoff = max_backoff
+        self.name = name
+        self._pending: List[dict] = []
+        self._writing = 0  # records taken by a flush that hasn't finished
+        self.dead_letters = deque(maxlen=dead_letter_size)  # {"record", "error"}
+        self.dead_lettered = 0
+        self._backoff = 0.0
+        self._retry_at = 0.0  # monotonic time before which no write is attempted
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # keeps batches in submission order
+        self._closed = False
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, records: List[dict]) -> None:
+        with self._cond:
+            self._pending.extend(records)
+            pending = len(self._pending)
+            if pending >= self.max_batch:
+                self._cond.notify()
+        if pending >= self.max_pending:
+            # Backpressure: the flusher can't keep up, write from the caller
+            self.flush()
+
+    def pending(self) -> int:
+        return len(self._pending) + self._writing
+
+    def flush(self, force: bool = False) -> None:
+        """Write everything pending, unless backing off from a failure (`force` ignores that)"""
+        with self._flush_lock:
+            if not force and time.monotonic() < self._retry_at:
+                return
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._writing = len(batch)
+            if not batch:
+                return
+            try:
+                self._flush_fn(batch)
+            except self.rejected_errors:
+                self._flush_rows(batch)
+                return
+            except Exception as exc:
+                self._requeue(batch, exc)
+                return
+            finally:
+                self._writing = 0
+            self.flushed += len(batch)
+            self.batches += 1
+            self._recovered()
+
+    def _flush_rows(self, batch: List[dict]) -> None:
+        """Write a refused batch one record at a time; caller holds _flush_lock"""
+        refused = []
+        for index, record in enumerate(batch):
+            try:
+                self._flush_fn([record])
+            except self.rejected_errors as exc:
+                refused.append(record)
+                self.dead_letters.append({"record": record, "error": str(exc)})
+                continue
+            except Exception as exc:
+                self._requeue(batch[index:], exc)
+                break
+            self.flushed += 1
+        else:
+            self._recovered()
+        if refused:
+            self.dead_lettered += len(refused)
+            print(f"Warning: {self.name} dropped {len(refused)} record(s) the database refused, "
+                  f"e.g. {refused[0].get('id')}: {self.dead_letters[-1]['error']}")
+
+    def _requeue(self, records: List[dict], exc: Exception) -> None:
+        """Put records back ahead of newer ones and back off; caller holds _flush_lock"""
+        self.failures += 1
+        if not self._backoff:
+            print(f"Warning: {self.name} could not write {len(records)} records ({exc}); "
+                  f"keeping them and retrying with backoff")
+        self._backoff = min(self.max_backoff, self._backoff * 2 or self.flush_interval)
+        with self._cond:
+            self._pending[:0] = records
+            self._retry_at = time.monotonic() + self._backoff
+
+    def _recovered(self) -> None:
+        if self._backoff:
+            print(f"{self.name} writes recovered")
+            self._backoff = 0.0
+            self._retry_at = 0.0
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed:
+                    # A full batch goes at once, but never before a backoff has passed
+                    due = deadline if len(self._pending) < self.max_batch else 0.0
+                    remaining = max(due, self._retry_at) - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+            if closed:
+                return
+            self.flush()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush(force=True)
+
+    def stats(self) -> dict:
+        return {"pending": self.pending(), "flushed": self.flushed, "batches": self.batches,
+                "failures": self.failures, "dead_lettered": self.dead_lettered,
+                "backoff_seconds": self._backoff}
+
+
+class BufferedStorage(Storage):
+    """Wraps a durable backend so metric and activity inserts are write-behind.
+
+    Reads of a stream flush that stream's buffer first, so a client always sees
+    its own writes; keyed tables pass straight through.
+    """
+
+    def __init__(self, inner: Storage, max_batch: int = 500, flush_interval: float = 0.2):
+        self.inner = inner
+        self.metrics_buffer = WriteBehindBuffer(inner.add_metrics, max_batch, flush_interval,
+                                                name="metrics-writer", rejected_errors=inner.rejected_errors)
+        self.activities_buffer = WriteBehindBuffer(inner.add_activities, max_batch, flush_interval,
+                                                   name="activities-writer",
+                                                   rejected_errors=inner.rejected_errors)
+
+    def list(self, table: str) -> List[dict]:
+        return self.inner.list(table)
+
+    def get(self, table: str, record_id: str) -> Optional[dict]:
+        return self.inner.get(table, record_id)
+
+    def save(self, table: str, record: dict) -> dict:
+        return self.inner.save(table, record)
+
+    def delete(self, table: str, record_id: str) -> bool:
+        return self.inner.delete(table, record_id)
+
+    def reject(self, table: str, records: List[dict]) -> Dict[str, str]:
+        return self.inner.reject(table, records)
+
+    def add_metrics(self, metrics: List[dict]) -> None:
+        self.metrics_buffer.submit(metrics)
+
+    def latest_metrics(self, metric_type: Optional[str], limit: int) -> List[dict]:
+        self.metrics_buffer.flush()
+        return self.inner.latest_metrics(metric_type, limit)
+
+    def add_activities(self, activities: List[dict]) -> None:
+        self.activities_buffer.submit(activities)
+
+    def latest_activities(self, agent_id: Optional[str], limit: int) -> List[dict]:
+        self.activities_buffer.flush()
+        return self.inner.latest_activities(agent_id, limit)
+
+    def stats(self) -> dict:
+        return {
+            **self.inner.stats(),
+            "write_behind": {
+                "metrics": self.metrics_buffer.stats(),
+                "activities": self.activities_buffer.stats(),
+            },
+        }
+
+    def flush(self) -> None:
+        self.metrics_buffer.flush()
+        self.activities_buffer.flush()
+
+    def close(self) -> None:
+        self.metrics_buffer.close()
+        self.activities_buffer.close()
+        self.inner.close()
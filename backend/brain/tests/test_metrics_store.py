@@ -0,0 +1,32 @@
+import sys
+import time
+
+from metrics_store import MetricsStore
+
+
+def test_expire_counts_points_dropped_by_retention():
+    store = MetricsStore(max_points=100, max_age_seconds=60)
+    now = time.time()
+    store.append("old", "cpa", 1.0, ts=now - 120)
+    store.append("new", "cpa", 2.0, ts=now)
+    assert store.expired == 1  # the append already trimmed the old point
+    assert store.expire() == 1
+
+    store.max_age_seconds = 0.05
+    time.sleep(0.1)
+    assert store.expire() == 2
+    assert store.latest() == []
+
+
+def test_nbytes_tracks_stored_objects():
+    store = MetricsStore(max_points=3, max_age_seconds=60)
+    now = time.time()
+    for i in range(5):  # wraps around, overwriting two slots
+        store.append(f"point-{i}", "cpa", float(i), metadata={"n": i} if i % 2 else None, ts=now - 10 + i)
+    buf = store._buffers["cpa"]
+    walked = sum(sys.getsizeof(buf.ids[slot]) + (sys.getsizeof(buf.metadata[slot]) if buf.metadata[slot] else 0)
+                 for slot in buf.newest_slots())
+    assert buf.object_bytes == walked
+    store.max_age_seconds = 1e-9
+    store.expire()
+    assert buf.size == 0 and buf.object_bytes == 0
@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+import time
+
+from storage.sqlite import SQLiteStorage
+from storage.write_behind import BufferedStorage, WriteBehindBuffer
+
+
+class FlakyDatabase:
+    """Stores batches, except while `down` is set, when every write fails like a lost connection"""
+
+    def __init__(self):
+        self.rows = []
+        self.calls = 0
+        self.down = threading.Event()
+
+    def write(self, records):
+        self.calls += 1
+        if self.down.is_set():
+            raise ConnectionError("server closed the connection unexpectedly")
+        self.rows.extend(records)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+def test_outage_keeps_acknowledged_records():
+    db = FlakyDatabase()
+    buffer = WriteBehindBuffer(db.write, max_batch=100, flush_interval=0.02, max_backoff=0.2,
+                               rejected_errors=(sqlite3.IntegrityError,))
+    try:
+        db.down.set()
+        buffer.submit([{"id": str(i)} for i in range(1000)])
+        time.sleep(1.0)
+        for _ in range(20):
+            buffer.flush()  # reads force a flush; they must not hammer a dead database
+        calls_during_outage = db.calls
+        db.down.clear()
+        wait_for(lambda: buffer.pending() == 0)
+    finally:
+        buffer.close()
+
+    assert [r["id"] for r in db.rows] == [str(i) for i in range(1000)]
+    assert buffer.dead_lettered == 0
+    # Whole-batch retries with backoff: a handful of attempts, not one per row or per flush
+    assert calls_during_outage < 20
+    assert buffer.stats()["backoff_seconds"] == 0
+
+
+def test_refused_rows_are_dead_lettered_and_the_rest_stored(tmp_path):
+    storage = BufferedStorage(SQLiteStorage(str(tmp_path / "brain.db")), max_batch=10, flush_interval=0.02)
+    try:
+        metric = {"metric_type": "cpa", "value": 1.0, "metadata": {},
+                  "recorded_at": "2026-01-01T00:00:00", "created_at": "2026-01-01T00:00:00"}
+        storage.add_metrics([{**metric, "id": "a"}, {**metric, "id": "b"}])
+        storage.flush()
+        # "a" is already stored: the second batch is refused, and only that row is dropped
+        storage.add_metrics([{**metric, "id": "c"}, {**metric, "id": "a"}, {**metric, "id": "d"}])
+        stored = {m["id"] for m in storage.latest_metrics(None, 10)}
+        stats = storage.metrics_buffer.stats()
+    finally:
+        storage.close()
+
+    assert stored == {"a", "b", "c", "d"}
+    assert stats["dead_lettered"] == 1 and stats["pending"] == 0
+    assert storage.metrics_buffer.dead_letters[0]["record"]["id"] == "a"
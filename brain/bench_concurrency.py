@@ -0,0 +1,102 @@
+"""
+Load benchmark: in-flight /analyze capacity of one worker, sync vs async.
+
+"before" replays the previous request shape: a sync `def` handler that blocks
+a threadpool worker on every Redis round trip (exists/set/delete) and on the
+LLM call. "after" drives the real async app (redis.asyncio + ainvoke). Both
+use in-process fakes with the same simulated latencies, so no Redis server,
+Groq key or network is needed.
+
+"before" saturates at the threadpool size (40 workers by default); "after" is
+bounded by LangGraph's per-invocation CPU cost (~10ms), so raise
+--llm-latency to see the gap widen. With few requests in flight nothing
+queues for a thread, and "before" wins by that graph overhead.
+
+Usage: python bench_concurrency.py [--concurrency 10,100,500,1000] [--llm-latency 0.5]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Every request should reach the LLM: no decision cache, no rule fast path
+os.environ.setdefault("DECISION_CACHE_TTL", "0")
+os.environ.setdefault("RULE_FAST_PATH", "0")
+
+from fastapi import FastAPI
+import httpx
+
+import main
+from fake_llm import FakeDecisionLLM
+from fake_redis import FakeAsyncRedis, FakeRedis
+from lock_manager import AsyncLockManager
+from single_flight import SingleFlight
+
+
+def build_before_app(redis_latency, llm_latency):
+    legacy_redis = FakeRedis(latency=redis_latency)
+    legacy_llm = FakeDecisionLLM(latency=llm_latency)
+    legacy = FastAPI()
+
+    @legacy.post("/analyze")
+    def run_agent(data: main.RequestData):
+        lock_key = f"lock:{data.campaign_id}"
+        if legacy_redis.exists(lock_key):
+            return {"campaign_id": data.campaign_id, "decision": "SKIPPED"}
+        legacy_redis.set(lock_key, "processing", ex=10)
+        response = legacy_llm.invoke(f"Campaign: {data.campaign_name}\nCPA: ${data.cpa}")
+        legacy_redis.delete(lock_key)
+        return {"campaign_id": data.campaign_id, "decision": response.content}
+
+    return legacy
+
+
+def use_fakes_in_main(redis_latency, llm_latency):
+    # Everything main reaches Redis through: locks, and the knowledge-base version check
+    main.r = FakeAsyncRedis(latency=redis_latency)
+    main.locks = AsyncLockManager(main.r, prefix="lock:", ttl_ms=10000)
+    main.flights = SingleFlight()  # in-process only: no Redis server to coordinate through
+    main.llm.override(FakeDecisionLLM(latency=llm_latency))
+    # Build the rest up front so the first requests don't pay for it
+    for component in main.COMPONENTS:
+        component.get()
+
+
+async def fire(app, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits,
+                                 timeout=None) as client:
+        async def one(i):
+            t0 = time.perf_counter()
+            response = await client.post("/analyze", json={"campaign_id": f"bench-{i}", "cpa": 42.0, "spend": 100.0})
+            response.raise_for_status()
+            return time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        latencies = sorted(await asyncio.gather(*(one(i) for i in range(concurrency))))
+        elapsed = time.perf_counter() - t0
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return elapsed, p50, p95
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", default="10,100,500,1000")
+    parser.add_argument("--redis-latency", type=float, default=0.001)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    before = build_before_app(args.redis_latency, args.llm_latency)
+    use_fakes_in_main(args.redis_latency, args.llm_latency)
+
+    print(f"{'mode':<7} {'in-flight':>9} {'wall (s)':>9} {'req/s':>8} {'p50 (s)':>8} {'p95 (s)':>8}")
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        for label, app in (("before", before), ("after", main.app)):
+            elapsed, p50, p95 = asyncio.run(fire(app, concurrency))
+            print(f"{label:<7} {concurrency:>9} {elapsed:>9.2f} {concurrency / elapsed:>8.1f} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,81 @@
+"""
+Benchmark: json.loads on the full answer vs the streaming decision parser.
+
+FakeDecisionLLM answers each analyze prompt in one of the styles real models
+drift into (clean JSON, code fences, prose around the object, single-quoted
+pseudo-JSON). "json.loads" is the previous behaviour: wait for the whole
+answer, json.loads it, ERROR on anything else. "streaming" is DecisionParser:
+stop reading once the decision object is complete, one repair call when
+there is none. Output tokens are the fake's word count (json.loads) or the
+chunks actually read (streaming).
+
+Usage: python bench_decision_parser.py [--requests 200] [--latency 0.2] [--token-latency 0.01]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import main
+from decision_parser import DecisionParseError, DecisionParser
+from fake_llm import FakeDecisionLLM
+
+STYLES = ("json", "fenced", "chatty", "broken")
+
+
+def prompts(count):
+    return [{"name": f"Campaign {i}", "cpa": float(i % 80), "context": "If CPA is above $50, PAUSE."}
+            for i in range(count)]
+
+
+async def run_legacy(llm, inputs):
+    chain = main.analyze_prompt() | llm
+    tokens = 0
+
+    async def one(i):
+        nonlocal tokens
+        response = await chain.ainvoke(i)
+        tokens += response.usage_metadata["output_tokens"]
+        result = json.loads(response.content)
+        return {"decision": result['decision'], "reason": result['reason']}
+
+    results = await asyncio.gather(*(one(i) for i in inputs), return_exceptions=True)
+    return results, tokens
+
+
+async def run_streaming(llm, inputs):
+    parser = DecisionParser()
+
+    async def one(i):
+        return await parser.decide(lambda: (main.analyze_prompt() | llm).astream(i),
+                                   lambda answer: (main.repair_prompt() | llm).astream({"answer": answer}))
+
+    results = await asyncio.gather(*(one(i) for i in inputs), return_exceptions=True)
+    return results, parser.stats()["chunks"]
+
+
+def report(style, mode, results, tokens, llm, elapsed):
+    failed = sum(isinstance(r, (ValueError, KeyError, DecisionParseError)) for r in results)
+    print(f"{style:<8} {mode:<10} {len(results) - failed:>6} {failed:>7} {llm.calls:>6} "
+          f"{tokens / len(results):>12.1f} {elapsed:>9.2f}")
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    inputs = prompts(args.requests)
+    print(f"{'style':<8} {'mode':<10} {'ok':>6} {'failed':>7} {'calls':>6} {'out tokens/req':>12} {'wall (s)':>9}")
+    for style in STYLES:
+        for mode, runner in (("json.loads", run_legacy), ("streaming", run_streaming)):
+            llm = FakeDecisionLLM(latency=args.latency, token_latency=args.token_latency, style=style)
+            t0 = time.perf_counter()
+            results, tokens = asyncio.run(runner(llm, inputs))
+            report(style, mode, results, tokens, llm, time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,76 @@
+"""
+Benchmark: a burst of analyze prompts, direct ainvoke vs LLMScheduler.
+
+Uses the real analyze prompt with FakeDecisionLLM playing a provider that
+answers after --latency seconds and rejects calls beyond --provider-limit
+per second, like Groq's 429s. "direct" is the previous behaviour, one
+chain.ainvoke per request, all at once. "scheduled" sends the same prompts
+through LLMScheduler (chain.abatch batches, bounded concurrency, token
+bucket sized so that rate + burst stays within the provider limit).
+
+Usage: python bench_llm_scheduler.py [--requests 500] [--latency 0.5] [--provider-limit 100]
+"""
+import argparse
+import asyncio
+import time
+
+import main
+from fake_llm import FakeDecisionLLM
+from llm_scheduler import LLMScheduler
+
+
+def prompts(count):
+    return [{"name": f"Campaign {i}", "cpa": float(i % 80), "context": "If CPA is above $50, PAUSE."}
+            for i in range(count)]
+
+
+async def run_direct(llm, inputs):
+    chain = main.analyze_prompt() | llm
+    return await asyncio.gather(*(chain.ainvoke(i) for i in inputs), return_exceptions=True)
+
+
+async def run_scheduled(llm, inputs, args):
+    chain = main.analyze_prompt() | llm
+
+    async def run_batch(batch):
+        return await chain.abatch(batch, return_exceptions=True)
+
+    scheduler = LLMScheduler(run_batch, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000,
+                             max_concurrency=args.max_concurrency,
+                             rate=args.provider_limit * 0.8, burst=args.provider_limit * 0.2)
+    results = await asyncio.gather(*(scheduler.submit(i) for i in inputs), return_exceptions=True)
+    return results, scheduler.stats()
+
+
+def report(label, results, llm, elapsed, stats=None):
+    failed = sum(isinstance(r, BaseException) for r in results)
+    extra = f"  batches={stats['batches']} avg_batch={stats['avg_batch_size']:.1f}" if stats else ""
+    print(f"{label:<10} {len(results) - failed:>6} {failed:>7} {elapsed:>9.2f} {llm.peak_in_flight:>9}{extra}")
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--provider-limit", type=float, default=100)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    inputs = prompts(args.requests)
+    print(f"{'mode':<10} {'ok':>6} {'failed':>7} {'wall (s)':>9} {'peak calls':>9}")
+
+    llm = FakeDecisionLLM(latency=args.latency, rate_limit=args.provider_limit)
+    t0 = time.perf_counter()
+    results = asyncio.run(run_direct(llm, inputs))
+    report("direct", results, llm, time.perf_counter() - t0)
+
+    llm = FakeDecisionLLM(latency=args.latency, rate_limit=args.provider_limit)
+    t0 = time.perf_counter()
+    results, stats = asyncio.run(run_scheduled(llm, inputs, args))
+    report("scheduled", results, llm, time.perf_counter() - t0, stats)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,136 @@
+"""
+Benchmark: rule retrieval latency and recall, local index vs Chroma.
+
+Builds a synthetic rule corpus (metric thresholds, actions, campaign
+segments), then queries it with noisy paraphrases of known rules: a word
+dropped, a synonym swapped, a typo. Recall@k is the share of queries whose
+source rule is in the top k. Chroma with FakeEmbeddings is included when
+chromadb is installed (its recall is chance level: the vectors are random).
+
+Usage: python bench_retriever.py [--rules 10000] [--queries 1000] [--chroma-rules 2000]
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from retriever import HashingEmbedder, MatrixIndex
+
+METRICS = ["CPA", "CPC", "CTR", "ROAS", "frequency", "conversion rate", "daily spend", "bounce rate"]
+COMPARATORS = ["above", "below", "over", "under"]
+ACTIONS = ["PAUSE the campaign", "SCALE the budget by 20%", "MAINTAIN and monitor",
+           "lower the bid by 15%", "raise the bid by 10%", "alert the account manager"]
+SEGMENTS = ["Brand Awareness", "Retargeting", "Holiday Sale", "Lead Gen", "App Install",
+            "Spring Launch", "Black Friday", "Newsletter", "Local Store", "Video Views"]
+CHANNELS = ["on Facebook", "on Google Search", "on TikTok", "on LinkedIn", "on YouTube", "in email"]
+SYNONYMS = {"above": "over", "below": "under", "PAUSE": "stop", "SCALE": "grow", "campaign": "campaigns"}
+
+
+def make_corpus(count, rng):
+    rules = set()
+    while len(rules) < count:
+        rules.add(f"If {rng.choice(METRICS)} is {rng.choice(COMPARATORS)} {rng.randint(1, 500)} "
+                  f"for '{rng.choice(SEGMENTS)}' campaigns {rng.choice(CHANNELS)}, {rng.choice(ACTIONS)}.")
+    return sorted(rules)
+
+
+def paraphrase(rule, rng):
+    words = rule.split()
+    words.pop(rng.randrange(len(words)))
+    words = [SYNONYMS.get(w, w) for w in words]
+    i = rng.randrange(len(words))
+    if len(words[i]) > 3:
+        j = rng.randrange(len(words[i]) - 1)
+        words[i] = words[i][:j] + words[i][j + 1] + words[i][j] + words[i][j + 2:]
+    return " ".join(words)
+
+
+def recall(results, targets, k):
+    return sum(target in [text for text, _ in hits[:k]] for hits, target in zip(results, targets)) / len(targets)
+
+
+def bench_local(label, rules, queries, targets, dtype):
+    index = MatrixIndex(HashingEmbedder(dim=512), dtype=dtype)
+    t0 = time.perf_counter()
+    index.build(rules)
+    build = time.perf_counter() - t0
+
+    singles = []
+    for query in queries:
+        t0 = time.perf_counter()
+        index.search(query, k=5)
+        singles.append(time.perf_counter() - t0)
+    singles.sort()
+
+    t0 = time.perf_counter()
+    results = index.search_batch(queries, k=5)
+    batched = (time.perf_counter() - t0) / len(queries)
+
+    report(label, len(rules), build, singles[len(singles) // 2], batched,
+           recall(results, targets, 1), recall(results, targets, 5), index.nbytes())
+
+
+def bench_chroma(rules, queries, targets):
+    try:
+        from langchain_community.embeddings import FakeEmbeddings
+        from langchain_community.vectorstores import Chroma
+    except ImportError:
+        print("chroma: not installed, skipped")
+        return
+    path = tempfile.mkdtemp(prefix="bench_chroma_")
+    try:
+        t0 = time.perf_counter()
+        db = Chroma(persist_directory=path, embedding_function=FakeEmbeddings(size=4096))
+        db.add_texts(rules)
+        build = time.perf_counter() - t0
+
+        singles, results = [], []
+        for query in queries:
+            t0 = time.perf_counter()
+            docs = db.similarity_search(query, k=5)
+            singles.append(time.perf_counter() - t0)
+            results.append([(doc.page_content, 0.0) for doc in docs])
+        singles.sort()
+        report("chroma (FakeEmbeddings 4096)", len(rules), build, singles[len(singles) // 2], None,
+               recall(results, targets, 1), recall(results, targets, 5), len(rules) * 4096 * 4)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def report(label, rules, build, p50, batched, recall1, recall5, nbytes):
+    batched = f"{batched * 1e6:>10.1f}" if batched is not None else f"{'-':>10}"
+    print(f"{label:<30} {rules:>7} {build:>8.2f} {p50 * 1e6:>10.1f} {batched} "
+          f"{recall1:>6.3f} {recall5:>6.3f} {nbytes / 1e6:>8.1f}")
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--chroma-rules", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = make_corpus(args.rules, rng)
+    targets = [rng.choice(rules) for _ in range(args.queries)]
+    queries = [paraphrase(target, rng) for target in targets]
+
+    print(f"{'retriever':<30} {'rules':>7} {'build s':>8} {'p50 us':>10} {'batch us':>10} "
+          f"{'R@1':>6} {'R@5':>6} {'MB':>8}")
+    bench_local("local float32 (dim 512)", rules, queries, targets, np.float32)
+    bench_local("local float16 (dim 512)", rules, queries, targets, np.float16)
+
+    # Chroma is orders of magnitude slower to build; use a prefix of the corpus
+    small = rules[:args.chroma_rules]
+    small_targets = [rng.choice(small) for _ in range(min(args.queries, 200))]
+    small_queries = [paraphrase(target, rng) for target in small_targets]
+    bench_local("local float32 (same corpus)", small, small_queries, small_targets, np.float32)
+    bench_chroma(small, small_queries, small_targets)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,108 @@
+"""
+Lazily initialised service components with health reporting.
+
+A Component wraps a factory (build the LLM client, open the rule store, ...).
+Nothing runs at import time: the app's lifespan warms components in the
+background, and the first caller that needs one before then builds it
+itself. A failing factory does not take the process down; the component
+reports `failed` with the error, and the next `get()` retries, at most once
+per `retry_seconds`.
+"""
+from typing import Any, Callable, Dict, Iterable, Optional
+import asyncio
+import threading
+import time
+
+PENDING = "pending"
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+class ComponentUnavailable(RuntimeError):
+    """A component's factory failed; the message carries its error"""
+
+
+class Component:
+    def __init__(self, name: str, factory: Callable[[], Any], required: bool = True,
+                 retry_seconds: float = 5.0):
+        self.name = name
+        self.factory = factory
+        self.required = required  # readiness waits for required components only
+        self.retry_seconds = retry_seconds
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.init_seconds: Optional[float] = None
+        self._value = None
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    def get(self):
+        """The component, building it first if needed (blocks while building)"""
+        if self.status == READY:
+            return self._value
+        with self._lock:
+            if self.status == READY:
+                return self._value
+            if self.status == FAILED and time.monotonic() - self._failed_at < self.retry_seconds:
+                raise ComponentUnavailable(f"{self.name}: {self.error}")
+            self.status = STARTING
+            t0 = time.perf_counter()
+            try:
+                value = self.factory()
+            except Exception as exc:
+                self.status = FAILED
+                self.error = f"{type(exc).__name__}: {exc}"
+                self._failed_at = time.monotonic()
+                print(f"Warning: {self.name} failed to start ({self.error})")
+                raise ComponentUnavailable(f"{self.name}: {self.error}") from exc
+            self.init_seconds = time.perf_counter() - t0
+            self._value = value
+            self.error = None
+            self.status = READY
+            return value
+
+    async def aget(self):
+        """get() for async code: building happens in a worker thread"""
+        if self.status == READY:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def override(self, value):
+        """Install a ready-made value (tests and benchmarks)"""
+        with self._lock:
+            self._value = value
+            self.error = None
+            self.init_seconds = 0.0
+            self.status = READY
+
+    def health(self) -> dict:
+        health = {"status": self.status, "required": self.required}
+        if self.init_seconds is not None:
+            health["init_seconds"] = round(self.init_seconds, 4)
+        if self.error:
+            health["error"] = self.error
+        return health
+
+
+async def warm_up(components: Iterable[Component]):
+    """Build every component concurrently; failures stay in their health"""
+    async def start(component):
+        try:
+            await component.aget()
+        except ComponentUnavailable:
+            pass
+
+    await asyncio.gather(*(start(c) for c in components))
+
+
+def readiness(components: Iterable[Component]) -> Dict[str, Any]:
+    components = list(components)
+    return {
+        "ready": all(c.ready for c in components if c.required),
+        "components": {c.name: c.health() for c in components},
+    }
@@ -0,0 +1,161 @@
+"""
+Two-tier cache for LLM decisions.
+
+A decision depends on the campaign name, its CPA, the rule retrieved for it,
+the prompt and the model. The cache key is built from exactly those inputs
+(CPA rounded to `cpa_bucket`, the rule hashed) plus the knowledge-base
+version, so a repeated evaluation of the same campaign state skips the LLM
+call entirely.
+
+Lookups go to a small in-process LRU first and then to Redis, which is shared
+by every worker. Both tiers expire entries by TTL. When the knowledge base
+changes, `invalidate()` switches to the new version: the local tier is
+dropped and old Redis entries simply stop matching and age out.
+
+Redis failures are counted and treated as misses; the cache never fails a
+request.
+"""
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import json
+import threading
+import time
+
+
+def content_hash(*parts: str) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DecisionCache:
+    """In-process LRU in front of a Redis tier, both with TTL expiry"""
+
+    def __init__(
+        self,
+        redis_client=None,
+        prefix: str = "decision:",
+        ttl_seconds: int = 3600,
+        local_size: int = 1024,
+        local_ttl_seconds: float = 60.0,
+        cpa_bucket: float = 0.01,
+        kb_version: str = "",
+    ):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.local_size = local_size
+        self.local_ttl_seconds = min(local_ttl_seconds, ttl_seconds)
+        self.cpa_bucket = cpa_bucket
+        self.kb_version = kb_version
+        self._local = OrderedDict()  # key -> (expires_at, decision)
+        self._lock = threading.Lock()
+        self._stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "stores": 0,
+                       "evictions": 0, "invalidations": 0, "redis_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def bucket(self, cpa: float) -> str:
+        return f"{round(cpa / self.cpa_bucket) * self.cpa_bucket:.4f}"
+
+    def key(self, campaign_name: str, cpa: float, rag_context: str, model_version: str) -> str:
+        digest = content_hash(campaign_name, self.bucket(cpa), content_hash(rag_context),
+                              model_version, self.kb_version)
+        return f"{self.prefix}{digest}"
+
+    # ==================== LOOKUP ====================
+
+    async def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        decision = self._get_local(key)
+        if decision is not None:
+            self._count("local_hits")
+            return decision
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(key)
+            except Exception as exc:
+                self._redis_error(exc)
+                raw = None
+            if raw is not None:
+                decision = json.loads(raw)
+                self._put_local(key, decision)
+                self._count("redis_hits")
+                return decision
+
+        self._count("misses")
+        return None
+
+    async def set(self, key: str, decision: dict):
+        if not self.enabled:
+            return
+        self._put_local(key, decision)
+        self._count("stores")
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, json.dumps(decision), ex=self.ttl_seconds)
+            except Exception as exc:
+                self._redis_error(exc)
+
+    def invalidate(self, kb_version: str):
+        """Switch to a new knowledge-base version and drop the local tier"""
+        with self._lock:
+            changed = kb_version != self.kb_version
+            self.kb_version = kb_version
+            self._local.clear()
+            if changed:
+                self._stats["invalidations"] += 1
+
+    # ==================== LOCAL TIER ====================
+
+    def _get_local(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry[1]
+
+    def _put_local(self, key: str, decision: dict):
+        if self.local_size <= 0:
+            return
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl_seconds, decision)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    # ==================== STATS ====================
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _redis_error(self, exc: Exception):
+        with self._lock:
+            self._stats["redis_errors"] += 1
+            first = self._stats["redis_errors"] == 1
+        if first:
+            print(f"Warning: decision cache Redis tier unavailable ({exc}); using the local tier only")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["local_size"] = len(self._local)
+        hits = stats["local_hits"] + stats["redis_hits"]
+        lookups = hits + stats["misses"]
+        stats["enabled"] = self.enabled
+        stats["kb_version"] = self.kb_version
+        stats["hit_ratio"] = hits / lookups if lookups else 0.0
+        return stats
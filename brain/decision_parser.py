@@ -0,0 +1,167 @@
+"""
+Tolerant, incremental parsing of the analyze decision from LLM output.
+
+The model is asked for `{"decision": ..., "reason": ...}` but sometimes
+wraps it in code fences, adds prose around it or keeps talking after the
+closing brace. DecisionExtractor scans the text as it streams in, tracking
+brace depth and JSON strings, and tries every complete top-level object it
+sees; the first one with a known decision and a reason wins. Keys are
+matched case-insensitively and the decision is upper-cased.
+
+DecisionParser reads a token stream until that object completes and then
+closes the stream, which stops generation on the provider side. When the
+whole answer contains no usable object it makes one repair call (a short
+prompt with just the bad answer, no campaign context) before giving up with
+DecisionParseError. Its stats() report how often each of those happened.
+"""
+from typing import AsyncIterator, Callable, Dict, NamedTuple, Optional
+import json
+
+from rule_compiler import ACTIONS
+
+
+class DecisionParseError(ValueError):
+    """The model's answer held no usable decision, even after a repair attempt"""
+
+
+class DecisionExtractor:
+    """Feed text chunks; `result` is set once a complete decision object has arrived"""
+
+    def __init__(self):
+        self.text = ""
+        self.result: Optional[Dict[str, str]] = None
+        self._pos = 0  # next character to scan
+        self._start = -1  # offset of the open top-level object
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Optional[Dict[str, str]]:
+        self.text += chunk
+        if self.result is not None:
+            return self.result
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = self._depth > 0
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.result = decision_from(text[self._start:i + 1])
+                    if self.result is not None:
+                        self._pos = i + 1
+                        return self.result
+        self._pos = len(text)
+        return None
+
+
+def decision_from(candidate: str) -> Optional[Dict[str, str]]:
+    """{"decision", "reason"} from one JSON object, or None if it isn't one"""
+    try:
+        obj = json.loads(candidate)
+    except ValueError:
+        return None
+    if not isinstance(obj, dict):
+        return None
+    fields = {str(k).strip().lower(): v for k, v in obj.items()}
+    decision = str(fields.get("decision", "")).strip().upper()
+    reason = fields.get("reason")
+    if decision not in ACTIONS or reason is None:
+        return None
+    return {"decision": decision, "reason": str(reason)}
+
+
+def extract_decision(text: str) -> Optional[Dict[str, str]]:
+    """First usable decision object anywhere in `text`"""
+    return DecisionExtractor().feed(text)
+
+
+class Reading(NamedTuple):
+    decision: Optional[Dict[str, str]]
+    text: str
+    chunks: int
+    stopped_early: bool  # we closed the stream as soon as the object completed
+    usage: Dict[str, int]  # token usage reported in the stream, if any
+
+
+def _content(chunk) -> str:
+    content = getattr(chunk, "content", chunk)
+    return content if isinstance(content, str) else ""
+
+
+async def read_decision(stream: AsyncIterator) -> Reading:
+    """Consume a message-chunk stream until a decision object completes"""
+    extractor = DecisionExtractor()
+    chunks = 0
+    stopped_early = False
+    usage = {}
+    try:
+        async for chunk in stream:
+            chunks += 1
+            for kind, tokens in (getattr(chunk, "usage_metadata", None) or {}).items():
+                if isinstance(tokens, int):
+                    usage[kind] = usage.get(kind, 0) + tokens
+            if extractor.feed(_content(chunk)) is not None:
+                stopped_early = True
+                break
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    return Reading(extractor.result, extractor.text, chunks, stopped_early, usage)
+
+
+class DecisionParser:
+    def __init__(self, repair: bool = True, repair_max_chars: int = 2000,
+                 on_reading: Optional[Callable[[Reading], None]] = None):
+        self.repair = repair
+        self.repair_max_chars = repair_max_chars
+        self.on_reading = on_reading  # e.g. to count tokens per call
+        self._stats = {"parsed": 0, "stopped_early": 0, "parse_failures": 0,
+                       "repairs": 0, "repaired": 0, "failed": 0, "chunks": 0}
+
+    async def decide(self, stream: Callable[[], AsyncIterator],
+                     repair: Callable[[str], AsyncIterator]) -> Dict[str, str]:
+        """Decision from stream(); on a bad answer, one try of repair(answer)"""
+        reading = await self._read(stream())
+        if reading.decision is not None:
+            self._stats["parsed"] += 1
+            return reading.decision
+
+        self._stats["parse_failures"] += 1
+        if self.repair and reading.text.strip():
+            self._stats["repairs"] += 1
+            repaired = await self._read(repair(reading.text[-self.repair_max_chars:]))
+            if repaired.decision is not None:
+                self._stats["repaired"] += 1
+                return repaired.decision
+
+        self._stats["failed"] += 1
+        raise DecisionParseError(f"no decision in model output: {reading.text[:200]!r}")
+
+    async def _read(self, stream):
+        reading = await read_decision(stream)
+        self._stats["chunks"] += reading.chunks
+        self._stats["stopped_early"] += reading.stopped_early
+        if self.on_reading is not None:
+            self.on_reading(reading)
+        return reading
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        answers = stats["parsed"] + stats["parse_failures"]
+        stats["parse_failure_ratio"] = stats["parse_failures"] / answers if answers else 0.0
+        stats["failure_ratio"] = stats["failed"] / answers if answers else 0.0
+        return stats
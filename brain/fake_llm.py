@@ -0,0 +1,143 @@
+"""
+Deterministic stand-in for the Groq chat model, for benchmarks and tests that
+must run without network access or an API key.
+
+It reads the CPA out of the analyze prompt, applies the knowledge-base
+thresholds and answers with the JSON the real model is asked for, after a
+configurable delay that simulates provider latency.
+
+It also behaves like a rate-limited provider: with `rate_limit` set, a call
+beyond that many per second fails with FakeRateLimitError (Groq answers
+HTTP 429), and `peak_in_flight` records the most concurrent calls seen.
+
+`style` shapes the answer the way real models drift from "JSON ONLY":
+"json" (clean), "fenced" (```json fences), "chatty" (prose before and a
+long explanation after the object) or "broken" (single-quoted pseudo-JSON
+that json.loads rejects). Streaming yields one word per chunk, every
+`token_latency` seconds after the first, with usage on the last chunk.
+Prompts without a CPA (e.g. a repair request) are answered with the first
+decision word they contain, as clean JSON.
+"""
+from collections import deque
+from typing import Any, AsyncIterator, List, Optional
+import asyncio
+import json
+import re
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+CPA_PATTERN = re.compile(r"CPA:\s*\$?(-?[0-9]+(?:\.[0-9]+)?)")
+DECISION_PATTERN = re.compile(r"\b(PAUSE|SCALE|MAINTAIN)\b")
+EXPLANATION = ("This follows directly from the context rules for this campaign. "
+               "Keep monitoring CPA over the next reporting window and revisit the "
+               "decision if spend or conversion volume changes materially. ") * 3
+
+
+class FakeRateLimitError(RuntimeError):
+    """Stands in for the provider's HTTP 429"""
+
+
+class FakeDecisionLLM(BaseChatModel):
+    latency: float = 0.5
+    calls: int = 0
+    rate_limit: float = 0  # calls per second; 0 = unlimited
+    rejected: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    recent: Any = None  # start times within the last second
+    style: str = "json"
+    token_latency: float = 0.0  # seconds between streamed chunks
+
+    def _admit(self):
+        if not self.rate_limit:
+            return
+        now = time.monotonic()
+        if self.recent is None:
+            self.recent = deque()
+        while self.recent and now - self.recent[0] >= 1.0:
+            self.recent.popleft()
+        if len(self.recent) >= self.rate_limit:
+            self.rejected += 1
+            raise FakeRateLimitError(f"rate limit of {self.rate_limit:g} requests/s exceeded")
+        self.recent.append(now)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-decision"
+
+    def _content(self, messages: List[BaseMessage]) -> str:
+        self.calls += 1
+        prompt = messages[-1].content
+        match = CPA_PATTERN.search(prompt)
+        if match is None:
+            found = DECISION_PATTERN.search(prompt)
+            decision = found.group(1) if found else "MAINTAIN"
+            return json.dumps({"decision": decision, "reason": "Reformatted answer"})
+        cpa = float(match.group(1))
+        if cpa > 50:
+            decision, reason = "PAUSE", f"CPA ${cpa} is above $50"
+        elif cpa < 30:
+            decision, reason = "SCALE", f"CPA ${cpa} is below $30"
+        else:
+            decision, reason = "MAINTAIN", f"CPA ${cpa} is between $30 and $50"
+        answer = json.dumps({"decision": decision, "reason": reason})
+        if self.style == "fenced":
+            return f"```json\n{answer}\n```"
+        if self.style == "chatty":
+            return f"Based on the rules, here is my decision:\n{answer}\n{EXPLANATION}"
+        if self.style == "broken":
+            return f"{{'decision': '{decision}', 'reason': '{reason}'}}"
+        return answer
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], content: str) -> dict:
+        # Rough word counts stand in for the provider's token usage
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        return {"input_tokens": prompt_tokens, "output_tokens": len(content.split()),
+                "total_tokens": prompt_tokens + len(content.split())}
+
+    def _answer(self, messages: List[BaseMessage]) -> ChatResult:
+        content = self._content(messages)
+        message = AIMessage(content=content, usage_metadata=self._usage(messages, content))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._answer(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self._admit()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            result = self._answer(messages)
+            # Generation time of the whole answer, as streaming would take
+            words = len(result.generations[0].message.content.split())
+            await asyncio.sleep(self.token_latency * max(words - 1, 0))
+        finally:
+            self.in_flight -= 1
+        return result
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self._admit()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            content = self._content(messages)
+            words = re.findall(r"\S+\s*", content)
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(self.token_latency)
+                last = i == len(words) - 1
+                usage = self._usage(messages, content) if last else None
+                yield ChatGenerationChunk(message=AIMessageChunk(content=word, usage_metadata=usage))
+        finally:
+            self.in_flight -= 1
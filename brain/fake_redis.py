@@ -0,0 +1,253 @@
+"""
+In-process stand-ins for Redis, for stress tests and benchmarks that must run
+without a server. They implement only what lock_manager.py and the brain use:
+SET (NX/PX/EX), GET, EXISTS, DELETE, pipelines, the lock Lua scripts and
+PUBLISH / (P)SUBSCRIBE for the async client.
+
+Several FakeAsyncRedis clients can share one FakeRedis backend to play
+separate workers talking to the same server.
+"""
+import asyncio
+import fnmatch
+import random
+import threading
+import time
+
+from lock_manager import EXTEND_SCRIPT, RELEASE_MANY_SCRIPT, RELEASE_SCRIPT
+
+
+class FakeRedis:
+    """Thread-safe subset of redis.Redis; the backing store for FakeAsyncRedis.
+
+    Every command sleeps for a random "network" delay outside the data lock,
+    so interleavings between round trips happen the way they do on a server.
+    """
+
+    def __init__(self, latency: float = 0.0002):
+        self.latency = latency
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._scripts = {
+            RELEASE_SCRIPT: self._lua_release,
+            RELEASE_MANY_SCRIPT: self._lua_release_many,
+            EXTEND_SCRIPT: self._lua_extend,
+        }
+
+    def _rtt(self):
+        if self.latency:
+            time.sleep(random.uniform(0, self.latency))
+
+    def _alive(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    # ---- commands ----
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        self._rtt()
+        with self._lock:
+            return self._set(key, value, nx, px, ex)
+
+    def _set(self, key, value, nx=False, px=None, ex=None):
+        if nx and self._alive(key):
+            return None
+        self._data[key] = value
+        ttl = px / 1000 if px else ex
+        if ttl:
+            self._expires[key] = time.monotonic() + ttl
+        else:
+            self._expires.pop(key, None)
+        return True
+
+    def get(self, key):
+        self._rtt()
+        with self._lock:
+            return self._data[key] if self._alive(key) else None
+
+    def exists(self, key):
+        self._rtt()
+        with self._lock:
+            return int(self._alive(key))
+
+    def delete(self, *keys):
+        self._rtt()
+        with self._lock:
+            return sum(1 for key in keys if self._alive(key) and self._data.pop(key, None) is not None)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.matches(channel)]
+        for subscriber in subscribers:
+            subscriber.deliver(channel, message)
+        return len(subscribers)
+
+    def ping(self):
+        self._rtt()
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, source):
+        impl = self._scripts[source]
+
+        def run(keys=(), args=(), client=None):
+            self._rtt()
+            with self._lock:  # scripts run atomically, like on the server
+                return impl(list(keys), list(args))
+        return run
+
+    # ---- Lua scripts ----
+
+    def _lua_release(self, keys, args):
+        if self._alive(keys[0]) and self._data[keys[0]] == args[0]:
+            del self._data[keys[0]]
+            self._expires.pop(keys[0], None)
+            return 1
+        return 0
+
+    def _lua_release_many(self, keys, args):
+        return sum(self._lua_release([key], [token]) for key, token in zip(keys, args))
+
+    def _lua_extend(self, keys, args):
+        if self._alive(keys[0]) and self._data[keys[0]] == args[0]:
+            self._expires[keys[0]] = time.monotonic() + int(args[1]) / 1000
+            return 1
+        return 0
+
+
+class FakePipeline:
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._commands = []
+
+    def set(self, *args, **kwargs):
+        self._commands.append((args, kwargs))
+        return self
+
+    def execute(self):
+        self.redis._rtt()  # one round trip for the whole pipeline
+        with self.redis._lock:
+            return [self.redis._set(*args, **kwargs) for args, kwargs in self._commands]
+
+
+class FakeAsyncRedis:
+    """redis.asyncio-shaped wrapper around FakeRedis.
+
+    The simulated round trip is an `asyncio.sleep`, so thousands of
+    concurrent callers wait on it without holding a thread each.
+    """
+
+    def __init__(self, latency: float = 0.0002, backend: FakeRedis = None):
+        self.latency = latency
+        self.sync = backend or FakeRedis(latency=0)
+
+    async def _rtt(self):
+        if self.latency:
+            await asyncio.sleep(random.uniform(0, self.latency))
+
+    async def set(self, *args, **kwargs):
+        await self._rtt()
+        return self.sync.set(*args, **kwargs)
+
+    async def get(self, key):
+        await self._rtt()
+        return self.sync.get(key)
+
+    async def exists(self, key):
+        await self._rtt()
+        return self.sync.exists(key)
+
+    async def delete(self, *keys):
+        await self._rtt()
+        return self.sync.delete(*keys)
+
+    async def publish(self, channel, message):
+        await self._rtt()
+        return self.sync.publish(channel, message)
+
+    def pubsub(self):
+        return FakeAsyncPubSub(self)
+
+    async def ping(self):
+        await self._rtt()
+        return True
+
+    async def aclose(self):
+        pass
+
+    def pipeline(self, transaction=True):
+        return FakeAsyncPipeline(self)
+
+    def register_script(self, source):
+        run_sync = self.sync.register_script(source)
+
+        async def run(keys=(), args=(), client=None):
+            await self._rtt()
+            return run_sync(keys, args)
+        return run
+
+
+class FakeAsyncPipeline(FakePipeline):
+
+    def __init__(self, redis):
+        super().__init__(redis.sync)
+        self._async = redis
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def execute(self):
+        await self._async._rtt()
+        return FakePipeline.execute(self)
+
+
+class FakeAsyncPubSub:
+    """Subset of redis.asyncio PubSub: (p)subscribe, get_message, aclose"""
+
+    def __init__(self, redis):
+        self._async = redis
+        self._backend = redis.sync
+        self._channels = set()
+        self._patterns = set()
+        self._queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        with self._backend._lock:
+            self._backend._subscribers.append(self)
+
+    def matches(self, channel):
+        return channel in self._channels or any(fnmatch.fnmatchcase(channel, p) for p in self._patterns)
+
+    def deliver(self, channel, message):
+        pattern = next((p for p in self._patterns if fnmatch.fnmatchcase(channel, p)), None)
+        item = {"type": "pmessage" if pattern else "message", "pattern": pattern,
+                "channel": channel, "data": message}
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    async def subscribe(self, *channels):
+        await self._async._rtt()
+        self._channels.update(channels)
+
+    async def psubscribe(self, *patterns):
+        await self._async._rtt()
+        self._patterns.update(patterns)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        with self._backend._lock:
+            if self in self._backend._subscribers:
+                self._backend._subscribers.remove(self)
@@ -0,0 +1,148 @@
+"""
+Micro-batching scheduler for LLM calls.
+
+Callers `await scheduler.submit(inputs)` one prompt at a time. Prompts that
+arrive within `max_wait` of each other are collected (up to `max_batch`) and
+handed to `run_batch` as one list, e.g. `chain.abatch`; each caller gets its
+own result or exception back.
+
+Two limits protect the provider during bursts:
+- at most `max_concurrency` batches are in flight at once;
+- a token bucket admits at most `rate` provider requests per second (one
+  token per prompt), with bursts up to `burst`. A batch waits for its
+  tokens instead of being sent and rejected with a 429. Any one-second
+  window sees at most rate + burst requests, so keep that sum under the
+  provider's limit. Follow-up requests a batch makes on its own (e.g. a
+  repair call) take their token through `charge()`.
+
+The scheduler belongs to one event loop; if it is used from a new loop
+(e.g. a second `asyncio.run`), its queue and primitives are re-created.
+"""
+from typing import Any, Awaitable, Callable, List, Optional
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, at most `capacity` saved"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0  # seconds spent waiting for tokens, for stats
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        # Batches larger than the bucket take it all and wait out the remainder
+        while True:
+            self._refill()
+            if self.tokens >= min(tokens, self.capacity):
+                self.tokens -= tokens
+                return
+            delay = (min(tokens, self.capacity) - self.tokens) / self.rate
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 16,
+        max_wait: float = 0.02,
+        max_concurrency: int = 8,
+        rate: float = 0,
+        burst: Optional[float] = None,
+    ):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate = rate
+        self.burst = burst
+        self._loop = None
+        self._stats = {"submitted": 0, "batches": 0, "items": 0, "max_batch_size": 0,
+                       "errors": 0, "batch_failures": 0, "charged": 0}
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._pending = []  # (inputs, future)
+            self._timer = None
+            self._in_flight = 0
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._bucket = TokenBucket(self.rate, self.burst) if self.rate > 0 else None
+            self._tasks = set()
+
+    async def submit(self, inputs: Any) -> Any:
+        """Queue one prompt and wait for its result"""
+        self._bind()
+        future = self._loop.create_future()
+        self._pending.append((inputs, future))
+        self._stats["submitted"] += 1
+        if len(self._pending) >= self.max_batch or self.max_wait <= 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def charge(self, tokens: float = 1.0):
+        """Take rate-limit tokens for extra provider requests made inside a running batch"""
+        self._bind()
+        self._stats["charged"] += tokens
+        if self._bucket is not None:
+            await self._bucket.acquire(tokens)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            task = self._loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        async with self._slots:
+            if self._bucket is not None:
+                await self._bucket.acquire(len(batch))
+            self._in_flight += 1
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+            try:
+                results = await self.run_batch([inputs for inputs, _ in batch])
+            except Exception as exc:
+                self._stats["batch_failures"] += 1
+                results = [exc] * len(batch)
+            finally:
+                self._in_flight -= 1
+
+        for (_, future), result in zip(batch, results):
+            if future.done():  # the caller was cancelled
+                continue
+            if isinstance(result, BaseException):
+                self._stats["errors"] += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["avg_batch_size"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        stats["pending"] = len(self._pending) if self._loop else 0
+        stats["in_flight_batches"] = self._in_flight if self._loop else 0
+        bucket = self._bucket if self._loop else None
+        stats["rate_limit_wait_seconds"] = round(bucket.waited, 3) if bucket else 0.0
+        stats["config"] = {"max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000,
+                           "max_concurrency": self.max_concurrency, "rate_per_second": self.rate}
+        return stats
@@ -0,0 +1,311 @@
+"""
+Campaign locks on Redis.
+
+Acquisition is a single `SET key token NX PX ttl`, so there is no window
+between checking and taking a lock. Every lock carries a random owner token;
+release and extension go through Lua scripts that only touch the key while it
+still holds our token, so an expired lock that someone else re-acquired is
+never deleted from under them.
+
+Long-running holders (e.g. an LLM call that may outlive the TTL) can ask for
+auto-extension: a task re-arms the TTL every ttl/3 until the lock is
+released, or until it has been held for `max_hold_ms` so a crashed holder
+can't pin a campaign forever.
+
+AsyncLockManager works on `redis.asyncio.Redis`; both services take their
+locks from async handlers.
+
+This module is used by both the LangGraph brain (brain/) and the REST API
+(backend/brain/); each service is its own Docker build context, so keep the
+two copies identical (scripts/check_shared_modules.py checks them in CI).
+"""
+from typing import Dict, Iterable, List, Optional
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+RELEASE_MANY_SCRIPT = """
+local released = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[i] then
+        released = released + redis.call('del', key)
+    end
+end
+return released
+"""
+
+EXTEND_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Upper bounds (ms) of the wait-time histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class Lock:
+    """Handle for a lock held by this process"""
+
+    __slots__ = ("manager", "name", "key", "token", "ttl_ms", "auto_extend",
+                 "acquired_at", "next_extend", "lost", "task")
+
+    def __init__(self, manager: "AsyncLockManager", name: str, token: str, ttl_ms: int, auto_extend: bool):
+        self.manager = manager
+        self.name = name
+        self.key = manager.key(name)
+        self.token = token
+        self.ttl_ms = ttl_ms
+        self.auto_extend = auto_extend
+        self.acquired_at = time.monotonic()
+        self.next_extend = self.acquired_at + ttl_ms / 3000
+        self.lost = False  # set when an extension found the key gone or re-owned
+        self.task = None  # keep-alive task while auto-extended
+
+    async def release(self) -> bool:
+        return await self.manager.release(self)
+
+    async def extend(self, ttl_ms: Optional[int] = None) -> bool:
+        return await self.manager.extend(self, ttl_ms)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.release()
+
+
+class AsyncLockManager:
+    """Owner-token locks on redis.asyncio; auto-extension runs as a task per lock"""
+
+    def __init__(self, redis_client, prefix: str = "lock:", ttl_ms: int = 60000,
+                 max_hold_ms: int = 300000):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.ttl_ms = ttl_ms
+        self.max_hold_ms = max_hold_ms
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+        self._release_many = redis_client.register_script(RELEASE_MANY_SCRIPT)
+        self._extend = redis_client.register_script(EXTEND_SCRIPT)
+
+        self._stats_lock = threading.Lock()
+        self._counters = {
+            "attempts": 0,      # acquire calls (per name for acquire_many)
+            "acquired": 0,      # locks taken
+            "contended": 0,     # acquisitions that found the lock held
+            "timeouts": 0,      # blocking acquisitions that gave up
+            "released": 0,      # releases that deleted our key
+            "release_missed": 0,  # releases whose key had expired or changed owner
+            "extended": 0,
+            "lost": 0,          # auto-extended locks that were lost before release
+        }
+        self._wait_count = 0
+        self._wait_sum_ms = 0.0
+        self._wait_max_ms = 0.0
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+        self._held: Dict[str, Lock] = {}  # token -> lock, every lock this process holds
+        self._auto: Dict[str, Lock] = {}  # token -> lock, for auto-extension
+        self._held_lock = threading.Lock()
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}{name}"
+
+    def _new_token(self) -> str:
+        return f"{self._owner}:{uuid.uuid4().hex}"
+
+    def _track(self, name: str, token: str, ttl_ms: int, auto_extend: bool) -> Lock:
+        lock = Lock(self, name, token, ttl_ms, auto_extend)
+        with self._held_lock:
+            self._held[token] = lock
+            if auto_extend:
+                self._auto[token] = lock
+        return lock
+
+    def _collect(self, names, tokens, results, ttl_ms, started) -> List[Optional[Lock]]:
+        locks = []
+        for name, token, ok in zip(names, tokens, results):
+            if ok:
+                self._record_acquire(started)
+                locks.append(self._track(name, token, ttl_ms, False))
+            else:
+                self._count("contended")
+                locks.append(None)
+        return locks
+
+    def _forget(self, token: str):
+        with self._held_lock:
+            self._held.pop(token, None)
+            self._auto.pop(token, None)
+
+    def _held_too_long(self, lock: Lock) -> bool:
+        if (time.monotonic() - lock.acquired_at) * 1000 < self.max_hold_ms:
+            return False
+        # Stop extending and let the TTL expire it
+        print(f"Warning: lock {lock.key} exceeded max hold time, no longer extended")
+        with self._held_lock:
+            self._auto.pop(lock.token, None)
+        return True
+
+    def _mark_lost(self, lock: Lock):
+        if lock.token in self._auto:
+            lock.lost = True
+            self._count("lost")
+            self._forget(lock.token)
+
+    # ---- stats ----
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._counters[name] += amount
+
+    def _record_acquire(self, started: float):
+        waited_ms = (time.monotonic() - started) * 1000
+        bucket = len(WAIT_BUCKETS_MS)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if waited_ms <= bound:
+                bucket = i
+                break
+        with self._stats_lock:
+            self._counters["acquired"] += 1
+            self._wait_count += 1
+            self._wait_sum_ms += waited_ms
+            self._wait_max_ms = max(self._wait_max_ms, waited_ms)
+            self._wait_buckets[bucket] += 1
+
+    def _record_released(self, released: int, attempted: int):
+        with self._stats_lock:
+            self._counters["released"] += released
+            self._counters["release_missed"] += attempted - released
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            attempts = self._counters["attempts"]
+            buckets = {f"le_{bound}ms": n for bound, n in zip(WAIT_BUCKETS_MS, self._wait_buckets)}
+            buckets["inf"] = self._wait_buckets[-1]
+            return {
+                **self._counters,
+                "held": len(self._held),
+                "held_auto_extended": len(self._auto),
+                "contention_ratio": self._counters["contended"] / attempts if attempts else 0.0,
+                "wait_ms": {
+                    "count": self._wait_count,
+                    "avg": self._wait_sum_ms / self._wait_count if self._wait_count else 0.0,
+                    "max": self._wait_max_ms,
+                    "buckets": buckets,
+                },
+            }
+
+    # ---- acquisition ----
+
+    async def acquire(self, name: str, ttl_ms: Optional[int] = None, timeout: float = 0.0,
+                      retry_interval: float = 0.05, auto_extend: bool = False,
+                      token: Optional[str] = None) -> Optional[Lock]:
+        """Take the lock in one round trip, or None if it is held.
+
+        With `timeout` > 0, keep retrying until the lock frees up or the timeout
+        passes; the time spent waiting is recorded either way. Callers that need
+        to release from somewhere the Lock handle can't reach may pass their own
+        `token` and later call `release_token`.
+        """
+        ttl_ms = ttl_ms or self.ttl_ms
+        token = token or self._new_token()
+        key = self.key(name)
+        started = time.monotonic()
+        contended = False
+        self._count("attempts")
+        while True:
+            if await self.redis.set(key, token, nx=True, px=ttl_ms):
+                self._record_acquire(started)
+                lock = self._track(name, token, ttl_ms, auto_extend)
+                if auto_extend:
+                    lock.task = asyncio.create_task(self._keep_alive(lock))
+                return lock
+            if not contended:
+                contended = True
+                self._count("contended")
+            if time.monotonic() - started >= timeout:
+                if timeout > 0:
+                    self._count("timeouts")
+                return None
+            await asyncio.sleep(retry_interval)
+
+    async def acquire_many(self, names: Iterable[str], ttl_ms: Optional[int] = None) -> List[Optional[Lock]]:
+        """Try every lock in one pipelined round trip; None where it was held"""
+        names = list(names)
+        ttl_ms = ttl_ms or self.ttl_ms
+        tokens = [self._new_token() for _ in names]
+        started = time.monotonic()
+        self._count("attempts", len(names))
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name, token in zip(names, tokens):
+                pipe.set(self.key(name), token, nx=True, px=ttl_ms)
+            results = await pipe.execute()
+        return self._collect(names, tokens, results, ttl_ms, started)
+
+    async def release(self, lock: Lock) -> bool:
+        """Delete the lock only if it still holds our token"""
+        self._stop_keep_alive(lock)
+        self._forget(lock.token)
+        released = bool(await self._release(keys=[lock.key], args=[lock.token]))
+        self._record_released(int(released), 1)
+        return released
+
+    async def release_token(self, token: str) -> bool:
+        """Release the lock this process holds under `token`; False if none"""
+        lock = self._held.get(token)
+        return await self.release(lock) if lock is not None else False
+
+    async def release_many(self, locks: Iterable[Optional[Lock]]) -> int:
+        """Release several locks in one round trip; returns how many were ours"""
+        held = [lock for lock in locks if lock is not None]
+        if not held:
+            return 0
+        for lock in held:
+            self._stop_keep_alive(lock)
+            self._forget(lock.token)
+        released = int(await self._release_many(keys=[lock.key for lock in held],
+                                                args=[lock.token for lock in held]))
+        self._record_released(released, len(held))
+        return released
+
+    async def extend(self, lock: Lock, ttl_ms: Optional[int] = None) -> bool:
+        """Re-arm the TTL if we still own the lock"""
+        ttl_ms = ttl_ms or lock.ttl_ms
+        extended = bool(await self._extend(keys=[lock.key], args=[lock.token, ttl_ms]))
+        if extended:
+            self._count("extended")
+            lock.next_extend = time.monotonic() + ttl_ms / 3000
+        return extended
+
+    def _stop_keep_alive(self, lock: Lock):
+        if lock.task is not None and lock.task is not asyncio.current_task():
+            lock.task.cancel()
+        lock.task = None
+
+    async def _keep_alive(self, lock: Lock):
+        while lock.token in self._auto:
+            await asyncio.sleep(max(0.0, lock.next_extend - time.monotonic()))
+            if lock.token not in self._auto or self._held_too_long(lock):
+                return
+            try:
+                ok = await self.extend(lock)
+            except Exception as exc:
+                print(f"Warning: could not extend lock {lock.key}: {exc}")
+                lock.next_extend = time.monotonic() + lock.ttl_ms / 6000  # retry sooner
+                continue
+            if not ok:
+                self._mark_lost(lock)
+                return
@@ -1,39 +1,273 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-import redis
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+import redis.asyncio as aioredis
+import asyncio
+import functools
+import time
 import os
 import json
-from typing import TypedDict
+import uuid
+from typing import List, TypedDict
 
-# LangGraph & LangChain Imports
-from langgraph.graph import StateGraph, END
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import FakeEmbeddings 
-
-app = FastAPI()
+# LangGraph, LangChain, Groq and NumPy are imported by the component
+# factories below, not here: importing this module stays cheap, which keeps
+# `uvicorn --reload` restarts fast.
+from components import Component, ComponentUnavailable, readiness, warm_up
+from decision_cache import DecisionCache, content_hash
+from decision_parser import DecisionParseError, DecisionParser
+from llm_scheduler import LLMScheduler
+from lock_manager import AsyncLockManager
+from rule_compiler import FastPathCounters, RuleTable
+from single_flight import SingleFlight
+from telemetry import CONTENT_TYPE, PrometheusMiddleware, Registry, Telemetry, instrumented_redis, stats_callbacks
 
 # --- 1. SETUP INFRASTRUCTURE ---
-# Connect to internal Redis
-r = redis.Redis(host='redis', port=6379, decode_responses=True)
-
-# Connect to Groq (Free LLM)
-llm = ChatGroq(temperature=0, model_name="llama-3.3-70b-versatile", groq_api_key=os.getenv("GROQ_API_KEY"))
-
-# Setup RAG (ChromaDB with FakeEmbeddings for speed/free cost)
-embeddings = FakeEmbeddings(size=4096)
-vector_db = Chroma(persist_directory="./chroma_db", embedding_function=embeddings)
-
-# Initialize Knowledge Base (One-Time Run)
-if len(vector_db.get()['ids']) == 0:
-    print("Initializing Knowledge Base...")
-    vector_db.add_texts([
-        "If CPA is above $50, PAUSE the campaign immediately.",
-        "If CPA is below $30, SCALE the budget by 20%.",
-        "If CPA is between $30 and $50, MAINTAIN and monitor.",
-        "Never pause 'Brand Awareness' campaigns."
-    ])
+# Prometheus metrics for this service (GET /metrics/prometheus)
+metrics = Registry("brain")
+
+# Connect to internal Redis. One async client over a shared pool: requests
+# wait on Redis without holding a threadpool worker, and the blocking pool
+# queues callers instead of failing when every connection is busy.
+redis_pool = aioredis.BlockingConnectionPool(
+    host=os.getenv('REDIS_HOST', 'redis'),
+    port=6379,
+    decode_responses=True,
+    max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '100')),
+    timeout=5,
+)
+r = instrumented_redis(metrics)(connection_pool=redis_pool)
+
+# Campaign locks: atomic SET NX PX with owner tokens. The TTL is auto-extended
+# while the graph runs, so a slow LLM call can't let a second worker in.
+locks = AsyncLockManager(r, prefix="lock:", ttl_ms=10000)
+
+# Decision cache: skips the LLM for a campaign state it has already judged
+# under the same rules, prompt and model. DECISION_CACHE_TTL=0 disables it.
+decisions = DecisionCache(
+    r,
+    ttl_seconds=int(os.getenv('DECISION_CACHE_TTL', '3600')),
+    local_size=int(os.getenv('DECISION_CACHE_LOCAL_SIZE', '1024')),
+    cpa_bucket=float(os.getenv('DECISION_CACHE_CPA_BUCKET', '0.01')),
+)
+
+# Identical concurrent /analyze requests (n8n retries, overlapping workflows)
+# share one graph run, in this worker and across workers via Redis pub/sub.
+flights = SingleFlight(
+    r,
+    result_ttl=int(os.getenv('SINGLE_FLIGHT_RESULT_TTL', '5')),
+    wait_timeout=float(os.getenv('SINGLE_FLIGHT_WAIT_SECONDS', '120')),
+)
+
+# Wall/CPU time of every graph node, per node (GET /metrics/nodes)
+telemetry = Telemetry(metrics)
+
+# Bump when the analyze prompt changes so cached decisions are not reused
+PROMPT_VERSION = "analyze-v1"
+
+# Threshold rules compiled into a decision table: requests they settle skip
+# retrieval and the LLM. RULE_FAST_PATH=0 sends everything to the LLM.
+RULE_FAST_PATH = os.getenv('RULE_FAST_PATH', '1') != '0'
+
+# Replaced with the compiled rules once the knowledge base is loaded; the
+# counters outlive each table so the exported totals never go backwards
+fast_path_counters = FastPathCounters()
+rule_table = RuleTable([], fast_path_counters)
+
+SEED_RULES = [
+    "If CPA is above $50, PAUSE the campaign immediately.",
+    "If CPA is below $30, SCALE the budget by 20%.",
+    "If CPA is between $30 and $50, MAINTAIN and monitor.",
+    "Never pause 'Brand Awareness' campaigns."
+]
+
+def build_llm():
+    # Connect to Groq (Free LLM)
+    from langchain_groq import ChatGroq
+    return ChatGroq(temperature=0, model_name="llama-3.3-70b-versatile", groq_api_key=os.getenv("GROQ_API_KEY"))
+
+def knowledge_version(store):
+    """Content hash of the rule set; changes whenever a rule is added or edited"""
+    return content_hash(*sorted(store.texts()))[:16]
+
+def compile_rules(store):
+    return RuleTable(store.texts() if RULE_FAST_PATH else [], fast_path_counters)
+
+# Rules added through one worker reach the others via Redis: POST /rules
+# publishes the new knowledge-base version, and every worker compares it with
+# its own at most every KB_SYNC_SECONDS, reloading the shared rule store,
+# cache version and rule table when it moved.
+KB_VERSION_KEY = "kb:version"
+KB_SYNC_SECONDS = float(os.getenv('KB_SYNC_SECONDS', '1'))
+kb_sync = {"checked": 0.0, "seen": None, "reloads": 0, "redis_errors": 0}
+
+def apply_rules(store):
+    """Point the decision cache and the rule table at the store's current rules"""
+    global rule_table
+    decisions.invalidate(knowledge_version(store))
+    rule_table = compile_rules(store)
+
+def reload_rules(store):
+    store.reload()
+    apply_rules(store)
+
+def store_rules(store, rules):
+    store.reload()  # start from what other workers added, so it isn't overwritten
+    store.add_texts(rules)
+
+async def sync_knowledge_base():
+    """The knowledge base, reloaded first if another worker changed the rules"""
+    store = await knowledge_base.aget()
+    now = time.monotonic()
+    if now - kb_sync["checked"] < KB_SYNC_SECONDS:
+        return store
+    kb_sync["checked"] = now
+    try:
+        version = await r.get(KB_VERSION_KEY)
+    except Exception as exc:
+        kb_sync["redis_errors"] += 1
+        if kb_sync["redis_errors"] == 1:
+            print(f"Warning: knowledge-base version check failed ({exc}); "
+                  f"rules added through other workers are not picked up")
+        return store
+    # "seen" stops a store that can't catch up (not shared) from reloading every check
+    if version and version not in (decisions.kb_version, kb_sync["seen"]):
+        kb_sync["seen"] = version
+        await asyncio.to_thread(reload_rules, store)
+        kb_sync["reloads"] += 1
+    return store
+
+def load_knowledge_base():
+    """Open the rule store, seed it on first run and compile its rules"""
+    # Setup RAG: local hashing embedder + in-memory index by default, no network
+    # (RETRIEVER=chroma keeps the previous Chroma store)
+    from retriever import create_retriever
+    store = create_retriever()
+
+    # Initialize Knowledge Base (One-Time Run)
+    if len(store) == 0:
+        print("Initializing Knowledge Base...")
+        store.add_texts(SEED_RULES)
+
+    apply_rules(store)
+    return store
+
+def build_graph():
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(AgentState)
+
+    # Add Nodes (each one timed into the node histograms)
+    workflow.add_node("check_lock", telemetry.timed("check_lock")(check_lock_node))
+    workflow.add_node("rule_fast_path", telemetry.timed("rule_fast_path")(rule_fast_path_node))
+    workflow.add_node("retrieve_rules", telemetry.timed("retrieve_rules")(retrieve_rules_node))
+    workflow.add_node("analyze_data", telemetry.timed("analyze_data")(analyze_node))
+
+    # Set Entry Point
+    workflow.set_entry_point("check_lock")
+
+    # Conditional Logic
+    workflow.add_conditional_edges(
+        "check_lock",
+        check_lock_condition,
+        { "end": END, "continue": "rule_fast_path" }
+    )
+    workflow.add_conditional_edges(
+        "rule_fast_path",
+        fast_path_condition,
+        { "end": END, "continue": "retrieve_rules" }
+    )
+
+    workflow.add_edge("retrieve_rules", "analyze_data")
+    workflow.add_edge("analyze_data", END)
+
+    return workflow.compile()
+
+llm_latency = metrics.histogram("llm_batch_duration_seconds", "Time for one batched LLM call",
+                                buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+llm_requests = metrics.counter("llm_requests_total", "LLM prompts by outcome", ("status",))
+llm_tokens = metrics.counter("llm_tokens_total", "LLM tokens reported by the provider", ("kind",))
+
+def count_tokens(reading):
+    # A stream we closed early carries no usage: count its chunks as output tokens
+    llm_tokens.labels("input").inc(reading.usage.get("input_tokens", 0))
+    llm_tokens.labels("output").inc(reading.usage.get("output_tokens", reading.chunks))
+
+# Decisions are parsed from the token stream as it arrives; generation stops
+# once the JSON object is complete. A malformed answer gets one short repair
+# call (LLM_REPAIR=0 disables it) before the request fails with ERROR.
+decision_parser = DecisionParser(repair=os.getenv('LLM_REPAIR', '1') != '0', on_reading=count_tokens)
+
+async def repair_stream(model, answer):
+    # A repair is one more provider request: it waits for its own rate-limit token
+    await llm_scheduler.charge()
+    async for chunk in (repair_prompt() | model).astream({"answer": answer}):
+        yield chunk
+
+async def llm_decision(model, inputs):
+    return await decision_parser.decide(
+        lambda: (analyze_prompt() | model).astream(inputs),
+        lambda answer: repair_stream(model, answer),
+    )
+
+async def run_llm_batch(inputs):
+    """Stream the decisions for a batch of analyze prompts concurrently"""
+    model = await llm.aget()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(llm_decision(model, i) for i in inputs), return_exceptions=True)
+    llm_latency.observe(time.perf_counter() - started)
+    for result in results:
+        if isinstance(result, DecisionParseError):
+            llm_requests.labels("unparsed").inc()
+        elif isinstance(result, BaseException):
+            llm_requests.labels("error").inc()
+        else:
+            llm_requests.labels("ok").inc()
+    return results
+
+# LLM calls from concurrent requests are micro-batched: prompts arriving within
+# LLM_BATCH_WAIT_MS are sent together, with bounded concurrency and an optional
+# provider rate limit (LLM_RATE_PER_SECOND, 0 = unlimited). Repair calls run
+# inside their batch and take their own token from the rate limit.
+llm_scheduler = LLMScheduler(
+    run_llm_batch,
+    max_batch=int(os.getenv('LLM_BATCH_MAX', '16')),
+    max_wait=int(os.getenv('LLM_BATCH_WAIT_MS', '20')) / 1000,
+    max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '8')),
+    rate=float(os.getenv('LLM_RATE_PER_SECOND', '0')),
+    burst=float(os.getenv('LLM_RATE_BURST', '0')) or None,
+)
+
+llm = Component("llm", build_llm)
+knowledge_base = Component("knowledge_base", load_knowledge_base)
+agent_graph = Component("graph", build_graph)
+COMPONENTS = [llm, knowledge_base, agent_graph]
+
+@asynccontextmanager
+async def lifespan(app):
+    # Start serving immediately; components come up in the background and
+    # /ready reports when they are all in place.
+    warming = asyncio.create_task(warm_up(COMPONENTS))
+    yield
+    warming.cancel()
+    await flights.close()
+    await redis_pool.disconnect()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(PrometheusMiddleware, registry=metrics)
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    # Like FastAPI's default 422, but a rejected NaN/Infinity input is echoed as a string
+    errors = json.loads(json.dumps(jsonable_encoder(exc.errors()), default=str), parse_constant=str)
+    return JSONResponse({"detail": errors}, status_code=422)
+
+@app.exception_handler(ComponentUnavailable)
+async def component_unavailable(request, exc):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
 
 # --- 2. DEFINE GRAPH STATE ---
 class AgentState(TypedDict):
@@ -45,29 +279,40 @@ class AgentState(TypedDict):
     reason: str
     rag_context: str
     is_locked: bool
+    lock_token: str
+    cache_hit: bool
+    fast_path: bool
 
 # --- 3. DEFINE NODES (The Logic Steps) ---
 
-def check_lock_node(state: AgentState):
-    """Node 1: Check Redis Lock"""
-    lock_key = f"lock:{state['campaign_id']}"
-    if r.exists(lock_key):
+async def check_lock_node(state: AgentState):
+    """Node 1: Take Redis Lock (check and set in one round trip)"""
+    lock = await locks.acquire(state['campaign_id'], token=state['lock_token'], auto_extend=True)
+    if lock is None:
         return {"is_locked": True, "decision": "SKIPPED", "reason": "Locked in Redis"}
-    
-    # Set lock for 10 seconds
-    r.set(lock_key, "processing", ex=10)
     return {"is_locked": False}
 
-def retrieve_rules_node(state: AgentState):
-    """Node 2: Get RAG Context"""
-    query = f"What should I do if CPA is ${state['cpa']}?"
-    docs = vector_db.similarity_search(query, k=1)
-    rule = docs[0].page_content if docs else "No rule found."
+async def rule_fast_path_node(state: AgentState):
+    """Node 2: Apply the compiled rules when they settle the decision on their own"""
+    await sync_knowledge_base()  # compiles rule_table on first use
+    decided = rule_table.decide(state['campaign_name'], state['cpa'])
+    if decided is None:
+        return {"fast_path": False}
+    return {"fast_path": True, "decision": decided.decision, "reason": decided.reason,
+            "rag_context": decided.rule}
+
+async def retrieve_rules_node(state: AgentState):
+    """Node 3: Get RAG Context"""
+    query = f"{state['campaign_name']}: what should I do if CPA is ${state['cpa']}?"
+    store = await sync_knowledge_base()
+    docs = await store.asearch(query, k=1)
+    rule = docs[0] if docs else "No rule found."
     return {"rag_context": rule}
 
-def analyze_node(state: AgentState):
-    """Node 3: Ask LLM"""
-    prompt = ChatPromptTemplate.from_messages([
+@functools.lru_cache(maxsize=None)
+def analyze_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([
         ("system", "You are an Ad Optimization Agent. Use the Context Rules strictly."),
         ("human", """
         Campaign: {name}
@@ -77,58 +322,130 @@ def analyze_node(state: AgentState):
         Output JSON ONLY: {{ "decision": "PAUSE" or "SCALE" or "MAINTAIN", "reason": "brief explanation" }}
         """)
     ])
-    
-    chain = prompt | llm
-    response = chain.invoke({
-        "name": state['campaign_name'],
-        "cpa": state['cpa'],
-        "context": state['rag_context']
-    })
-    
-    try:
-        result = json.loads(response.content)
-        return {"decision": result['decision'], "reason": result['reason']}
-    except:
-        return {"decision": "ERROR", "reason": "JSON Parsing Failed"}
 
-# --- 4. BUILD THE GRAPH ---
+@functools.lru_cache(maxsize=None)
+def repair_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([
+        ("system", 'Rewrite the answer below as JSON ONLY: {{ "decision": "PAUSE" or "SCALE" or "MAINTAIN", '
+                   '"reason": "brief explanation" }}. Keep its decision and reason.'),
+        ("human", "{answer}")
+    ])
+
+async def analyze_node(state: AgentState):
+    """Node 4: Ask LLM (or reuse a cached decision for the same inputs)"""
+    model = await llm.aget()
+    model_version = f"{PROMPT_VERSION}:{getattr(model, 'model_name', type(model).__name__)}"
+    cache_key = decisions.key(state['campaign_name'], state['cpa'], state['rag_context'], model_version)
+    cached = await decisions.get(cache_key)
+    if cached is not None:
+        return {"decision": cached['decision'], "reason": cached['reason'], "cache_hit": True}
 
-workflow = StateGraph(AgentState)
+    try:
+        decision = await llm_scheduler.submit({
+            "name": state['campaign_name'],
+            "cpa": state['cpa'],
+            "context": state['rag_context']
+        })
+    except DecisionParseError:
+        return {"decision": "ERROR", "reason": "JSON Parsing Failed"}
 
-# Add Nodes
-workflow.add_node("check_lock", check_lock_node)
-workflow.add_node("retrieve_rules", retrieve_rules_node)
-workflow.add_node("analyze_data", analyze_node)
+    await decisions.set(cache_key, decision)
+    return decision
 
-# Set Entry Point
-workflow.set_entry_point("check_lock")
+# --- 4. GRAPH ROUTING (the graph itself is built by build_graph) ---
 
-# Conditional Logic
 def check_lock_condition(state):
     return "end" if state["is_locked"] else "continue"
 
-workflow.add_conditional_edges(
-    "check_lock",
-    check_lock_condition,
-    { "end": END, "continue": "retrieve_rules" }
-)
-
-workflow.add_edge("retrieve_rules", "analyze_data")
-workflow.add_edge("analyze_data", END)
-
-app_graph = workflow.compile()
+def fast_path_condition(state):
+    return "end" if state["fast_path"] else "continue"
 
 # --- 5. API ENDPOINT ---
 
 class RequestData(BaseModel):
+    # NaN/Infinity CPA or spend would compare false against every rule threshold
+    model_config = ConfigDict(allow_inf_nan=False)
+
     campaign_id: str
     cpa: float
     spend: float
     campaign_name: str = "Generic Campaign"
 
+class RulesData(BaseModel):
+    rules: List[str]
+
+@app.get("/health")
+def health():
+    """Liveness: the process is up; lists each component's status"""
+    return readiness(COMPONENTS)
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once every component is up and Redis answers, else 503"""
+    report = readiness(COMPONENTS)
+    try:
+        await asyncio.wait_for(r.ping(), timeout=1)
+        report["components"]["redis"] = {"status": "ready", "required": True}
+    except Exception as exc:
+        report["ready"] = False
+        report["components"]["redis"] = {"status": "failed", "required": True,
+                                         "error": f"{type(exc).__name__}: {exc}"}
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/locks/stats")
+def lock_stats():
+    return locks.stats()
+
+@app.get("/cache/stats")
+def cache_stats():
+    return decisions.stats()
+
+@app.get("/flights/stats")
+def flight_stats():
+    return flights.stats()
+
+@app.get("/metrics/nodes")
+def node_metrics():
+    """Per-node wall and CPU time histograms (ms) since startup"""
+    return telemetry.stats()
+
+@app.get("/llm/stats")
+def llm_stats():
+    return {**llm_scheduler.stats(), "parser": decision_parser.stats()}
+
+@app.get("/rules/stats")
+def rules_stats():
+    return {**rule_table.stats(), "retriever": knowledge_base.get().stats(),
+            "reloads": kb_sync["reloads"]}
+
+@app.post("/rules")
+async def add_rules(data: RulesData):
+    """Add rules to the knowledge base; cached decisions made under the old rules stop matching"""
+    store = await knowledge_base.aget()
+    await asyncio.to_thread(store_rules, store, data.rules)
+    apply_rules(store)
+    kb_sync["seen"] = decisions.kb_version
+    try:
+        await r.set(KB_VERSION_KEY, decisions.kb_version)
+    except Exception as exc:
+        print(f"Warning: could not publish knowledge-base version {decisions.kb_version} ({exc}); "
+              f"other workers keep the old rules")
+    return {"added": len(data.rules), "kb_version": decisions.kb_version,
+            "fast_path": rule_table.enabled}
+
+def flight_key(data: RequestData):
+    return content_hash(data.campaign_id, data.campaign_name, repr(data.cpa), repr(data.spend))
+
 @app.post("/analyze")
-def run_agent(data: RequestData):
-    initial_state = {
+async def run_agent(data: RequestData):
+    # Latecomers with the same campaign and input wait for the running
+    # request's decision instead of being SKIPPED by the campaign lock
+    result, shared = await flights.run(flight_key(data), lambda: analyze_campaign(data))
+    return {**result, "shared": shared}
+
+def initial_state(data: RequestData):
+    return {
         "campaign_id": data.campaign_id,
         "campaign_name": data.campaign_name,
         "cpa": data.cpa,
@@ -136,14 +453,102 @@ def run_agent(data: RequestData):
         "decision": "PENDING",
         "reason": "",
         "rag_context": "",
-        "is_locked": False
+        "is_locked": False,
+        "lock_token": uuid.uuid4().hex,
+        "cache_hit": False,
+        "fast_path": False
     }
-    
-    final_state = app_graph.invoke(initial_state)
-    
+
+def decision_response(final_state):
     return {
         "campaign_id": final_state['campaign_id'],
         "decision": final_state['decision'],
         "reason": final_state['reason'],
-        "rule_used": final_state['rag_context']
-    }
\ No newline at end of file
+        "rule_used": final_state['rag_context'],
+        "cached": final_state.get('cache_hit', False),
+        "fast_path": final_state.get('fast_path', False)
+    }
+
+async def analyze_campaign(data: RequestData):
+    app_graph = await agent_graph.aget()
+    state = initial_state(data)
+
+    try:
+        final_state = await app_graph.ainvoke(state)
+    finally:
+        # No-op unless check_lock took the lock for this request
+        await locks.release_token(state["lock_token"])
+
+    return decision_response(final_state)
+
+@app.post("/analyze/stream")
+async def stream_agent(data: RequestData):
+    """NDJSON: one line per node as it finishes (state delta + timings), then the result"""
+    app_graph = await agent_graph.aget()
+
+    async def events():
+        state = initial_state(data)
+        try:
+            with telemetry.collect() as timings:
+                async for update in app_graph.astream(state, stream_mode="updates"):
+                    for node, delta in update.items():
+                        delta = delta or {}
+                        state.update(delta)
+                        yield json.dumps({"event": "node", "node": node, "delta": delta,
+                                          **timings.get(node, {})}) + "\n"
+            yield json.dumps({"event": "result", **decision_response(state)}) + "\n"
+        except Exception as exc:
+            yield json.dumps({"event": "error", "detail": f"{type(exc).__name__}: {exc}"}) + "\n"
+        finally:
+            await locks.release_token(state["lock_token"])
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+# --- 6. METRICS ---
+# Scrape-time views of the stats the components already keep
+
+stats_callbacks(metrics, "lock", lambda: locks.stats(), {
+    "acquired": ("counter", "Campaign locks acquired"),
+    "contended": ("counter", "Lock attempts that found the campaign locked"),
+    "timeouts": ("counter", "Lock waits that timed out"),
+    "lost": ("counter", "Auto-extended locks lost before release"),
+    "held": ("gauge", "Locks currently held by this worker"),
+})
+stats_callbacks(metrics, "decision_cache", lambda: decisions.stats(), {
+    "local_hits": ("counter", "Decision cache hits in the in-process tier"),
+    "redis_hits": ("counter", "Decision cache hits in the Redis tier"),
+    "misses": ("counter", "Decision cache misses"),
+    "local_size": ("gauge", "Entries in the in-process decision cache"),
+    "hit_ratio": ("gauge", "Decision cache hit ratio since startup"),
+})
+stats_callbacks(metrics, "single_flight", lambda: flights.stats(), {
+    "leaders": ("counter", "Analyze runs that did the work"),
+    "local_shared": ("counter", "Requests that shared a run in this worker"),
+    "remote_shared": ("counter", "Requests that shared another worker's run"),
+    "in_flight": ("gauge", "Distinct analyze runs in flight"),
+})
+stats_callbacks(metrics, "llm_scheduler", lambda: llm_scheduler.stats(), {
+    "batches": ("counter", "Batches sent to the LLM"),
+    "pending": ("gauge", "Prompts waiting to be batched"),
+    "in_flight_batches": ("gauge", "LLM batches in flight"),
+    "rate_limit_wait_seconds": ("counter", "Time batches waited on the rate limit"),
+})
+stats_callbacks(metrics, "decision_parser", lambda: decision_parser.stats(), {
+    "parse_failures": ("counter", "LLM answers with no usable decision object"),
+    "repaired": ("counter", "Bad answers fixed by the repair call"),
+    "failed": ("counter", "Decisions lost after the repair call"),
+    "stopped_early": ("counter", "LLM streams closed as soon as the decision was complete"),
+    "parse_failure_ratio": ("gauge", "Share of LLM answers that needed a repair"),
+})
+stats_callbacks(metrics, "rule_fast_path", lambda: rule_table.stats(), {
+    "decided": ("counter", "Requests decided by the compiled rules"),
+    "vetoed": ("counter", "Fast-path decisions blocked by a veto rule"),
+})
+metrics.callback("knowledge_base_rules", "Rules in the knowledge base",
+                 lambda: len(knowledge_base.get()) if knowledge_base.ready else None)
+metrics.callback("component_up", "1 when the component is ready",
+                 lambda: {c.name: int(c.ready) for c in COMPONENTS}, labelnames=("component",))
+
+@app.get("/metrics/prometheus")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
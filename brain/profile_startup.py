@@ -0,0 +1,135 @@
+"""
+Startup profile for the brain service.
+
+Reports two numbers that bound how fast a (re)started worker accepts
+requests and becomes ready:
+
+1. `import main` in a fresh interpreter (what `uvicorn --reload` pays on
+   every restart), with the slowest modules from `python -X importtime`.
+2. Time to build each lazily initialised component (LLM client, knowledge
+   base, graph), which the lifespan does in the background.
+
+Runs without Redis or a Groq key. The knowledge base is built in a temporary
+file so the working copy is left untouched. With --max-import-seconds the
+exit status is non-zero when the import exceeds the budget, for CI.
+
+Usage: python profile_startup.py [--top 15] [--json startup.json] [--max-import-seconds 1.5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import main
+print(f"IMPORT_SECONDS {time.perf_counter() - t0:.6f}")
+"""
+
+COMPONENT_SNIPPET = """
+import json
+import main
+for component in main.COMPONENTS:
+    try:
+        component.get()
+    except Exception:
+        pass
+print("COMPONENTS " + json.dumps({c.name: c.health() for c in main.COMPONENTS}))
+"""
+
+
+def child_env(workdir):
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "profile")  # ChatGroq needs one to construct
+    env["RETRIEVER_PATH"] = os.path.join(workdir, "knowledge_base.json")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def run_child(code, env, importtime=False):
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    proc = subprocess.run(args, cwd=HERE, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"child failed:\n{proc.stderr}")
+    return proc
+
+
+def parse_importtime(stderr):
+    """(module, self_us, cumulative_us) for every line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def top_level_packages(rows):
+    """Cumulative import time of each top-level package imported directly"""
+    totals = {}
+    for name, _, cumulative in rows:
+        if "." not in name:
+            totals[name] = max(totals.get(name, 0), cumulative)
+    return totals
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--max-import-seconds", type=float)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="brain_startup_") as workdir:
+        env = child_env(workdir)
+        t0 = time.perf_counter()
+        proc = run_child(IMPORT_SNIPPET, env, importtime=True)
+        process_seconds = time.perf_counter() - t0
+        import_seconds = float(next(line.split()[1] for line in proc.stdout.splitlines()
+                                    if line.startswith("IMPORT_SECONDS")))
+        rows = parse_importtime(proc.stderr)
+
+        proc = run_child(COMPONENT_SNIPPET, env)
+        components = json.loads(next(line[len("COMPONENTS "):] for line in proc.stdout.splitlines()
+                                     if line.startswith("COMPONENTS ")))
+
+    packages = sorted(top_level_packages(rows).items(), key=lambda item: -item[1])
+    slowest = sorted(rows, key=lambda row: -row[1])[:args.top]
+
+    print(f"import main:            {import_seconds:.3f}s")
+    print(f"interpreter + import:   {process_seconds:.3f}s")
+    print(f"\nTop-level packages (cumulative):")
+    for name, cumulative in packages[:args.top]:
+        print(f"  {cumulative / 1e6:>8.3f}s  {name}")
+    print(f"\nSlowest modules (self):")
+    for name, self_us, _ in slowest:
+        print(f"  {self_us / 1e6:>8.3f}s  {name}")
+    print(f"\nComponents (built lazily / in the background):")
+    for name, health in components.items():
+        seconds = health.get("init_seconds")
+        timing = f"{seconds:>8.3f}s" if seconds is not None else f"{'-':>9}"
+        print(f"  {timing}  {name:<16} {health['status']}  {health.get('error', '')}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "import_seconds": import_seconds,
+                "process_seconds": process_seconds,
+                "packages": dict(packages),
+                "slowest_modules": [{"module": n, "self_us": s, "cumulative_us": c} for n, s, c in slowest],
+                "components": components,
+            }, f, indent=2)
+
+    if args.max_import_seconds is not None and import_seconds > args.max_import_seconds:
+        sys.exit(f"import main took {import_seconds:.3f}s, budget is {args.max_import_seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,220 @@
+"""
+Rule retrieval for the analyze graph.
+
+The default `LocalRetriever` needs no model and no network. A deterministic
+hashing embedder (word unigrams plus character n-grams, signed feature
+hashing, IDF weighting) maps text to a small dense vector, and a NumPy matrix
+holds one L2-normalised row per rule. A query is one matrix-vector product and
+an argpartition; `search_batch` scores many queries in one matrix product.
+The matrix can be kept in float16 to halve its memory; rows are converted to
+float32 in chunks at query time, so prefer float16 only for large rule sets
+queried in batches.
+
+`ChromaRetriever` wraps the previous Chroma store behind the same interface.
+Choose with RETRIEVER=local|chroma.
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+class HashingEmbedder:
+    """Deterministic text -> dense vector embedding via feature hashing"""
+
+    def __init__(self, dim: int = 512, ngram: Tuple[int, int] = (3, 4)):
+        self.dim = dim
+        self.ngram = ngram
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    def features(self, text: str) -> List[str]:
+        features = []
+        low, high = self.ngram
+        for word in _WORD.findall(text.lower()):
+            features.append(word)
+            padded = f"<{word}>"
+            for n in range(low, high + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def _raw(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Low bits pick the bucket, bit 31 the sign, so collisions tend to cancel
+            vector[h % self.dim] += -1.0 if h & 0x80000000 else 1.0
+        return vector
+
+    def fit(self, texts: Sequence[str]):
+        """Learn IDF weights so common words ("if", "cpa", "campaign") count less"""
+        df = np.zeros(self.dim, dtype=np.float32)
+        for text in texts:
+            df += self._raw(text) != 0
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self._raw(text)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class MatrixIndex:
+    """Exact cosine top-k over an in-memory embedding matrix"""
+
+    # Rows scored per step when the matrix is float16 (cast to float32 for BLAS)
+    CHUNK_ROWS = 8192
+
+    def __init__(self, embedder: HashingEmbedder, dtype=np.float32):
+        self.embedder = embedder
+        self.dtype = np.dtype(dtype)
+        self.texts: List[str] = []
+        self.matrix = np.zeros((0, embedder.dim), dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def build(self, texts: Sequence[str]):
+        """Re-fit IDF on `texts` and replace the index"""
+        self.embedder.fit(texts)
+        self.texts = list(texts)
+        self.matrix = self.embedder.embed(self.texts).astype(self.dtype)
+
+    def add(self, texts: Sequence[str]):
+        """Append rows using the current IDF weights (call build() to re-fit)"""
+        self.texts.extend(texts)
+        rows = self.embedder.embed(texts).astype(self.dtype)
+        self.matrix = np.vstack([self.matrix, rows])
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        if self.dtype == np.float32:
+            return queries @ self.matrix.T
+        scores = np.empty((queries.shape[0], len(self.texts)), dtype=np.float32)
+        for start in range(0, len(self.texts), self.CHUNK_ROWS):
+            chunk = self.matrix[start:start + self.CHUNK_ROWS].astype(np.float32)
+            scores[:, start:start + len(chunk)] = queries @ chunk.T
+        return scores
+
+    def search_batch(self, queries: Sequence[str], k: int = 1) -> List[List[Tuple[str, float]]]:
+        if not self.texts or not queries:
+            return [[] for _ in queries]
+        k = min(k, len(self.texts))
+        scores = self._scores(self.embedder.embed(queries))
+        if k < len(self.texts):
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(len(self.texts)), (len(queries), 1))
+        results = []
+        for row, candidates in enumerate(top):
+            ranked = candidates[np.argsort(-scores[row, candidates], kind="stable")]
+            results.append([(self.texts[i], float(scores[row, i])) for i in ranked])
+        return results
+
+    def search(self, query: str, k: int = 1) -> List[Tuple[str, float]]:
+        return self.search_batch([query], k)[0]
+
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+
+class LocalRetriever:
+    """Knowledge base in a MatrixIndex, persisted as a JSON list of rules"""
+
+    def __init__(self, path: Optional[str] = None, dim: int = 512, dtype=np.float32):
+        self.path = path
+        self.index = MatrixIndex(HashingEmbedder(dim), dtype)
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Re-read the rule file, e.g. after another worker added rules to it"""
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                texts = json.load(f)
+            with self._lock:
+                self.index.build(texts)
+
+    def __len__(self):
+        return len(self.index)
+
+    def texts(self) -> List[str]:
+        return list(self.index.texts)
+
+    def add_texts(self, texts: Iterable[str]):
+        with self._lock:
+            # Rule sets are small: re-fit IDF over everything on each change
+            self.index.build(self.index.texts + list(texts))
+            if self.path:
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(self.index.texts, f, indent=1)
+                os.replace(tmp, self.path)
+
+    def search(self, query: str, k: int = 1) -> List[str]:
+        return [text for text, _ in self.index.search(query, k)]
+
+    async def asearch(self, query: str, k: int = 1) -> List[str]:
+        # Microseconds of NumPy work; not worth a trip through the executor
+        return self.search(query, k)
+
+    def stats(self) -> dict:
+        return {"backend": "local", "rules": len(self.index), "dim": self.index.embedder.dim,
+                "dtype": str(self.index.dtype), "matrix_bytes": self.index.nbytes()}
+
+
+class ChromaRetriever:
+    """The previous Chroma store (FakeEmbeddings) behind the retriever interface"""
+
+    def __init__(self, persist_directory: str = "./chroma_db"):
+        from langchain_community.vectorstores import Chroma
+        from langchain_community.embeddings import FakeEmbeddings
+
+        self.vector_db = Chroma(persist_directory=persist_directory,
+                                embedding_function=FakeEmbeddings(size=4096))
+
+    def __len__(self):
+        # COUNT(*) in Chroma instead of fetching every id
+        return self.vector_db._collection.count()
+
+    def texts(self) -> List[str]:
+        return list(self.vector_db.get()['documents'])
+
+    def add_texts(self, texts: Iterable[str]):
+        self.vector_db.add_texts(list(texts))
+
+    def reload(self):
+        pass  # every query reads the persisted collection
+
+    def search(self, query: str, k: int = 1) -> List[str]:
+        return [doc.page_content for doc in self.vector_db.similarity_search(query, k=k)]
+
+    async def asearch(self, query: str, k: int = 1) -> List[str]:
+        docs = await self.vector_db.asimilarity_search(query, k=k)
+        return [doc.page_content for doc in docs]
+
+    def stats(self) -> dict:
+        return {"backend": "chroma", "rules": len(self)}
+
+
+def create_retriever(kind: Optional[str] = None):
+    """Build the retriever named by RETRIEVER (local or chroma)"""
+    kind = (kind or os.getenv("RETRIEVER", "local")).lower()
+    if kind == "chroma":
+        return ChromaRetriever(os.getenv("CHROMA_PATH", "./chroma_db"))
+    if kind != "local":
+        raise ValueError(f"Unknown RETRIEVER {kind!r} (expected local or chroma)")
+    dtype = np.float16 if os.getenv("RETRIEVER_FLOAT16", "0") == "1" else np.float32
+    return LocalRetriever(
+        path=os.getenv("RETRIEVER_PATH", "./knowledge_base.json"),
+        dim=int(os.getenv("RETRIEVER_DIM", "512")),
+        dtype=dtype,
+    )
@@ -0,0 +1,205 @@
+"""
+Compiles threshold-style knowledge-base rules into a decision table.
+
+Rules such as "If CPA is above $50, PAUSE the campaign immediately." are
+parsed into CPA intervals with an action. The intervals are cut into
+elementary segments at every threshold (each threshold is its own segment,
+so "above" and "between ... and" boundaries are exact), and each segment
+records which actions apply there. A lookup is one bisect.
+
+A segment is decisive only when exactly one action applies to it. Rules of
+the form "Never pause 'Brand Awareness' campaigns." compile to vetoes: a
+forbidden action for matching campaigns is never decided here. Any other
+rule the compiler does not understand may change any decision, so its
+presence turns the table off and every request goes to the LLM.
+
+Rules are matched whole against a small grammar: one CPA condition, the
+action, and an optional object ("the campaign", "the budget by 20%",
+"immediately", "and monitor"). Negations ("do not SCALE"), extra
+conditions ("... and spend is under $100") or any other trailing text do
+not fit it, so such rules are left uncompiled rather than half-read.
+"""
+from bisect import bisect_left
+from typing import Iterable, List, NamedTuple, Optional
+import math
+import re
+import threading
+
+ACTIONS = ("PAUSE", "SCALE", "MAINTAIN")
+
+# "1,000", "1000" and "49.99"; thousands separators must be well-formed
+_NUMBER = r"\$?\s*(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+_METRIC = r"if\s+(?:the\s+)?cpa\s+is\s+"
+_ACTION = r"\s*,?\s*(" + "|".join(ACTIONS) + r")"
+_OBJECT = (r"(?:\s+(?:the\s+)?(?:campaign|budget)(?:\s+by\s+\d+(?:\.\d+)?\s*%)?)?"
+           r"(?:\s+(?:immediately|and\s+monitor))?\s*\.?")
+
+
+def _rule(condition: str) -> "re.Pattern":
+    return re.compile(_METRIC + condition + _ACTION + _OBJECT, re.IGNORECASE)
+
+
+_BETWEEN = _rule(r"between\s+" + _NUMBER + r"\s+and\s+" + _NUMBER)
+_ABOVE = _rule(r"(?:above|over|greater\s+than|more\s+than)\s+" + _NUMBER)
+_BELOW = _rule(r"(?:below|under|less\s+than)\s+" + _NUMBER)
+_VETO = re.compile(r"never\s+(" + "|".join(ACTIONS) + r")\s+['\"]([^'\"]+)['\"]\s+campaigns?\s*\.?",
+                   re.IGNORECASE)
+
+INF = float("inf")
+
+
+class Threshold(NamedTuple):
+    low: float
+    low_inclusive: bool
+    high: float
+    high_inclusive: bool
+    action: str
+    text: str
+
+    def matches(self, cpa: float) -> bool:
+        above_low = cpa >= self.low if self.low_inclusive else cpa > self.low
+        below_high = cpa <= self.high if self.high_inclusive else cpa < self.high
+        return above_low and below_high
+
+
+class Veto(NamedTuple):
+    action: str
+    campaign: str  # lower-cased substring of the campaign name
+    text: str
+
+
+class Decision(NamedTuple):
+    decision: str
+    reason: str
+    rule: str
+
+
+def _amount(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+def parse_rule(text: str):
+    """Return a Threshold, a Veto, or None when the rule is not understood"""
+    rule = text.strip()
+    veto = _VETO.fullmatch(rule)
+    if veto:
+        return Veto(veto.group(1).upper(), veto.group(2).strip().lower(), text)
+
+    match = _BETWEEN.fullmatch(rule)
+    if match:
+        low, high = sorted((_amount(match.group(1)), _amount(match.group(2))))
+        return Threshold(low, True, high, True, match.group(3).upper(), text)
+    match = _ABOVE.fullmatch(rule)
+    if match:
+        return Threshold(_amount(match.group(1)), False, INF, False, match.group(2).upper(), text)
+    match = _BELOW.fullmatch(rule)
+    if match:
+        return Threshold(-INF, False, _amount(match.group(1)), False, match.group(2).upper(), text)
+    return None
+
+
+class FastPathCounters:
+    """Outcome counts of RuleTable.decide, kept across recompiles (they are exported as counters)"""
+
+    NAMES = ("decided", "no_match", "ambiguous", "vetoed", "disabled", "not_finite")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.NAMES, 0)
+
+    def count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+class RuleTable:
+    """Executable decision table compiled from a rule set"""
+
+    def __init__(self, rules: Iterable[str], counters: Optional[FastPathCounters] = None):
+        self.thresholds: List[Threshold] = []
+        self.vetoes: List[Veto] = []
+        self.uncompiled: List[str] = []
+        for text in rules:
+            parsed = parse_rule(text)
+            if isinstance(parsed, Threshold):
+                self.thresholds.append(parsed)
+            elif isinstance(parsed, Veto):
+                self.vetoes.append(parsed)
+            else:
+                self.uncompiled.append(text)
+
+        # Segments alternate open interval / threshold point:
+        # (-inf, b0), [b0], (b0, b1), [b1], ..., (bn, inf)
+        self.bounds = sorted({t.low for t in self.thresholds if t.low != -INF}
+                             | {t.high for t in self.thresholds if t.high != INF})
+        self.segments = [self._segment_rules(self._representative(i))
+                         for i in range(2 * len(self.bounds) + 1)]
+
+        self.counters = counters or FastPathCounters()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.thresholds) and not self.uncompiled
+
+    def _representative(self, segment: int) -> float:
+        bounds = self.bounds
+        if segment % 2:
+            return bounds[segment // 2]
+        i = segment // 2
+        low = bounds[i - 1] if i > 0 else None
+        high = bounds[i] if i < len(bounds) else None
+        if low is None and high is None:
+            return 0.0
+        if low is None:
+            return high - 1
+        if high is None:
+            return low + 1
+        return (low + high) / 2
+
+    def _segment_rules(self, cpa: float) -> List[Threshold]:
+        return [t for t in self.thresholds if t.matches(cpa)]
+
+    def _segment(self, cpa: float) -> int:
+        i = bisect_left(self.bounds, cpa)
+        if i < len(self.bounds) and self.bounds[i] == cpa:
+            return 2 * i + 1
+        return 2 * i
+
+    def decide(self, campaign_name: str, cpa: float) -> Optional[Decision]:
+        """The decision when the compiled rules settle it, else None (ask the LLM)"""
+        if not self.enabled:
+            return self._miss("disabled")
+        if not math.isfinite(cpa):
+            return self._miss("not_finite")  # NaN would bisect into the lowest segment
+        matched = self.segments[self._segment(cpa)]
+        if not matched:
+            return self._miss("no_match")
+        actions = {t.action for t in matched}
+        if len(actions) > 1:
+            return self._miss("ambiguous")
+        action = matched[0].action
+        name = campaign_name.lower()
+        if any(v.action == action and v.campaign in name for v in self.vetoes):
+            return self._miss("vetoed")
+
+        self.counters.count("decided")
+        rule = matched[0].text
+        return Decision(action, f"CPA ${cpa} matched rule: {rule}", rule)
+
+    def _miss(self, reason: str) -> None:
+        self.counters.count(reason)
+        return None
+
+    def stats(self) -> dict:
+        stats = self.counters.snapshot()
+        return {
+            "enabled": self.enabled,
+            "thresholds": len(self.thresholds),
+            "vetoes": len(self.vetoes),
+            "uncompiled": list(self.uncompiled),
+            **stats,
+        }
@@ -0,0 +1,227 @@
+"""
+Single-flight coalescing for identical concurrent requests.
+
+`await flights.run(key, fn)` runs `fn` once per key at a time and hands its
+result to every caller that asked for the same key meanwhile, instead of
+running the work again or turning the latecomers away.
+
+- Within a worker, callers of an in-flight key await the leader's future.
+- Across workers, the leader is whoever takes the `<prefix>active:<key>`
+  lock in Redis (auto-extended while it runs). When it finishes it stores
+  the result under `<prefix>result:<key>` for `result_ttl` seconds and
+  publishes it on `<prefix>done:<key>`. Waiters in other workers share one
+  pattern subscription per worker; they check the result key after
+  subscribing, so a result published just before they arrived is not
+  missed.
+
+If the leader fails or dies, its lock goes away with no result. Waiters
+notice within `poll_interval` and run `fn` themselves. Redis errors degrade
+to in-process coalescing only.
+"""
+from typing import Any, Awaitable, Callable, Tuple
+import asyncio
+import json
+
+from lock_manager import AsyncLockManager
+
+
+def _consume(future):
+    # Leader failures are re-raised to the leader; don't log them again as unretrieved
+    if not future.cancelled():
+        future.exception()
+
+
+class SingleFlight:
+    def __init__(self, redis_client=None, prefix: str = "flight:", lock_ttl_ms: int = 10000,
+                 result_ttl: int = 5, wait_timeout: float = 120.0, poll_interval: float = 1.0):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.result_ttl = result_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.leaders = (AsyncLockManager(redis_client, prefix=f"{prefix}active:", ttl_ms=lock_ttl_ms)
+                        if redis_client is not None else None)
+        self._loop = None
+        self._stats = {"leaders": 0, "local_shared": 0, "remote_shared": 0, "fallbacks": 0,
+                       "timeouts": 0, "redis_errors": 0}
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._flights = {}  # key -> future of the in-process leader
+            self._waiters = {}  # done channel -> futures waiting on another worker
+            self._listener = None
+            self._subscribed = asyncio.Event()
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when another caller did the work"""
+        self._bind()
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                break
+            try:
+                result = await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if flight.cancelled():
+                    continue  # the leader was cancelled, not us: take over
+                raise
+            self._stats["local_shared"] += 1
+            return result, True
+
+        flight = self._loop.create_future()
+        flight.add_done_callback(_consume)
+        self._flights[key] = flight
+        try:
+            result, shared = await self._run_once(key, fn)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as exc:
+            flight.set_exception(exc)
+            raise
+        else:
+            flight.set_result(result)
+            return result, shared
+        finally:
+            self._flights.pop(key, None)
+
+    async def _run_once(self, key, fn):
+        if self.leaders is None:
+            self._stats["leaders"] += 1
+            return await fn(), False
+        try:
+            lock = await self.leaders.acquire(key, auto_extend=True)
+        except Exception as exc:
+            self._redis_error(exc)
+            self._stats["leaders"] += 1
+            return await fn(), False
+
+        if lock is not None:
+            self._stats["leaders"] += 1
+            try:
+                result = await fn()
+                await self._publish(key, result)
+            finally:
+                await self._release(lock)
+            return result, False
+
+        # Another worker is running this exact request: wait for its result
+        result = await self._wait_remote(key)
+        if result is not None:
+            self._stats["remote_shared"] += 1
+            return result, True
+        self._stats["fallbacks"] += 1
+        return await fn(), False
+
+    # ==================== CROSS-WORKER ====================
+
+    def _channel(self, key):
+        return f"{self.prefix}done:{key}"
+
+    def _result_key(self, key):
+        return f"{self.prefix}result:{key}"
+
+    async def _publish(self, key, result):
+        payload = json.dumps(result)
+        try:
+            await self.redis.set(self._result_key(key), payload, ex=self.result_ttl)
+            await self.redis.publish(self._channel(key), payload)
+        except Exception as exc:
+            self._redis_error(exc)
+
+    async def _release(self, lock):
+        try:
+            await lock.release()
+        except Exception as exc:
+            self._redis_error(exc)
+
+    async def _wait_remote(self, key):
+        channel = self._channel(key)
+        waiter = self._loop.create_future()
+        self._waiters.setdefault(channel, []).append(waiter)
+        try:
+            await self._ensure_listener()
+            raw = await self.redis.get(self._result_key(key))
+            if raw is not None:
+                return json.loads(raw)
+            deadline = self._loop.time() + self.wait_timeout
+            while True:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    return None
+                try:
+                    raw = await asyncio.wait_for(asyncio.shield(waiter), min(self.poll_interval, remaining))
+                    return json.loads(raw)
+                except asyncio.TimeoutError:
+                    pass
+                # No message yet: is the leader still alive?
+                if not await self.redis.exists(self.leaders.key(key)):
+                    raw = await self.redis.get(self._result_key(key))
+                    return json.loads(raw) if raw is not None else None
+        except Exception as exc:
+            self._redis_error(exc)
+            return None
+        finally:
+            waiters = self._waiters.get(channel, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(channel, None)
+
+    async def _ensure_listener(self):
+        if self._listener is None:
+            self._subscribed.clear()
+            self._listener = self._loop.create_task(self._listen())
+        await self._subscribed.wait()
+
+    async def _listen(self):
+        """One pattern subscription per worker feeds every waiting request"""
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.psubscribe(f"{self.prefix}done:*")
+            self._subscribed.set()
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message or message["type"] != "pmessage":
+                    continue
+                for waiter in self._waiters.get(message["channel"], ()):
+                    if not waiter.done():
+                        waiter.set_result(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            # Waiters fall back to polling the leader lock; resubscribe on next wait
+            self._redis_error(exc)
+            self._listener = None
+        finally:
+            self._subscribed.set()
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    # ==================== STATS ====================
+
+    def _redis_error(self, exc: Exception):
+        self._stats["redis_errors"] += 1
+        if self._stats["redis_errors"] == 1:
+            print(f"Warning: single-flight Redis coordination unavailable ({exc}); "
+                  f"coalescing within this worker only")
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._flights) if self._loop else 0
+        stats["waiting_on_other_workers"] = sum(map(len, self._waiters.values())) if self._loop else 0
+        return stats
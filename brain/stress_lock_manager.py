@@ -0,0 +1,183 @@
+"""
+Local concurrency stress test for lock_manager.py against an in-process fake
+Redis (no server needed).
+
+Several workers (threads, each with its own event loop, AsyncLockManager
+and client, like uvicorn workers sharing one Redis) run many tasks that
+hammer a few campaign keys; every critical section checks that nobody else
+is inside it. The same workload is run with the old exists-then-set pattern
+to show the race the lock manager removes. Further checks cover token-safe
+release after expiry, auto-extension, max hold time and acquire_many.
+
+Usage: python stress_lock_manager.py [--workers 4] [--tasks 32] [--iterations 50] [--keys 4]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import random
+import threading
+
+from fake_redis import FakeAsyncRedis, FakeRedis
+from lock_manager import AsyncLockManager
+
+
+class Section:
+    """Critical-section checker: counts overlapping holders per key"""
+
+    def __init__(self):
+        self._inside = {}
+        self._lock = threading.Lock()
+        self.violations = 0
+        self.entries = 0
+
+    def enter(self, key):
+        with self._lock:
+            self.entries += 1
+            if self._inside.get(key):
+                self.violations += 1
+            self._inside[key] = self._inside.get(key, 0) + 1
+
+    def leave(self, key):
+        with self._lock:
+            self._inside[key] -= 1
+
+
+def hammer(make_task, workers, tasks):
+    """Run `tasks` copies of make_task(client) on each of `workers` event loops over one backend"""
+    backend = FakeRedis(latency=0)
+
+    def worker():
+        async def main():
+            client = FakeAsyncRedis(latency=0.0005, backend=backend)
+            task = make_task(client)
+            await asyncio.gather(*(task() for _ in range(tasks)))
+        asyncio.run(main())
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(worker) for _ in range(workers)]:
+            future.result()
+
+
+def run_naive(workers, tasks, iterations, keys):
+    """The pre-lock-manager pattern: r.exists() then r.set()"""
+    section = Section()
+
+    def make_task(r):
+        async def task():
+            for _ in range(iterations):
+                key = f"lock:campaign_{random.randrange(keys)}"
+                if await r.exists(key):
+                    await asyncio.sleep(0)
+                    continue
+                await r.set(key, "processing", ex=10)
+                section.enter(key)
+                await asyncio.sleep(0.0001)
+                section.leave(key)
+                await r.delete(key)
+        return task
+
+    hammer(make_task, workers, tasks)
+    return section
+
+
+def run_manager(workers, tasks, iterations, keys):
+    section = Section()
+    managers = []
+
+    def make_task(r):
+        manager = AsyncLockManager(r, ttl_ms=10000)
+        managers.append(manager)
+
+        async def task():
+            for _ in range(iterations):
+                name = f"campaign_{random.randrange(keys)}"
+                lock = await manager.acquire(name, timeout=random.choice((0, 0.01)), retry_interval=0.001)
+                if lock is None:
+                    continue
+                section.enter(name)
+                await asyncio.sleep(0.0001)
+                section.leave(name)
+                await lock.release()
+        return task
+
+    hammer(make_task, workers, tasks)
+    stats = [m.stats() for m in managers]
+    totals = {key: sum(s[key] for s in stats)
+              for key in ("attempts", "acquired", "contended", "timeouts", "released")}
+    totals["wait_max_ms"] = max(s["wait_ms"]["max"] for s in stats)
+    return section, totals
+
+
+async def check_release_after_expiry():
+    """An expired holder must not delete the lock its successor now owns"""
+    manager = AsyncLockManager(FakeAsyncRedis(latency=0), ttl_ms=50)
+    first = await manager.acquire("campaign_x")
+    await asyncio.sleep(0.08)
+    second = await manager.acquire("campaign_x")
+    assert second is not None, "lock did not expire"
+    assert not await first.release(), "stale owner released someone else's lock"
+    assert await manager.redis.get(second.key) == second.token
+    assert await second.release()
+
+
+async def check_auto_extend():
+    """An auto-extended lock survives well past its TTL until released"""
+    manager = AsyncLockManager(FakeAsyncRedis(latency=0), ttl_ms=60)
+    lock = await manager.acquire("campaign_llm", auto_extend=True)
+    await asyncio.sleep(0.3)
+    assert await manager.acquire("campaign_llm") is None, "auto-extended lock expired"
+    assert await lock.release() and not lock.lost
+    assert await manager.acquire("campaign_llm") is not None
+
+
+async def check_max_hold():
+    """Auto-extension stops after max_hold_ms so a stuck holder can't pin a key"""
+    manager = AsyncLockManager(FakeAsyncRedis(latency=0), ttl_ms=60, max_hold_ms=100)
+    lock = await manager.acquire("campaign_stuck", auto_extend=True, token="caller-token")
+    assert await manager.acquire("campaign_stuck") is None
+    await asyncio.sleep(0.3)
+    assert await manager.acquire("campaign_stuck") is not None, "stuck lock was extended forever"
+    assert not await manager.release_token(lock.token)
+
+
+async def check_acquire_many():
+    manager = AsyncLockManager(FakeAsyncRedis(latency=0))
+    held = await manager.acquire("b")
+    locks = await manager.acquire_many(["a", "b", "c"])
+    assert [lock is not None for lock in locks] == [True, False, True]
+    assert await manager.release_many(locks) == 2
+    assert await held.release()
+
+
+async def run_checks():
+    await check_release_after_expiry()
+    await check_auto_extend()
+    await check_max_hold()
+    await check_acquire_many()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4, help="event loops sharing the fake server")
+    parser.add_argument("--tasks", type=int, default=32, help="concurrent tasks per worker")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--keys", type=int, default=4)
+    args = parser.parse_args()
+
+    naive = run_naive(args.workers, args.tasks, args.iterations, args.keys)
+    print(f"exists/set:        {naive.entries} critical sections, {naive.violations} overlapping")
+
+    section, stats = run_manager(args.workers, args.tasks, args.iterations, args.keys)
+    print(f"AsyncLockManager:  {section.entries} critical sections, {section.violations} overlapping")
+    print(f"  acquired={stats['acquired']} contended={stats['contended']} timeouts={stats['timeouts']} "
+          f"contention_ratio={stats['contended'] / stats['attempts']:.2f} "
+          f"wait max={stats['wait_max_ms']:.2f}ms")
+    assert section.violations == 0, "mutual exclusion violated"
+    assert stats["released"] == stats["acquired"]
+
+    asyncio.run(run_checks())
+    print("release-after-expiry, auto-extend, max-hold and acquire_many checks passed")
+
+
+if __name__ == "__main__":
+    main()
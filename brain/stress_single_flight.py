@@ -0,0 +1,137 @@
+"""
+Local stress test for single_flight.py against the in-process fake Redis.
+
+Two SingleFlight instances share one fake Redis backend to play two workers.
+Bursts of identical requests land on both; the work must run exactly once
+and every caller must get its result. Further checks cover distinct inputs,
+a leader that fails (waiters take over) and a result published before a
+waiter subscribed.
+
+Usage: python stress_single_flight.py [--callers 200] [--work-seconds 0.2]
+"""
+import argparse
+import asyncio
+import time
+
+from fake_redis import FakeAsyncRedis, FakeRedis
+from single_flight import SingleFlight
+
+
+def two_workers(**kwargs):
+    backend = FakeRedis(latency=0)
+    return [SingleFlight(FakeAsyncRedis(latency=0.001, backend=backend), poll_interval=0.05, **kwargs)
+            for _ in range(2)]
+
+
+async def check_burst(callers, work_seconds):
+    workers = two_workers()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(work_seconds)
+        return {"decision": "MAINTAIN", "run": len(runs)}
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(workers[i % 2].run("campaign-1", work) for i in range(callers)))
+    elapsed = time.perf_counter() - t0
+    assert len(runs) == 1, f"work ran {len(runs)} times"
+    assert all(result == {"decision": "MAINTAIN", "run": 1} for result, _ in results)
+    assert sum(not shared for _, shared in results) == 1
+    stats = [w.stats() for w in workers]
+    print(f"burst: {callers} callers on 2 workers, work ran {len(runs)}x in {elapsed:.2f}s; "
+          f"local_shared={sum(s['local_shared'] for s in stats)} "
+          f"remote_shared={sum(s['remote_shared'] for s in stats)}")
+    for w in workers:
+        await w.close()
+
+
+async def check_distinct_inputs():
+    workers = two_workers()
+    runs = []
+
+    async def work(key):
+        runs.append(key)
+        await asyncio.sleep(0.05)
+        return {"key": key}
+
+    keys = [f"campaign-{i % 5}" for i in range(50)]
+    results = await asyncio.gather(*(workers[i % 2].run(k, lambda k=k: work(k)) for i, k in enumerate(keys)))
+    assert sorted(runs) == sorted(set(keys)), runs
+    assert all(result["key"] == key for (result, _), key in zip(results, keys))
+    for w in workers:
+        await w.close()
+
+
+async def check_leader_failure():
+    """Waiters in another worker take over when the leader fails"""
+    leader, follower = two_workers()
+    attempts = []
+
+    async def failing():
+        attempts.append("leader")
+        await asyncio.sleep(0.1)
+        raise RuntimeError("LLM down")
+
+    async def succeeding():
+        attempts.append("follower")
+        return {"decision": "PAUSE"}
+
+    async def lead():
+        try:
+            await leader.run("campaign-x", failing)
+        except RuntimeError:
+            return "failed"
+
+    async def follow():
+        await asyncio.sleep(0.02)
+        return await follower.run("campaign-x", succeeding)
+
+    led, (result, shared) = await asyncio.gather(lead(), follow())
+    assert led == "failed" and result == {"decision": "PAUSE"} and not shared
+    assert attempts == ["leader", "follower"]
+    assert follower.stats()["fallbacks"] == 1
+    for w in (leader, follower):
+        await w.close()
+
+
+async def check_late_waiter():
+    """A result published just before a waiter arrives is still shared"""
+    first, second = two_workers()
+
+    async def work():
+        return {"decision": "SCALE"}
+
+    await first.run("campaign-y", work)
+
+    async def unused():
+        raise AssertionError("should have reused the published result")
+
+    # Simulate the race: the leader lock is still held when the waiter looks
+    lock = await first.leaders.acquire("campaign-y")
+    waiting = asyncio.ensure_future(second.run("campaign-y", unused))
+    await asyncio.sleep(0.01)
+    await lock.release()
+    result, shared = await waiting
+    assert result == {"decision": "SCALE"} and shared
+    for w in (first, second):
+        await w.close()
+
+
+async def main_async(args):
+    await check_burst(args.callers, args.work_seconds)
+    await check_distinct_inputs()
+    await check_leader_failure()
+    await check_late_waiter()
+    print("distinct-input, leader-failure and late-waiter checks passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--callers", type=int, default=200)
+    parser.add_argument("--work-seconds", type=float, default=0.2)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
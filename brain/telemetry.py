@@ -0,0 +1,432 @@
+"""
+Metrics for the FastAPI services: counters, histograms, Prometheus exposition.
+
+Hot-path updates take no lock. Every counter and histogram keeps one shard
+per thread, written only by that thread; a scrape sums the shards. On the
+event loop that is a single shard, and threadpool workers each get their own,
+so an increment is a dict lookup and an add.
+
+- `Registry.counter` / `.histogram` create metrics (optionally labelled);
+  `.callback` exposes values computed at scrape time (store sizes, existing
+  stats dicts). `Registry.render()` returns the Prometheus text format.
+- `PrometheusMiddleware` records per-route request counts and latency.
+- `instrumented_redis(registry)` returns a redis.asyncio.Redis subclass that
+  times every command and pipeline round trip.
+- `Telemetry` times graph nodes (wall and on-CPU time) and keeps per-request
+  timings for /analyze/stream.
+
+This module is used by both the LangGraph brain (brain/) and the REST API
+(backend/brain/); each service is its own Docker build context, so keep the
+two copies identical (scripts/check_shared_modules.py checks them in CI).
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import get_ident
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import functools
+import threading
+import time
+
+# Request / round-trip latency buckets (seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Graph node buckets (seconds); the JSON view reports them in ms
+TIMING_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Per-request {step: {"wall_ms", "cpu_ms"}}, set by Telemetry.collect()
+_request_timings: ContextVar[Optional[Dict[str, dict]]] = ContextVar("request_timings", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ==================== METRIC TYPES ====================
+
+class _Labelled:
+    """Parent of a labelled metric: children are created once, then looked up"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, object] = {}
+        self._create_lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._create_lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+                self._children[values] = child
+        return child
+
+    def _items(self):
+        seen = set()
+        for values, child in list(self._children.items()):
+            if id(child) not in seen:
+                seen.add(id(child))
+                yield tuple(str(v) for v in values), child
+
+
+class _CounterChild:
+    __slots__ = ("_shards",)
+
+    def __init__(self):
+        self._shards: Dict[int, List[float]] = {}
+
+    def inc(self, amount: float = 1):
+        shard = self._shards.get(get_ident())
+        if shard is None:
+            shard = self._shards.setdefault(get_ident(), [0])
+        shard[0] += amount
+
+    def value(self) -> float:
+        return sum(shard[0] for shard in list(self._shards.values()))
+
+
+class Counter(_Labelled):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+    def value(self) -> float:
+        return self._children[()].value()
+
+    def samples(self):
+        for values, child in self._items():
+            yield f"{self.name}{_labels(self.labelnames, values)} {_number(child.value())}"
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "_shards")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self._shards: Dict[int, list] = {}
+
+    def observe(self, value: float):
+        shard = self._shards.get(get_ident())
+        if shard is None:
+            shard = self._shards.setdefault(get_ident(), [[0] * (len(self.bounds) + 1), 0.0, 0.0])
+        shard[0][bisect_left(self.bounds, value)] += 1
+        shard[1] += value
+        if value > shard[2]:
+            shard[2] = value
+
+    def merged(self) -> Tuple[List[int], float, float]:
+        """(per-bucket counts, sum, max) over every thread's shard"""
+        counts = [0] * (len(self.bounds) + 1)
+        total = 0.0
+        peak = 0.0
+        for shard_counts, shard_sum, shard_max in [list(s) for s in list(self._shards.values())]:
+            for i, n in enumerate(shard_counts):
+                counts[i] += n
+            total += shard_sum
+            peak = max(peak, shard_max)
+        return counts, total, peak
+
+    def snapshot(self, scale: float = 1.0, unit: str = "") -> dict:
+        """JSON view: count, avg, approximate p50/p95 (bucket upper bounds), max, buckets"""
+        counts, total, peak = self.merged()
+        count = sum(counts)
+
+        def quantile(q):
+            if not count:
+                return 0.0
+            seen = 0
+            for bound, n in zip(self.bounds, counts):
+                seen += n
+                if seen >= q * count:
+                    return min(bound, peak) * scale
+            return peak * scale
+
+        buckets = {f"le_{bound * scale:g}{unit}": n for bound, n in zip(self.bounds, counts)}
+        buckets["inf"] = counts[-1]
+        return {
+            "count": count,
+            "avg": total / count * scale if count else 0.0,
+            "p50": quantile(0.5),
+            "p95": quantile(0.95),
+            "max": peak * scale,
+            "buckets": buckets,
+        }
+
+
+class Histogram(_Labelled):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def samples(self):
+        for values, child in self._items():
+            counts, total, _ = child.merged()
+            cumulative = 0
+            for bound, n in zip(self.bounds + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}"
+
+
+class _Callback:
+    """Values computed at scrape time: fn() returns a number or {label values: number}"""
+
+    def __init__(self, name: str, help: str, fn: Callable, kind: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return
+        if not isinstance(value, dict):
+            yield f"{self.name} {_number(value)}"
+            return
+        for values, number in value.items():
+            values = values if isinstance(values, tuple) else (values,)
+            yield f"{self.name}{_labels(self.labelnames, values)} {_number(number)}"
+
+
+class Registry:
+    def __init__(self, namespace: str = ""):
+        self.prefix = f"{namespace}_" if namespace else ""
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(self.prefix + name, help, tuple(labelnames)))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help, tuple(labelnames), buckets))
+
+    def callback(self, name: str, help: str, fn: Callable, kind: str = "gauge",
+                 labelnames: Iterable[str] = ()):
+        return self._add(_Callback(self.prefix + name, help, fn, kind, tuple(labelnames)))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as exc:
+                # One broken source (e.g. storage down) must not fail the scrape
+                lines.append(f"# {metric.name} unavailable: {_escape(exc)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# ==================== HTTP ====================
+
+class PrometheusMiddleware:
+    """ASGI middleware: request count and latency per route template"""
+
+    def __init__(self, app, registry: Registry):
+        self.app = app
+        self.requests = registry.counter("http_requests_total", "HTTP requests by route and status",
+                                         ("method", "route", "status"))
+        self.latency = registry.histogram("http_request_duration_seconds",
+                                          "HTTP request latency by route", ("method", "route"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # The route template (/campaigns/{campaign_id}) keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            self.latency.labels(method, route).observe(time.perf_counter() - started)
+            self.requests.labels(method, route, status).inc()
+
+
+# ==================== REDIS ====================
+
+def instrumented_redis(registry: Registry):
+    """A redis.asyncio.Redis subclass timing every command and pipeline"""
+    import redis.asyncio as aioredis
+
+    duration = registry.histogram("redis_command_duration_seconds",
+                                  "Redis round-trip time by command", ("command",))
+    errors = registry.counter("redis_command_errors_total", "Failed Redis commands", ("command",))
+
+    class InstrumentedPipeline(aioredis.client.Pipeline):
+        async def execute(self, raise_on_error: bool = True):
+            started = time.perf_counter()
+            try:
+                return await super().execute(raise_on_error)
+            except Exception:
+                errors.labels("PIPELINE").inc()
+                raise
+            finally:
+                duration.labels("PIPELINE").observe(time.perf_counter() - started)
+
+    class InstrumentedRedis(aioredis.Redis):
+        async def execute_command(self, *args, **options):
+            command = str(args[0]).upper() if args else "UNKNOWN"
+            started = time.perf_counter()
+            try:
+                return await super().execute_command(*args, **options)
+            except Exception:
+                errors.labels(command).inc()
+                raise
+            finally:
+                duration.labels(command).observe(time.perf_counter() - started)
+
+        def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None):
+            return InstrumentedPipeline(self.connection_pool, self.response_callbacks,
+                                        transaction, shard_hint)
+
+    return InstrumentedRedis
+
+
+def stats_callbacks(registry: Registry, prefix: str, source: Callable[[], Optional[dict]],
+                    fields: Dict[str, Tuple[str, str]]):
+    """Expose numeric fields of an existing stats() dict: {field: (kind, help)}"""
+    for field, (kind, help) in fields.items():
+        def read(field=field):
+            stats = source()
+            return None if stats is None else stats.get(field)
+        suffix = "_total" if kind == "counter" else ""
+        registry.callback(f"{prefix}_{field}{suffix}", help, read, kind)
+
+
+# ==================== GRAPH NODES ====================
+
+class _CPUTimed:
+    """Drives a coroutine, adding up thread CPU time only while it runs"""
+
+    __slots__ = ("coro", "cpu")
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.cpu = 0.0
+
+    def __await__(self):
+        send, throw = self.coro.send, self.coro.throw
+        value, error = None, None
+        while True:
+            started = time.thread_time()
+            try:
+                yielded = throw(error) if error is not None else send(value)
+            except StopIteration as stop:
+                self.cpu += time.thread_time() - started
+                return stop.value
+            except BaseException:
+                self.cpu += time.thread_time() - started
+                raise
+            self.cpu += time.thread_time() - started
+            try:
+                value, error = (yield yielded), None
+            except BaseException as exc:
+                value, error = None, exc
+
+
+class Telemetry:
+    """Wall and on-CPU time of named steps (graph nodes)"""
+
+    def __init__(self, registry: Optional[Registry] = None, buckets: Tuple[float, ...] = TIMING_BUCKETS):
+        registry = registry or Registry()
+        self._wall = registry.histogram("node_wall_seconds", "Graph node wall time", ("node",), buckets)
+        self._cpu = registry.histogram("node_cpu_seconds", "Graph node on-CPU time", ("node",), buckets)
+        self._errors = registry.counter("node_errors_total", "Graph node failures", ("node",))
+        self._names: Dict[str, None] = {}
+
+    def observe(self, name: str, wall: float, cpu: float, failed: bool = False):
+        """Record one run of `name` (seconds)"""
+        self._names[name] = None
+        self._wall.labels(name).observe(wall)
+        self._cpu.labels(name).observe(cpu)
+        if failed:
+            self._errors.labels(name).inc()
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = {"wall_ms": round(wall * 1000, 3), "cpu_ms": round(cpu * 1000, 3)}
+
+    def timed(self, name: str):
+        """Decorator for async graph nodes"""
+        def wrap(fn):
+            @functools.wraps(fn)
+            async def timed_node(*args, **kwargs):
+                started = time.perf_counter()
+                run = _CPUTimed(fn(*args, **kwargs))
+                failed = True
+                try:
+                    result = await run
+                    failed = False
+                    return result
+                finally:
+                    self.observe(name, time.perf_counter() - started, run.cpu, failed)
+            return timed_node
+        return wrap
+
+    @contextmanager
+    def collect(self):
+        """Keep the timings of the steps run inside this block (per request)"""
+        timings: Dict[str, dict] = {}
+        token = _request_timings.set(timings)
+        try:
+            yield timings
+        finally:
+            _request_timings.reset(token)
+
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    def stats(self) -> dict:
+        return {name: {"wall_ms": self._wall.labels(name).snapshot(1000, "ms"),
+                       "cpu_ms": self._cpu.labels(name).snapshot(1000, "ms"),
+                       "errors": self._errors.labels(name).value()}
+                for name in self._names}
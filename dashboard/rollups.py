@@ -0,0 +1,153 @@
+"""
+Pre-computed decision counts for campaign_logs.
+
+n8n appends one row per decision to campaign_logs. A statement-level trigger
+folds every insert into campaign_decision_rollups: one counter per
+(granularity, bucket, campaign_id, decision) for minute, hour and day
+buckets, plus an all-time row per campaign and decision (granularity
+'total'). Buckets are cut in UTC, whatever the session time zone, to
+match the UTC windows decision_trend asks for. Reads then cost
+O(buckets in the window), however long the history.
+
+`ensure_rollups` installs the table, the trigger and a backfill of the
+existing rows in one transaction (and rebuilds an install older than
+ROLLUP_VERSION the same way), holding a lock that blocks inserts so
+no row is counted twice or missed. campaign_logs is treated as an
+append-only audit log: updates and deletes are not reflected. Minute and
+hour buckets older than MINUTE_RETENTION / HOUR_RETENTION are pruned when
+the dashboard starts.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+# Bump when ROLLUP_SELECT changes: an older install is rebuilt from campaign_logs
+ROLLUP_VERSION = "rollups-v2"
+MINUTE_RETENTION = "2 days"
+HOUR_RETENTION = "90 days"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaign_decision_rollups (
+  granularity text NOT NULL CHECK (granularity IN ('minute', 'hour', 'day', 'total')),
+  bucket timestamptz NOT NULL,
+  campaign_id text NOT NULL,
+  decision text NOT NULL,
+  n bigint NOT NULL,
+  PRIMARY KEY (granularity, bucket, campaign_id, decision)
+);
+"""
+
+# Rows of `source` grouped into every granularity's buckets
+ROLLUP_SELECT = """
+SELECT g.granularity,
+       CASE WHEN g.granularity = 'total' THEN timestamptz 'epoch'
+            ELSE date_trunc(g.granularity, l.created_at, 'UTC') END,
+       coalesce(CAST(l.campaign_id AS text), ''),
+       coalesce(CAST(l.decision AS text), ''),
+       count(*)
+FROM {source} l
+CROSS JOIN (VALUES ('minute'), ('hour'), ('day'), ('total')) AS g(granularity)
+WHERE l.created_at IS NOT NULL
+GROUP BY 1, 2, 3, 4
+"""
+
+TRIGGER = """
+CREATE OR REPLACE FUNCTION campaign_logs_rollup() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO campaign_decision_rollups (granularity, bucket, campaign_id, decision, n)
+  """ + ROLLUP_SELECT.format(source="new_rows") + """
+  ON CONFLICT (granularity, bucket, campaign_id, decision)
+  DO UPDATE SET n = campaign_decision_rollups.n + EXCLUDED.n;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS campaign_logs_rollup ON campaign_logs;
+CREATE TRIGGER campaign_logs_rollup
+AFTER INSERT ON campaign_logs
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION campaign_logs_rollup();
+COMMENT ON FUNCTION campaign_logs_rollup() IS '{version}';
+"""
+
+
+def ensure_rollups(engine) -> bool:
+    """Install the rollup table and trigger once; False until campaign_logs exists"""
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT to_regclass('campaign_logs')")).scalar() is None:
+            return False
+        installed = conn.execute(text(
+            "SELECT obj_description(tgfoid, 'pg_proc') FROM pg_trigger "
+            "WHERE tgname = 'campaign_logs_rollup' AND tgrelid = to_regclass('campaign_logs')"
+        )).scalar()
+        if installed != ROLLUP_VERSION:
+            # Block inserts until the trigger exists, so the backfill and the
+            # trigger together count every row exactly once
+            conn.exec_driver_sql("LOCK TABLE campaign_logs IN SHARE ROW EXCLUSIVE MODE")
+            conn.exec_driver_sql(SCHEMA)
+            conn.exec_driver_sql("TRUNCATE campaign_decision_rollups")
+            conn.exec_driver_sql(
+                "INSERT INTO campaign_decision_rollups (granularity, bucket, campaign_id, decision, n) "
+                + ROLLUP_SELECT.format(source="campaign_logs"))
+            conn.exec_driver_sql(TRIGGER.replace("{version}", ROLLUP_VERSION))
+            # The audit log query and incremental fetches read by created_at
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS idx_campaign_logs_created_at ON campaign_logs (created_at)")
+            print(f"Installed campaign_logs rollups {ROLLUP_VERSION} (backfilled existing rows)")
+        prune(conn)
+    return True
+
+
+def prune(conn):
+    conn.execute(text(
+        "DELETE FROM campaign_decision_rollups WHERE "
+        "(granularity = 'minute' AND bucket < now() - CAST(:minutes AS interval)) OR "
+        "(granularity = 'hour' AND bucket < now() - CAST(:hours AS interval))"
+    ), {"minutes": MINUTE_RETENTION, "hours": HOUR_RETENTION})
+
+
+# ==================== QUERIES ====================
+
+def decision_totals(conn, campaign_id: Optional[str] = None) -> Dict[str, int]:
+    """All-time count per decision, from the 'total' rows"""
+    sql = "SELECT decision, sum(n) FROM campaign_decision_rollups WHERE granularity = 'total'"
+    params = {}
+    if campaign_id is not None:
+        sql += " AND campaign_id = :campaign_id"
+        params["campaign_id"] = campaign_id
+    rows = conn.execute(text(sql + " GROUP BY decision"), params)
+    return {decision: int(n) for decision, n in rows}
+
+
+def decision_trend(conn, granularity: str, buckets: int, campaign_id: Optional[str] = None,
+                   now: Optional[datetime] = None) -> pd.DataFrame:
+    """Counts per bucket (rows) and decision (columns) for the last `buckets` buckets, gaps as 0"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"unknown granularity {granularity!r}; use one of {sorted(GRANULARITIES)}")
+    step = GRANULARITIES[granularity]
+    now = pd.Timestamp(now or datetime.now(timezone.utc))
+    now = now.tz_localize("UTC") if now.tzinfo is None else now
+    last = now.floor(pd.Timedelta(step))
+    first = last - (buckets - 1) * step
+
+    sql = ("SELECT bucket, decision, sum(n) AS n FROM campaign_decision_rollups "
+           "WHERE granularity = :granularity AND bucket >= :first")
+    params = {"granularity": granularity, "first": first.to_pydatetime()}
+    if campaign_id is not None:
+        sql += " AND campaign_id = :campaign_id"
+        params["campaign_id"] = campaign_id
+    rows = pd.read_sql(text(sql + " GROUP BY bucket, decision"), conn, params=params)
+
+    index = pd.date_range(first, last, freq=pd.Timedelta(step), name="bucket")
+    if rows.empty:
+        return pd.DataFrame(index=index)
+    rows["bucket"] = pd.to_datetime(rows["bucket"], utc=True)
+    trend = rows.pivot_table(index="bucket", columns="decision", values="n", aggfunc="sum")
+    return trend.reindex(index, fill_value=0).fillna(0).astype(int)
@@ -0,0 +1,254 @@
+"""
+Content-addressed pack of generated agents.
+
+Generated agents differ only in a few parameters (the generation time), so
+the pack stores each distinct template once and each agent as its
+parameters. Everything lives in agents/pack/:
+
+  store.jsonl  append-only records, one JSON object per line:
+               {"kind": "template", "hash": ..., "source": ...}
+               {"kind": "agent", "id": ..., "template": ..., "params": {...}, "name": ...}
+  index.json   template hash -> [byte offset, length] of its record in
+               store.jsonl, agent id -> [offset, length, template hash], and
+               legacy module name -> agent id
+
+Only store.jsonl is committed. The index is a local cache (gitignored)
+derived from it: loading reads the cache and indexes whatever the store
+gained since, so appending an agent writes one line and no index. A cache
+whose recorded end of store no longer matches is rebuilt from scratch.
+
+Templates are string.Template sources keyed by the SHA-1 of their text.
+An agent's id is the hash of its template hash and parameters, so adding
+the same agent twice is a no-op and ids never collide the way random
+numbers did. `source(id)` is one dict lookup, one seek and one line read,
+whatever the number of agents.
+
+`import_legacy` folds agents/multi_agent_NNNN.py files into the pack,
+checking that every file is reproduced byte for byte (a file that does not
+fit a known template becomes its own template).
+
+Usage: python scripts/agent_pack.py [agents] [--import-legacy [--remove]] [--show ID]
+"""
+from string import Template
+from typing import Dict, List, Optional, Tuple
+import argparse
+import hashlib
+import json
+import os
+import re
+
+PACK_DIR = "pack"
+GENERATED_AT = re.compile(r"Generated at (\S+) UTC")
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def agent_id(template_hash: str, params: dict) -> str:
+    return _hash(template_hash + json.dumps(params, sort_keys=True))[:16]
+
+
+class AgentPack:
+    def __init__(self, directory: str = "agents"):
+        self.path = os.path.join(directory, PACK_DIR)
+        self.store_path = os.path.join(self.path, "store.jsonl")
+        self.index_path = os.path.join(self.path, "index.json")
+        self._templates: Dict[str, Template] = {}
+        self.index = self._load_index()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.store_path)
+
+    # Index
+
+    def _tail_hash(self, end: int) -> str:
+        """Hash of the store's last bytes before `end`, to tell our store from a rewritten one"""
+        with open(self.store_path, "rb") as f:
+            f.seek(max(0, end - 4096))
+            return hashlib.sha1(f.read(end - f.tell())).hexdigest()
+
+    def _load_index(self) -> dict:
+        empty = {"templates": {}, "agents": {}, "names": {}, "store_bytes": 0}
+        try:
+            size = os.path.getsize(self.store_path)
+        except FileNotFoundError:
+            return empty
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if not 0 < index["store_bytes"] <= size or index["tail"] != self._tail_hash(index["store_bytes"]):
+                index = empty
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            index = empty
+        if index["store_bytes"] < size:
+            self._scan(index, size)
+            index["tail"] = self._tail_hash(index["store_bytes"])
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(index, f, sort_keys=True, separators=(",", ":"))
+            os.replace(tmp, self.index_path)
+        return index
+
+    def _scan(self, index: dict, size: int):
+        """Index the store's complete records from index["store_bytes"] on"""
+        with open(self.store_path, "rb") as f:
+            f.seek(index["store_bytes"])
+            offset = index["store_bytes"]
+            for line in f:
+                if not line.endswith(b"\n") or offset + len(line) > size:
+                    break  # a record still being written
+                self._index_record(index, json.loads(line), [offset, len(line)])
+                offset += len(line)
+        index["store_bytes"] = offset
+
+    @staticmethod
+    def _index_record(index: dict, record: dict, where: list):
+        if record["kind"] == "template":
+            index["templates"][record["hash"]] = where
+        else:
+            index["agents"][record["id"]] = where + [record["template"]]
+            if record.get("name"):
+                index["names"][record["name"]] = record["id"]
+
+    # Reading
+
+    def _record(self, where: list) -> dict:
+        offset, length = where[:2]
+        with open(self.store_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def ids(self) -> List[str]:
+        return list(self.index["agents"])
+
+    def templates(self) -> Dict[str, List[str]]:
+        """Template hash -> ids of the agents rendered from it, from the index alone"""
+        groups: Dict[str, List[str]] = {}
+        for agent, where in self.index["agents"].items():
+            groups.setdefault(where[2], []).append(agent)
+        return groups
+
+    def resolve(self, name_or_id: str) -> str:
+        """Agent id for an id or a legacy module name"""
+        if name_or_id in self.index["agents"]:
+            return name_or_id
+        return self.index["names"][name_or_id]
+
+    def agent(self, name_or_id: str) -> dict:
+        return self._record(self.index["agents"][self.resolve(name_or_id)])
+
+    def template(self, template_hash: str) -> Template:
+        template = self._templates.get(template_hash)
+        if template is None:
+            template = Template(self._record(self.index["templates"][template_hash])["source"])
+            self._templates[template_hash] = template
+        return template
+
+    def source(self, name_or_id: str) -> str:
+        """Python source of one agent"""
+        record = self.agent(name_or_id)
+        return self.template(record["template"]).substitute(record["params"])
+
+    # Writing
+
+    def _append(self, records: List[dict]):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.store_path, "ab") as f:
+            offset = f.tell()
+            for record in records:
+                line = json.dumps(record, sort_keys=True).encode() + b"\n"
+                f.write(line)
+                self._index_record(self.index, record, [offset, len(line)])
+                offset += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        # The cached index catches up with these records on the next load
+
+    def add(self, template_source: str, params: dict, name: Optional[str] = None) -> str:
+        """Store one agent; returns its id (an existing one if it was stored before)"""
+        return self.add_many([(template_source, params, name)])[0]
+
+    def add_many(self, agents: List[Tuple[str, dict, Optional[str]]]) -> List[str]:
+        pending, ids, seen = [], [], set()
+        for template_source, params, name in agents:
+            template_hash = _hash(template_source)
+            if template_hash not in self.index["templates"] and template_hash not in seen:
+                pending.append({"kind": "template", "hash": template_hash, "source": template_source})
+                seen.add(template_hash)
+            new_id = agent_id(template_hash, params)
+            ids.append(new_id)
+            if new_id in self.index["agents"] or new_id in seen:
+                continue
+            seen.add(new_id)
+            record = {"kind": "agent", "id": new_id, "template": template_hash, "params": params}
+            if name:
+                record["name"] = name
+            pending.append(record)
+        if pending:
+            self._append(pending)
+        return ids
+
+
+# ==================== LEGACY FILES ====================
+
+def legacy_template(source: str) -> Tuple[str, dict]:
+    """Template and parameters reproducing a generated module exactly"""
+    template = source.replace("$", "$$")
+    match = GENERATED_AT.search(source)
+    if not match:
+        return template, {}
+    template = template.replace(match.group(0), "Generated at ${generated_at} UTC", 1)
+    params = {"generated_at": match.group(1)}
+    if Template(template).substitute(params) != source:
+        return source.replace("$", "$$"), {}
+    return template, params
+
+
+def import_legacy(directory: str = "agents", remove: bool = False) -> dict:
+    """Pack every multi_agent_*.py under `directory`; with remove, delete the files once packed"""
+    pack = AgentPack(directory)
+    names = sorted(n for n in os.listdir(directory) if n.startswith("multi_agent_") and n.endswith(".py"))
+    agents, sources = [], []
+    for name in names:
+        with open(os.path.join(directory, name), newline="") as f:
+            source = f.read()
+        template, params = legacy_template(source)
+        agents.append((template, params, name[:-3]))
+        sources.append(source)
+    ids = pack.add_many(agents)
+
+    # Check the round trip before anything is deleted
+    reloaded = AgentPack(directory)
+    for name, source, new_id in zip(names, sources, ids):
+        if reloaded.source(new_id) != source:
+            raise ValueError(f"{name} does not round-trip through the pack")
+    if remove:
+        for name in names:
+            os.remove(os.path.join(directory, name))
+    return {"files": len(names), "agents": len(set(ids)), "templates": len(reloaded.index["templates"]),
+            "store_bytes": os.path.getsize(reloaded.store_path) if names else 0,
+            "files_bytes": sum(len(s.encode()) for s in sources)}
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", nargs="?", default="agents")
+    parser.add_argument("--import-legacy", action="store_true", help="pack the multi_agent_*.py files")
+    parser.add_argument("--remove", action="store_true", help="with --import-legacy, delete the packed files")
+    parser.add_argument("--show", metavar="ID", help="print one agent's source (id or legacy module name)")
+    args = parser.parse_args()
+
+    if args.import_legacy:
+        result = import_legacy(args.directory, args.remove)
+        print(f"Packed {result['files']} files as {result['agents']} agents over {result['templates']} "
+              f"template(s): {result['files_bytes']} -> {result['store_bytes']} bytes")
+    pack = AgentPack(args.directory)
+    if args.show:
+        print(pack.source(args.show), end="")
+    elif not args.import_legacy:
+        print(f"{len(pack.ids())} agents, {len(pack.index['templates'])} template(s) in {pack.path}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,299 @@
+"""
+Agent registry: discover generated agents without importing them all.
+
+scripts/generate_agents.py produces thousands of agents that differ only
+in their "Generated at" docstring, as agents/multi_agent_NNNN.py modules
+(older ones) or in the agent pack (agents/pack, see agent_pack.py).
+Importing them all costs one module execution and one set of
+Agent/PlannerAgent/ExecutorAgent class objects per agent. The registry
+instead:
+
+- scans each file with `ast` (no execution) into a manifest entry: module
+  id, content hash, classes provided and a hash of the class definitions
+  (docstrings and the `__main__` block excluded);
+- caches the manifest in agents/.registry-cache.json, keyed by file size
+  and mtime, so a warm start stats the files and re-parses only new ones;
+- lists packed agents from the pack index and scans one agent per
+  template, since a template's parameters only fill in its docstring;
+- groups modules by definition hash, so identical agents share one
+  implementation;
+- imports a definition on first `get()`, once for all the modules that
+  share it.
+
+`--report` measures startup time and peak RSS of an eager import of every
+module against a cold and a warm registry, each in a fresh interpreter.
+
+Usage: python scripts/agent_registry.py [agents] [--report] [--json registry.json]
+"""
+from typing import Dict, List, Optional
+import argparse
+import ast
+import hashlib
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+import types
+
+from agent_pack import AgentPack
+
+CACHE_NAME = ".registry-cache.json"
+CACHE_VERSION = 1
+
+
+# ==================== SCANNING ====================
+
+def _definitions(tree: ast.Module) -> List[ast.stmt]:
+    """Statements that define what the module provides (not docstrings or the __main__ block)"""
+    kept = []
+    for node in tree.body:
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            continue
+        if isinstance(node, ast.If) and "__main__" in ast.dump(node.test):
+            continue
+        kept.append(node)
+    return kept
+
+
+def scan_source(source: bytes, module_id: str, filename: str = "<agent>") -> dict:
+    """Manifest entry of one agent, from its source alone"""
+    definitions = _definitions(ast.parse(source, filename=filename))
+    return {
+        "module": module_id,
+        "content_hash": hashlib.sha1(source).hexdigest(),
+        "definition_hash": hashlib.sha1(
+            "\n".join(ast.dump(node) for node in definitions).encode()).hexdigest(),
+        "classes": [node.name for node in definitions if isinstance(node, ast.ClassDef)],
+    }
+
+
+def scan_module(path: str) -> dict:
+    with open(path, "rb") as f:
+        source = f.read()
+    st = os.stat(path)
+    entry = scan_source(source, os.path.splitext(os.path.basename(path))[0], path)
+    entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+    return entry
+
+
+# ==================== REGISTRY ====================
+
+class AgentRegistry:
+    def __init__(self, directory: str = "agents", cache_path: Optional[str] = None):
+        self.directory = directory
+        self.cache_path = cache_path or os.path.join(directory, CACHE_NAME)
+        self.manifest: Dict[str, dict] = {}  # module id (file name or pack id) -> entry
+        self.pack = AgentPack(directory)
+        self._implementations: Dict[str, object] = {}  # definition hash -> imported module
+        self._stats = {"scanned": 0, "cached": 0, "imports": 0}
+        self.refresh()
+
+    def _load_cache(self) -> Dict[str, dict]:
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        return cache.get("modules", {}) if cache.get("version") == CACHE_VERSION else {}
+
+    def refresh(self):
+        """Bring the manifest up to date with the directory; only new or changed files are parsed"""
+        cached = self._load_cache()
+        manifest = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".py") or not entry.is_file():
+                    continue
+                module_id = entry.name[:-3]
+                st = entry.stat()
+                known = cached.get(module_id)
+                if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+                    manifest[module_id] = known
+                    self._stats["cached"] += 1
+                    continue
+                try:
+                    manifest[module_id] = scan_module(entry.path)
+                except (SyntaxError, ValueError) as exc:
+                    print(f"Warning: skipping agent module {entry.name} ({exc})")
+                    continue
+                self._stats["scanned"] += 1
+        if manifest != cached:
+            self._save_cache(manifest)
+        self.manifest = dict(sorted(manifest.items()))
+        self.manifest.update(self._pack_entries())
+
+    def _pack_entries(self) -> Dict[str, dict]:
+        """Entries of packed agents: the index lists them, one scan per template describes them"""
+        self.pack = AgentPack(self.directory)
+        entries = {}
+        for template, ids in self.pack.templates().items():
+            scanned = scan_source(self.pack.source(ids[0]).encode(), ids[0])
+            self._stats["scanned"] += 1
+            for agent in ids:
+                entries[agent] = {"module": agent, "pack": True, "template": template,
+                                  "content_hash": agent, "definition_hash": scanned["definition_hash"],
+                                  "classes": scanned["classes"]}
+        return entries
+
+    def _save_cache(self, modules: Dict[str, dict]):
+        tmp = self.cache_path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"version": CACHE_VERSION, "modules": modules}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError as exc:
+            print(f"Warning: could not write agent registry cache {self.cache_path} ({exc})")
+
+    # Lookups (no imports)
+
+    def modules(self) -> List[str]:
+        return list(self.manifest)
+
+    def entry(self, module_id: str) -> dict:
+        """Manifest entry by module id, pack id or the legacy name of a packed module"""
+        entry = self.manifest.get(module_id)
+        if entry is None:
+            entry = self.manifest[self.pack.index["names"].get(module_id, module_id)]
+        return entry
+
+    def classes(self, module_id: str) -> List[str]:
+        return self.entry(module_id)["classes"]
+
+    def definitions(self) -> Dict[str, List[str]]:
+        """Definition hash -> ids of the modules that provide exactly those definitions"""
+        groups: Dict[str, List[str]] = {}
+        for module_id, entry in self.manifest.items():
+            groups.setdefault(entry["definition_hash"], []).append(module_id)
+        return groups
+
+    # Lazy loading
+
+    def load(self, module_id: str):
+        """The module implementing `module_id`'s definitions, imported once per distinct definition"""
+        definition = self.entry(module_id)["definition_hash"]
+        module = self._implementations.get(definition)
+        if module is None:
+            # Any module with this definition will do; use the first so the choice is stable
+            source_id = self.definitions()[definition][0]
+            if self.manifest[source_id].get("pack"):
+                module = types.ModuleType(f"agents.{source_id}")
+                exec(compile(self.pack.source(source_id), f"<agent {source_id}>", "exec"), module.__dict__)
+            else:
+                path = os.path.join(self.directory, source_id + ".py")
+                spec = importlib.util.spec_from_file_location(f"agents.{source_id}", path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+            self._implementations[definition] = module
+            self._stats["imports"] += 1
+        return module
+
+    def get(self, module_id: str, class_name: str):
+        if class_name not in self.classes(module_id):
+            raise KeyError(f"{module_id} does not define {class_name}")
+        return getattr(self.load(module_id), class_name)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "modules": len(self.manifest),
+            "definitions": len(self.definitions()),
+            "classes": sum(len(e["classes"]) for e in self.manifest.values()),
+        }
+
+
+# ==================== STARTUP REPORT ====================
+
+MEASURE = """
+import json, resource, sys, time
+sys.path.insert(0, {scripts!r})
+t0 = time.perf_counter()
+{body}
+print("RESULT " + json.dumps({{"seconds": time.perf_counter() - t0,
+      "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+EAGER = """
+import importlib.util, os, types
+from agent_pack import AgentPack
+modules = []
+for name in sorted(os.listdir({directory!r})):
+    if name.endswith(".py"):
+        spec = importlib.util.spec_from_file_location("agents." + name[:-3], os.path.join({directory!r}, name))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        modules.append(module)
+pack = AgentPack({directory!r})
+for agent in pack.ids():
+    module = types.ModuleType("agents." + agent)
+    exec(compile(pack.source(agent), agent, "exec"), module.__dict__)
+    modules.append(module)
+"""
+
+LAZY = """
+from agent_registry import AgentRegistry
+registry = AgentRegistry({directory!r}, {cache!r})
+registry.get(registry.modules()[-1], "PlannerAgent")("Planner").plan("task")
+"""
+
+BASELINE = """
+import agent_registry
+"""
+
+
+def measure(body: str) -> dict:
+    code = MEASURE.format(scripts=os.path.dirname(os.path.abspath(__file__)), body=body)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                          env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+    if proc.returncode != 0:
+        sys.exit(f"child failed:\n{proc.stderr}")
+    line = next(l for l in proc.stdout.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def startup_report(directory: str) -> dict:
+    directory = os.path.abspath(directory)
+    cache = os.path.join(directory, CACHE_NAME)
+    cold_cache = cache + ".cold"
+    baseline = measure(BASELINE)
+    report = {"eager import": measure(EAGER.format(directory=directory)),
+              "registry (cold)": measure(LAZY.format(directory=directory, cache=cold_cache))}
+    if os.path.exists(cold_cache):  # only written when there are module files
+        os.remove(cold_cache)
+    measure(LAZY.format(directory=directory, cache=cache))  # make sure the real cache is current
+    report["registry (warm)"] = measure(LAZY.format(directory=directory, cache=cache))
+    for result in report.values():
+        result["rss_over_baseline_kb"] = result["peak_rss_kb"] - baseline["peak_rss_kb"]
+    return report
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", nargs="?", default="agents")
+    parser.add_argument("--report", action="store_true", help="compare startup with an eager import")
+    parser.add_argument("--json", help="write the stats (and report) to this file")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    registry = AgentRegistry(args.directory)
+    elapsed = time.perf_counter() - t0
+    stats = registry.stats()
+    print(f"{stats['modules']} agent modules, {stats['definitions']} distinct definitions, "
+          f"{stats['classes']} classes ({stats['scanned']} scanned, {stats['cached']} from cache) "
+          f"in {elapsed * 1000:.1f}ms")
+    output = {"stats": stats}
+
+    if args.report:
+        output["startup"] = startup_report(args.directory)
+        print(f"\n  {'':<18} {'seconds':>9} {'peak RSS (MB)':>14} {'over baseline (MB)':>19}")
+        for label, result in output["startup"].items():
+            print(f"  {label:<18} {result['seconds']:>9.3f} {result['peak_rss_kb'] / 1024:>14.1f} "
+                  f"{result['rss_over_baseline_kb'] / 1024:>19.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,57 @@
+"""
+Check that the modules shared by brain/ and backend/brain/ are identical.
+
+Each service is its own Docker build context (and is mounted as /app in
+docker-compose), so modules both of them use are copied into each
+directory. This compares every pair byte for byte and prints a diff of the
+ones that drifted; `--sync` copies the brain/ version over the backend one.
+
+Usage: python scripts/check_shared_modules.py [--sync]
+"""
+from typing import List
+import argparse
+import difflib
+import os
+import shutil
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COPIES = ("brain", os.path.join("backend", "brain"))
+SHARED = ("lock_manager.py", "telemetry.py")
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def drifted(root: str = ROOT) -> List[str]:
+    """Names of the shared modules whose copies differ"""
+    source, copy = (os.path.join(root, d) for d in COPIES)
+    return [name for name in SHARED
+            if read(os.path.join(source, name)) != read(os.path.join(copy, name))]
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sync", action="store_true", help=f"copy {COPIES[0]}/ over {COPIES[1]}/")
+    args = parser.parse_args()
+
+    names = drifted()
+    for name in names:
+        paths = [os.path.join(d, name) for d in COPIES]
+        if args.sync:
+            shutil.copyfile(os.path.join(ROOT, paths[0]), os.path.join(ROOT, paths[1]))
+            print(f"Copied {paths[0]} to {paths[1]}")
+            continue
+        lines = [read(os.path.join(ROOT, p)).decode().splitlines(keepends=True) for p in paths]
+        sys.stdout.writelines(difflib.unified_diff(*lines, *paths))
+    if names and not args.sync:
+        sys.exit(f"{len(names)} shared module(s) differ: {', '.join(names)} "
+                 f"(edit both, or run with --sync)")
+    if not names:
+        print(f"{len(SHARED)} shared modules identical in {' and '.join(COPIES)}")
+
+
+if __name__ == "__main__":
+    run()
@@ -1,17 +1,13 @@
 from datetime import datetime
-import os
-import random
 
-os.makedirs("agents", exist_ok=True)
+from agent_pack import AgentPack
 
 now = datetime.utcnow().isoformat()
-agent_id = random.randint(1000, 9999)
 
-filename = f"agents/multi_agent_{agent_id}.py"
-
-content = f'''"""
+# string.Template source: the pack stores it once and each agent as its parameters
+TEMPLATE = '''"""
 Auto-generated Multi-Agent Example
-Generated at {now} UTC
+Generated at ${generated_at} UTC
 """
 
 class Agent:
@@ -19,17 +15,17 @@ class Agent:
         self.name = name
 
     def act(self, message):
-        return f"{{self.name}} received: {{message}}"
+        return f"{self.name} received: {message}"
 
 
 class PlannerAgent(Agent):
     def plan(self, task):
-        return f"Planning steps for: {{task}}"
+        return f"Planning steps for: {task}"
 
 
 class ExecutorAgent(Agent):
     def execute(self, plan):
-        return f"Executing plan: {{plan}}"
+        return f"Executing plan: {plan}"
 
 
 if __name__ == "__main__":
@@ -43,7 +39,6 @@ if __name__ == "__main__":
     print(result)
 '''
 
-with open(filename, "w") as f:
-    f.write(content)
+agent_id = AgentPack("agents").add(TEMPLATE, {"generated_at": now})
 
-print(f"Generated {filename}")
+print(f"Generated agent {agent_id} in agents/pack")
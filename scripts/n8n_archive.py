@@ -0,0 +1,311 @@
+"""
+Columnar archive of rotated n8n event logs, queried through memory maps.
+
+`compact` turns every rotated segment (n8nEventLog-1/-2/-3.log) that is
+not archived yet into one directory of NumPy columns, one row per event:
+
+  ts.npy             int64  epoch milliseconds, rows sorted by it
+  event.npy          int16  code into dictionaries["event"]
+  execution.npy      int32  code into dictionaries["execution"] (-1: none)
+  workflow.npy       int32  code into dictionaries["workflow"] (workflow ids)
+  node.npy           int32  code into dictionaries["node"] (node names)
+  node_type.npy      int16  code into dictionaries["node_type"]
+  error_node.npy     int32  lastNodeExecuted of a failed workflow, as a node code
+  exec_rows.npy      int32  row numbers grouped by execution code ...
+  exec_offsets.npy   int64  ... execution k's rows are exec_rows[off[k]:off[k+1]]
+  dictionaries.json         the dictionaries, plus workflow id -> name
+
+Delivery confirmations ($$EventMessageConfirm) are dropped, and audit
+events keep only their name and workflow (no user fields). Segments are
+named by the hash of their first line, so the same events are archived once
+however often n8n renames the file; archive/manifest.json lists each
+segment's time range for pruning.
+
+Queries open columns with np.load(mmap_mode="r"): a time range is a
+binary search of ts.npy and an execution lookup a slice of the sidecar
+index, so only the touched pages of the columns a query needs are read.
+
+Usage: python scripts/n8n_archive.py compact [n8n_data] [--archive n8n_archive]
+       python scripts/n8n_archive.py events [--start ISO] [--end ISO]
+       python scripts/n8n_archive.py execution <executionId>
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from n8n_ingest import file_head
+from n8n_logs import log_files, parse_ts, read_events
+
+DICTIONARIES = ("event", "execution", "workflow", "node", "node_type")
+
+# column -> (dtype, dictionary it codes into; None for raw values)
+COLUMNS = {
+    "ts": (np.int64, None),
+    "event": (np.int16, "event"),
+    "execution": (np.int32, "execution"),
+    "workflow": (np.int32, "workflow"),
+    "node": (np.int32, "node"),
+    "node_type": (np.int16, "node_type"),
+    "error_node": (np.int32, "node"),
+}
+
+# column -> payload field it is read from
+FIELDS = {
+    "execution": "executionId",
+    "workflow": "workflowId",
+    "node": "nodeName",
+    "node_type": "nodeType",
+    "error_node": "lastNodeExecuted",
+}
+
+
+# ==================== WRITING ====================
+
+class _Encoder:
+    """Dictionary encoding: value -> dense code, in order of first appearance"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+
+    def __call__(self, value) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.codes)
+        return code
+
+    def values(self) -> List[str]:
+        return list(self.codes)
+
+
+def encode_segment(path: str) -> dict:
+    """Columns (as arrays), dictionaries and workflow names of one log file"""
+    encoders = {name: _Encoder() for name in DICTIONARIES}
+    workflow_names = {}
+    rows = {column: [] for column in COLUMNS}
+    for event in read_events([path]):
+        name = event.get("eventName")
+        if not name or "ts" not in event:
+            continue  # delivery confirmations
+        payload = event.get("payload") or {}
+        rows["ts"].append(round(parse_ts(event["ts"]) * 1000))
+        rows["event"].append(encoders["event"](name))
+        for column, field in FIELDS.items():
+            rows[column].append(encoders[COLUMNS[column][1]](payload.get(field)))
+        if payload.get("workflowId") and payload.get("workflowName"):
+            workflow_names[payload["workflowId"]] = payload["workflowName"]
+
+    columns = {column: np.asarray(values, dtype=COLUMNS[column][0]) for column, values in rows.items()}
+    order = np.argsort(columns["ts"], kind="stable")
+    columns = {column: values[order] for column, values in columns.items()}
+
+    # Sidecar index: rows grouped by execution (stable, so each group stays in time order)
+    executions = len(encoders["execution"].codes)
+    with_execution = np.flatnonzero(columns["execution"] >= 0)
+    grouped = with_execution[np.argsort(columns["execution"][with_execution], kind="stable")]
+    counts = np.bincount(columns["execution"][with_execution], minlength=executions)
+    columns["exec_rows"] = grouped.astype(np.int32)
+    columns["exec_offsets"] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    dictionaries = {name: encoder.values() for name, encoder in encoders.items()}
+    dictionaries["workflow_names"] = workflow_names
+    return {"columns": columns, "dictionaries": dictionaries}
+
+
+def _write_json(path: str, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def compact(log_dir: str, archive_dir: str) -> List[dict]:
+    """Archive the rotated segments not archived yet; returns their manifest entries"""
+    os.makedirs(archive_dir, exist_ok=True)
+    manifest = load_manifest(archive_dir)
+    archived = {entry["segment"] for entry in manifest["segments"]}
+    added = []
+    # The live file still grows; it is archived once n8n rotates it to -1
+    paths = [p for p in log_files(log_dir) if os.path.basename(p) != "n8nEventLog.log"]
+    for path in paths:
+        head = file_head(path)
+        if head is None or head in archived:
+            continue
+        t0 = time.perf_counter()
+        encoded = encode_segment(path)
+        ts = encoded["columns"]["ts"]
+        tmp = os.path.join(archive_dir, f".{head}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for column, values in encoded["columns"].items():
+            np.save(os.path.join(tmp, f"{column}.npy"), values)
+        _write_json(os.path.join(tmp, "dictionaries.json"), encoded["dictionaries"])
+        os.replace(tmp, os.path.join(archive_dir, head))
+        entry = {
+            "segment": head,
+            "source": os.path.basename(path),
+            "source_bytes": os.path.getsize(path),
+            "rows": int(len(ts)),
+            "ts_min": int(ts[0]) if len(ts) else None,
+            "ts_max": int(ts[-1]) if len(ts) else None,
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+        manifest["segments"].append(entry)
+        archived.add(head)
+        added.append(entry)
+    manifest["segments"].sort(key=lambda e: e["ts_min"] if e["ts_min"] is not None else 0)
+    _write_json(os.path.join(archive_dir, "manifest.json"), manifest)
+    return added
+
+
+def load_manifest(archive_dir: str) -> dict:
+    try:
+        with open(os.path.join(archive_dir, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"segments": []}
+
+
+# ==================== READING ====================
+
+class Segment:
+    """One archived segment; columns are memory-mapped on first use"""
+
+    def __init__(self, path: str, entry: dict):
+        self.path = path
+        self.entry = entry
+        self._columns = {}
+        self._dictionaries = None
+        self._execution_codes = None
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    @property
+    def dictionaries(self) -> dict:
+        if self._dictionaries is None:
+            with open(os.path.join(self.path, "dictionaries.json")) as f:
+                self._dictionaries = json.load(f)
+        return self._dictionaries
+
+    def decode(self, column: str, codes: np.ndarray) -> np.ndarray:
+        """Codes to values; -1 becomes None"""
+        values = np.array(self.dictionaries[COLUMNS[column][1]] + [None], dtype=object)
+        return values[np.asarray(codes)]
+
+    def time_rows(self, start_ms: Optional[int], end_ms: Optional[int]) -> slice:
+        ts = self.column("ts")
+        lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side="left"))
+        hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, side="left"))
+        return slice(lo, hi)
+
+    def execution_rows(self, execution_id: str) -> Optional[np.ndarray]:
+        if self._execution_codes is None:
+            self._execution_codes = {value: code for code, value in enumerate(self.dictionaries["execution"])}
+        code = self._execution_codes.get(str(execution_id))
+        if code is None:
+            return None
+        offsets = self.column("exec_offsets")
+        return self.column("exec_rows")[offsets[code]:offsets[code + 1]]
+
+
+class Archive:
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+        self.segments = [Segment(os.path.join(archive_dir, e["segment"]), e)
+                         for e in load_manifest(archive_dir)["segments"]]
+
+    def between(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                columns=("ts", "event")) -> Iterator[dict]:
+        """Per overlapping segment: {"segment", column: values in [start, end)} for `columns`"""
+        for segment in self.segments:
+            entry = segment.entry
+            if entry["rows"] == 0 or (start_ms is not None and entry["ts_max"] < start_ms) \
+                    or (end_ms is not None and entry["ts_min"] >= end_ms):
+                continue  # skipped from the manifest alone
+            rows = segment.time_rows(start_ms, end_ms)
+            yield {"segment": segment, **{c: segment.column(c)[rows] for c in columns}}
+
+    def event_counts(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for part in self.between(start_ms, end_ms, columns=("event",)):
+            codes = np.bincount(part["event"], minlength=len(part["segment"].dictionaries["event"]))
+            for name, n in zip(part["segment"].dictionaries["event"], codes):
+                if n:
+                    counts[name] = counts.get(name, 0) + int(n)
+        return counts
+
+    def execution(self, execution_id: str) -> List[dict]:
+        """Every archived event of one execution, in time order"""
+        events = []
+        for segment in self.segments:
+            rows = segment.execution_rows(execution_id)
+            if rows is None or not len(rows):
+                continue
+            decoded = {c: segment.decode(c, segment.column(c)[rows])
+                       for c in ("event", "workflow", "node", "node_type", "error_node")}
+            names = segment.dictionaries["workflow_names"]
+            for i, ms in enumerate(segment.column("ts")[rows]):
+                event = {"ts": int(ms), **{c: values[i] for c, values in decoded.items()}}
+                event["workflow_name"] = names.get(event["workflow"])
+                events.append(event)
+        return sorted(events, key=lambda e: e["ts"])
+
+
+# ==================== CLI ====================
+
+def _ms(value: Optional[str]) -> Optional[int]:
+    return None if value is None else round(parse_ts(value) * 1000)
+
+
+def _iso(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec="milliseconds")
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--archive", default="n8n_archive", help="archive directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact_cmd = commands.add_parser("compact", help="archive rotated segments")
+    compact_cmd.add_argument("path", nargs="?", default="n8n_data")
+    events_cmd = commands.add_parser("events", help="event counts in a time range")
+    events_cmd.add_argument("--start", help="ISO timestamp (inclusive)")
+    events_cmd.add_argument("--end", help="ISO timestamp (exclusive)")
+    execution_cmd = commands.add_parser("execution", help="timeline of one execution")
+    execution_cmd.add_argument("execution_id")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        for entry in compact(args.path, args.archive):
+            size = sum(os.path.getsize(os.path.join(args.archive, entry["segment"], name))
+                       for name in os.listdir(os.path.join(args.archive, entry["segment"])))
+            print(f"{entry['source']}: {entry['rows']} events, {entry['source_bytes']} -> {size} bytes "
+                  f"in {entry['seconds']}s ({entry['segment'][:12]})")
+    elif args.command == "events":
+        counts = Archive(args.archive).event_counts(_ms(args.start), _ms(args.end))
+        for name, n in sorted(counts.items(), key=lambda kv: -kv[1]):
+            print(f"  {name:<40} {n:>8}")
+    elif args.command == "execution":
+        events = Archive(args.archive).execution(args.execution_id)
+        if not events:
+            parser.exit(1, f"execution {args.execution_id} is not archived\n")
+        first = events[0]["ts"]
+        for event in events:
+            detail = event["node"] or event["workflow_name"] or event["workflow"] or ""
+            if event["error_node"]:
+                detail += f" (failed at {event['error_node']})"
+            print(f"  {_iso(event['ts'])} +{event['ts'] - first:>7}ms  {event['event']:<24} {detail}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,367 @@
+"""
+Follow the n8n event log and ingest execution metrics into the backend.
+
+Tails n8n_data/n8nEventLog.log, pairs workflow and node events the same
+way n8n_logs.py does and, for every execution that ends, POSTs Metric
+records to the backend's /metrics:batch:
+
+  n8n_execution_ms     value = execution duration; metadata carries the
+                       workflow, execution_id, status and ms per node type
+  n8n_execution_failed value = 1 per failed execution; metadata carries the
+                       workflow, execution_id, last node and error node type
+
+Progress is a byte offset into one log file, identified by device, inode
+and a hash of its first line, saved (atomically) to --checkpoint after
+every accepted batch together with the executions still open. A restart
+seeks straight back to that offset. n8n rotates by renaming the live file
+to -1 (and -1 to -2, ...), so after a rotation the follower finds its file
+by inode among the rotated segments, finishes it and moves on to the newer
+ones. Only complete lines are consumed; a line n8n is still writing is
+read again on the next poll.
+
+Delivery is at-least-once: a crash between a POST and the checkpoint
+write resends that batch (execution_id is in every record's metadata).
+Connection errors and 5xx (and 408/429) responses are retried on the next
+poll; any other 4xx would fail the same way again, so that batch is
+appended to --dead-letter (one JSON line with the status, the error and
+the records) and the follower moves on.
+
+Usage: python scripts/n8n_ingest.py [n8n_data] [--api http://localhost:8000] [--once] [--dry-run]
+                                   [--dead-letter rejected.jsonl]
+"""
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from n8n_logs import log_files, parse_ts
+
+# Client errors worth retrying: the request may succeed unchanged later
+RETRY_STATUSES = (408, 429)
+
+HEAD_BYTES = 4096  # prefix of a file's first line that identifies it
+
+
+def file_head(path: str) -> Optional[str]:
+    """Fingerprint of a file's first line, or None while it has no complete line"""
+    with open(path, "rb") as f:
+        line = f.readline(HEAD_BYTES)
+    if not line.endswith(b"\n") and len(line) < HEAD_BYTES:
+        return None
+    return hashlib.sha1(line).hexdigest()
+
+
+# ==================== EXECUTIONS ====================
+
+class ExecutionTracker:
+    """Pairs events into finished executions; its state round-trips through JSON"""
+
+    def __init__(self, max_open: int = 10000, state: Optional[dict] = None):
+        self.max_open = max_open
+        # executionId -> {"workflow", "started", "nodes": {nodeName: [start ts]}, "node_ms": {type: ms}}
+        self.executions: "OrderedDict[str, dict]" = OrderedDict((state or {}).get("executions", {}))
+        self.evicted = (state or {}).get("evicted", 0)
+
+    def state(self) -> dict:
+        return {"executions": self.executions, "evicted": self.evicted}
+
+    def _execution(self, execution_id: str, workflow: str) -> dict:
+        execution = self.executions.get(execution_id)
+        if execution is None:
+            execution = self.executions[execution_id] = {
+                "workflow": workflow, "started": None, "nodes": {}, "node_ms": {}}
+            if len(self.executions) > self.max_open:
+                self.executions.popitem(last=False)
+                self.evicted += 1
+        return execution
+
+    def feed(self, event: dict) -> List[dict]:
+        """Metric records (MetricCreate bodies) for the execution this event ends, if any"""
+        name = event.get("eventName") or ""
+        payload = event.get("payload") or {}
+        execution_id = payload.get("executionId")
+        if not name.startswith(("n8n.node.", "n8n.workflow.")) or execution_id is None or "ts" not in event:
+            return []
+        ts = parse_ts(event["ts"])
+        workflow = payload.get("workflowName") or payload.get("workflowId") or "?"
+
+        if name == "n8n.node.started":
+            nodes = self._execution(execution_id, workflow)["nodes"]
+            nodes.setdefault(payload.get("nodeName") or "?", []).append(ts)
+        elif name == "n8n.node.finished":
+            execution = self.executions.get(execution_id)
+            starts = execution["nodes"].get(payload.get("nodeName") or "?") if execution else None
+            if starts:
+                node_type = payload.get("nodeType") or "?"
+                node_ms = execution["node_ms"]
+                node_ms[node_type] = node_ms.get(node_type, 0.0) + (ts - starts.pop(0)) * 1000
+        elif name == "n8n.workflow.started":
+            self._execution(execution_id, workflow)["started"] = ts
+        elif name in ("n8n.workflow.success", "n8n.workflow.failed"):
+            return self._finish(execution_id, workflow, name.rsplit(".", 1)[1], ts, payload)
+        return []
+
+    def _finish(self, execution_id: str, workflow: str, status: str, ts: float, payload: dict) -> List[dict]:
+        execution = self.executions.pop(execution_id, None) or {"started": None, "node_ms": {}}
+        finished_at = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+        records = []
+        if execution["started"] is not None:
+            records.append({
+                "metric_type": "n8n_execution_ms",
+                "value": round((ts - execution["started"]) * 1000, 1),
+                "metadata": {
+                    "workflow": workflow,
+                    "execution_id": execution_id,
+                    "status": status,
+                    "finished_at": finished_at,
+                    "node_ms": {t: round(ms, 1) for t, ms in execution["node_ms"].items()},
+                },
+            })
+        if status == "failed":
+            records.append({
+                "metric_type": "n8n_execution_failed",
+                "value": 1,
+                "metadata": {
+                    "workflow": workflow,
+                    "execution_id": execution_id,
+                    "finished_at": finished_at,
+                    "last_node": payload.get("lastNodeExecuted"),
+                    "error_node_type": payload.get("errorNodeType"),
+                },
+            })
+        return records
+
+
+# ==================== FOLLOWER ====================
+
+def post_metrics(api_url: str, timeout: float = 10.0) -> Callable[[List[dict]], None]:
+    """Sink that sends records to /metrics:batch; raises on transport or server errors"""
+    url = api_url.rstrip("/") + "/metrics:batch"
+
+    def send(records: List[dict]):
+        request = urllib.request.Request(url, data=json.dumps(records).encode(), method="POST",
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read() or b"{}")
+        if result.get("failed"):
+            # 207: the rejected records would be rejected again, so don't retry them
+            print(f"Warning: backend rejected {result['failed']} of {len(records)} n8n metrics")
+
+    return send
+
+
+class LogFollower:
+    """Reads new complete lines across rotations and ships their records in batches"""
+
+    def __init__(self, directory: str, checkpoint_path: Optional[str], sink: Callable[[List[dict]], None],
+                 batch_size: int = 500, max_open: int = 10000, from_end: bool = False,
+                 dead_letter_path: Optional[str] = None):
+        self.directory = directory
+        self.checkpoint_path = checkpoint_path
+        self.dead_letter_path = dead_letter_path
+        self.sink = sink
+        self.batch_size = batch_size
+        self.pending: List[dict] = []
+        self.stats = {"lines": 0, "bad_lines": 0, "records": 0, "batches": 0, "rotations": 0,
+                      "lost_files": 0, "send_errors": 0, "dead_lettered": 0}
+        checkpoint = self._load()
+        self.position = checkpoint.get("position")  # {"dev", "ino", "head", "offset"}
+        self.tracker = ExecutionTracker(max_open, checkpoint.get("tracker"))
+        if self.position is None and from_end:
+            self.position = self._end_of_live_file()
+
+    # Checkpoint
+
+    def _load(self) -> dict:
+        if self.checkpoint_path is None:
+            return {}
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as exc:
+            print(f"Warning: ignoring unreadable checkpoint {self.checkpoint_path} ({exc})")
+            return {}
+
+    def save(self):
+        if self.checkpoint_path is None:
+            return
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"position": self.position, "tracker": self.tracker.state(),
+                       "saved_at": datetime.now(timezone.utc).isoformat()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+
+    # Locating the next bytes to read
+
+    def _segments(self) -> List[Tuple[str, os.stat_result]]:
+        segments = []
+        for path in log_files(self.directory):
+            try:
+                segments.append((path, os.stat(path)))
+            except FileNotFoundError:
+                pass  # rotated away between listing and stat
+        return segments
+
+    def _identity(self, path: str, st: os.stat_result, offset: int) -> dict:
+        return {"dev": st.st_dev, "ino": st.st_ino, "head": file_head(path), "offset": offset}
+
+    def _end_of_live_file(self) -> Optional[dict]:
+        segments = self._segments()
+        if not segments:
+            return None
+        path, st = segments[-1]
+        return self._identity(path, st, st.st_size)
+
+    def _plan(self) -> List[Tuple[str, int]]:
+        """(path, start offset) of every segment with unread bytes, oldest first"""
+        segments = self._segments()
+        pos = self.position
+        if pos is None:
+            return [(path, 0) for path, _ in segments]
+        for index, (path, st) in enumerate(segments):
+            if (st.st_dev, st.st_ino) != (pos["dev"], pos["ino"]):
+                continue
+            if pos["head"] is not None and file_head(path) != pos["head"]:
+                continue  # inode reused by a different file
+            self.stats["rotations"] += len(segments) - 1 - index
+            offset = pos["offset"] if st.st_size >= pos["offset"] else 0  # truncated in place
+            return [(path, offset)] + [(p, 0) for p, _ in segments[index + 1:]]
+        # Our file rotated out past the oldest segment (or was deleted): all that's left is newer
+        self.stats["lost_files"] += 1
+        print(f"Warning: {self.directory} no longer has the checkpointed n8n log; "
+              f"reading the remaining segments from the start")
+        return [(path, 0) for path, _ in segments]
+
+    # Reading and shipping
+
+    def poll(self) -> int:
+        """Ingest everything appended since the last poll; returns records sent"""
+        sent = self._flush()
+        if self.pending:
+            return sent  # backend still down; don't read further ahead
+        for path, offset in self._plan():
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                break  # rotated while planning; the next poll finds it by inode
+            with f:
+                st = os.fstat(f.fileno())
+                self.position = self._identity(path, st, offset)
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # n8n is mid-write; re-read it next poll
+                    self.position["offset"] += len(line)
+                    self._feed_line(line)
+                    if len(self.pending) >= self.batch_size:
+                        sent += self._flush()
+                        if self.pending:
+                            return sent
+        sent += self._flush()
+        return sent
+
+    def _feed_line(self, line: bytes):
+        if not line.strip():
+            return
+        self.stats["lines"] += 1
+        try:
+            event = json.loads(line)
+        except ValueError:
+            self.stats["bad_lines"] += 1
+            return
+        if isinstance(event, dict):
+            self.pending.extend(self.tracker.feed(event))
+
+    def _flush(self) -> int:
+        """Send pending records, then checkpoint; keeps them pending on a retryable failure"""
+        count = len(self.pending)
+        if count:
+            try:
+                self.sink(self.pending)
+            except urllib.error.HTTPError as exc:
+                self.stats["send_errors"] += 1
+                if exc.code >= 500 or exc.code in RETRY_STATUSES:
+                    print(f"Warning: could not send {count} n8n metrics ({exc}); retrying")
+                    return 0
+                self._dead_letter(exc)
+                count = 0
+            except (urllib.error.URLError, OSError, ValueError) as exc:
+                self.stats["send_errors"] += 1
+                print(f"Warning: could not send {count} n8n metrics ({exc}); retrying")
+                return 0
+            else:
+                self.stats["records"] += count
+                self.stats["batches"] += 1
+            self.pending = []
+        if self.position is not None:
+            self.save()
+        return count
+
+    def _dead_letter(self, exc: urllib.error.HTTPError):
+        """Set aside a batch the backend refused outright; resending it would fail the same way"""
+        try:
+            body = exc.read().decode("utf-8", "replace")[:500]
+        except OSError:
+            body = ""
+        self.stats["dead_lettered"] += len(self.pending)
+        where = f"moved them to {self.dead_letter_path}" if self.dead_letter_path else "dropped them"
+        print(f"Warning: backend refused {len(self.pending)} n8n metrics ({exc}: {body}); {where}")
+        if self.dead_letter_path is None:
+            return
+        entry = {"at": datetime.now(timezone.utc).isoformat(), "status": exc.code, "error": body,
+                 "records": self.pending}
+        with open(self.dead_letter_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def follow(self, interval: float = 2.0):
+        while True:
+            self.poll()
+            time.sleep(interval)
+
+
+def print_records(records: List[dict]):
+    for record in records:
+        print(json.dumps(record))
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", default="n8n_data", help="directory holding n8nEventLog*.log")
+    parser.add_argument("--api", default=os.getenv("API_URL", "http://localhost:8000"), help="backend base URL")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <path>/.n8n_ingest.json)")
+    parser.add_argument("--dead-letter", help="batches the backend refuses (default: <path>/.n8n_ingest.rejected.jsonl)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between polls")
+    parser.add_argument("--max-open", type=int, default=10000, help="executions tracked at once")
+    parser.add_argument("--from-end", action="store_true", help="without a checkpoint, skip existing history")
+    parser.add_argument("--once", action="store_true", help="ingest what is there and exit")
+    parser.add_argument("--dry-run", action="store_true", help="print records instead of sending them")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or (None if args.dry_run else os.path.join(args.path, ".n8n_ingest.json"))
+    sink = print_records if args.dry_run else post_metrics(args.api)
+    dead_letter = args.dead_letter or (None if args.dry_run else os.path.join(args.path, ".n8n_ingest.rejected.jsonl"))
+    follower = LogFollower(args.path, checkpoint, sink, args.batch_size, args.max_open, args.from_end, dead_letter)
+    if args.once:
+        follower.poll()
+        print(json.dumps(follower.stats), file=sys.stderr)
+        return
+    try:
+        follower.follow(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    run()
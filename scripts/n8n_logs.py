@@ -0,0 +1,297 @@
+"""
+Latency profile of the n8n orchestration layer from its event logs.
+
+n8n writes one JSON event per line to n8n_data/n8nEventLog.log and rotates
+it to n8nEventLog-1.log, -2, -3 (-1 is the newest rotated segment). This
+reads the segments oldest first as a stream, pairs every
+`n8n.node.started` with its `n8n.node.finished` (same executionId and
+nodeName; loop nodes run many times per execution, so starts queue up
+FIFO) and every `n8n.workflow.started` with its success/failed event.
+
+Durations go into log-bucketed histograms (about 2% relative error), so
+memory is bounded by the number of distinct workflows, node types and node
+names plus the executions still open, never by the size of the logs. An
+execution's unmatched node starts are dropped when the workflow ends, and
+at most --max-open executions are tracked at once.
+
+The report lists p50/p95/p99 per workflow, node type and node, failure
+rates per workflow and the share of workflow time each node type takes,
+e.g. how much of every cycle the HTTP Request nodes spend waiting on the
+brain's /analyze.
+
+Usage: python scripts/n8n_logs.py [n8n_data] [--by type|node|all] [--json report.json]
+"""
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import glob
+import json
+import math
+import os
+import re
+
+LOG_NAME = re.compile(r"n8nEventLog(?:-(\d+))?\.log$")
+
+# Histogram resolution: bucket i covers [GROWTH**i, GROWTH**(i+1)) ms
+GROWTH = 1.04
+
+
+def log_files(path: str) -> List[str]:
+    """Event log segments under `path` (a directory or one file), oldest first"""
+    if os.path.isfile(path):
+        return [path]
+    segments = []
+    for name in glob.glob(os.path.join(path, "n8nEventLog*.log")):
+        match = LOG_NAME.search(os.path.basename(name))
+        if match:
+            # No suffix is the live file (newest); higher suffixes are older
+            segments.append((-int(match.group(1) or 0), name))
+    return [name for _, name in sorted(segments)]
+
+
+def read_events(paths: Iterable[str], stats: Optional[dict] = None) -> Iterator[dict]:
+    """Decoded events of every file in order; undecodable lines are counted and skipped"""
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    if stats is not None:
+                        stats["bad_lines"] = stats.get("bad_lines", 0) + 1
+                    continue
+                if isinstance(event, dict):
+                    yield event
+
+
+def parse_ts(value: str) -> float:
+    """Epoch seconds of an n8n timestamp such as 2026-01-03T13:29:30.716+00:00"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+# ==================== HISTOGRAM ====================
+
+class LatencyHistogram:
+    """Constant-memory duration histogram (ms) with approximate quantiles"""
+
+    __slots__ = ("buckets", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, ms: float):
+        ms = max(ms, 0.0)
+        self.buckets[int(math.log(ms, GROWTH)) if ms >= 1 else -1] += 1
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                if index < 0:
+                    return min(self.max, 1.0)
+                # Midpoint of the bucket, clamped to what was actually seen
+                mid = GROWTH ** index * (1 + GROWTH) / 2
+                return max(self.min, min(self.max, mid))
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 1),
+            "mean_ms": round(self.total / self.count, 1) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.50), 1),
+            "p95_ms": round(self.quantile(0.95), 1),
+            "p99_ms": round(self.quantile(0.99), 1),
+            "max_ms": round(self.max, 1),
+        }
+
+
+# ==================== PROFILE ====================
+
+class _Execution:
+    __slots__ = ("workflow", "started", "open_nodes")
+
+    def __init__(self, workflow: str, started: Optional[float]):
+        self.workflow = workflow
+        self.started = started
+        self.open_nodes: Dict[str, deque] = defaultdict(deque)  # nodeName -> start times
+
+
+class Profile:
+    """Feed events in log order; `report()` summarizes everything seen so far"""
+
+    def __init__(self, max_open: int = 10000):
+        self.max_open = max_open
+        self._executions: "OrderedDict[str, _Execution]" = OrderedDict()
+        self.by_type = defaultdict(LatencyHistogram)
+        self.by_node = defaultdict(LatencyHistogram)  # (workflow, nodeName, nodeType)
+        self.by_workflow = defaultdict(LatencyHistogram)
+        # workflow -> nodeType -> ms spent in nodes of that type (finished executions)
+        self.workflow_node_ms = defaultdict(lambda: defaultdict(float))
+        self.outcomes = defaultdict(lambda: defaultdict(int))  # workflow -> outcome -> n
+        self.failed_at = defaultdict(int)  # (workflow, lastNodeExecuted) -> n
+        self.stats = {"events": 0, "unmatched_finishes": 0, "unfinished_nodes": 0, "evicted_executions": 0}
+
+    def _execution(self, execution_id: str, workflow: str, ts: Optional[float]) -> _Execution:
+        execution = self._executions.get(execution_id)
+        if execution is None:
+            execution = self._executions[execution_id] = _Execution(workflow, ts)
+            if len(self._executions) > self.max_open:
+                _, dropped = self._executions.popitem(last=False)
+                self.stats["evicted_executions"] += 1
+                self.stats["unfinished_nodes"] += sum(map(len, dropped.open_nodes.values()))
+        return execution
+
+    def feed(self, event: dict):
+        name = event.get("eventName")
+        if not name or not name.startswith("n8n.node.") and not name.startswith("n8n.workflow."):
+            return
+        payload = event.get("payload") or {}
+        execution_id = payload.get("executionId")
+        if execution_id is None or "ts" not in event:
+            return
+        self.stats["events"] += 1
+        ts = parse_ts(event["ts"])
+        workflow = payload.get("workflowName") or payload.get("workflowId") or "?"
+
+        if name == "n8n.node.started":
+            execution = self._execution(execution_id, workflow, None)
+            execution.open_nodes[payload.get("nodeName")].append(ts)
+        elif name == "n8n.node.finished":
+            execution = self._executions.get(execution_id)
+            starts = execution.open_nodes.get(payload.get("nodeName")) if execution else None
+            if not starts:
+                self.stats["unmatched_finishes"] += 1
+                return
+            ms = (ts - starts.popleft()) * 1000
+            node_type = payload.get("nodeType") or "?"
+            self.by_type[node_type].add(ms)
+            self.by_node[(workflow, payload.get("nodeName"), node_type)].add(ms)
+            self.workflow_node_ms[workflow][node_type] += ms
+        elif name == "n8n.workflow.started":
+            self._execution(execution_id, workflow, ts).started = ts
+        elif name in ("n8n.workflow.success", "n8n.workflow.failed"):
+            outcome = "success" if name.endswith("success") else "failed"
+            self.outcomes[workflow][outcome] += 1
+            if outcome == "failed":
+                self.failed_at[(workflow, payload.get("lastNodeExecuted") or "?")] += 1
+            execution = self._executions.pop(execution_id, None)
+            if execution is None:
+                return
+            self.stats["unfinished_nodes"] += sum(map(len, execution.open_nodes.values()))
+            if execution.started is not None:
+                self.by_workflow[workflow].add((ts - execution.started) * 1000)
+
+    def report(self) -> dict:
+        workflows = {}
+        for workflow in sorted(set(self.by_workflow) | set(self.outcomes)):
+            outcomes = self.outcomes[workflow]
+            ended = outcomes["success"] + outcomes["failed"]
+            hist = self.by_workflow[workflow]
+            share = {node_type: round(ms / hist.total, 4) if hist.total else 0.0
+                     for node_type, ms in sorted(self.workflow_node_ms[workflow].items(), key=lambda kv: -kv[1])}
+            workflows[workflow] = {
+                **hist.summary(),
+                "success": outcomes["success"],
+                "failed": outcomes["failed"],
+                "failure_rate": round(outcomes["failed"] / ended, 4) if ended else 0.0,
+                "failed_at": {node: n for (wf, node), n in self.failed_at.items() if wf == workflow},
+                "time_share_by_node_type": share,
+            }
+        return {
+            "workflows": workflows,
+            "node_types": {t: h.summary() for t, h in sorted(self.by_type.items())},
+            "nodes": [{"workflow": wf, "node": node, "type": t, **h.summary()}
+                      for (wf, node, t), h in sorted(self.by_node.items(), key=lambda kv: -kv[1].total)],
+            "stats": {**self.stats, "open_executions": len(self._executions)},
+        }
+
+
+def profile_logs(path: str, max_open: int = 10000) -> Tuple[dict, List[str]]:
+    files = log_files(path)
+    read_stats = {}
+    profile = Profile(max_open)
+    for event in read_events(files, read_stats):
+        profile.feed(event)
+    report = profile.report()
+    report["stats"].update(read_stats)
+    return report, files
+
+
+# ==================== CLI ====================
+
+def _row(label: str, summary: dict, width: int, extra: str = "") -> str:
+    return (f"  {label:<{width}} {summary['count']:>7} {summary['p50_ms']:>10.1f} {summary['p95_ms']:>10.1f} "
+            f"{summary['p99_ms']:>10.1f} {summary['max_ms']:>10.1f}{extra}")
+
+
+def _header(title: str, width: int, extra: str = "") -> str:
+    return (f"\n{title}\n  {'':<{width}} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} "
+            f"{'p99 ms':>10} {'max ms':>10}{extra}")
+
+
+def print_report(report: dict, files: List[str], by: str):
+    print("Read " + ", ".join(os.path.basename(f) for f in files))
+    stats = report["stats"]
+    print("  " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+    workflows = report["workflows"]
+    width = max([len(w) for w in workflows] + [20])
+    print(_header("Workflows (execution duration)", width, f" {'failed':>8}"))
+    for workflow, summary in workflows.items():
+        ended = summary["success"] + summary["failed"]
+        print(_row(workflow, summary, width, f" {summary['failed']:>3}/{ended:<3} ({summary['failure_rate']:.0%})"))
+        for node, n in sorted(summary["failed_at"].items(), key=lambda kv: -kv[1]):
+            print(f"  {'':<{width}}   failed at {node}: {n}")
+        for node_type, share in summary["time_share_by_node_type"].items():
+            print(f"  {'':<{width}}   {share:>6.1%} of the time in {node_type}")
+
+    if by in ("type", "all"):
+        types = report["node_types"]
+        width = max([len(t) for t in types] + [20])
+        print(_header("Node types", width))
+        for node_type, summary in types.items():
+            print(_row(node_type, summary, width))
+
+    if by in ("node", "all"):
+        labels = [f"{n['workflow']} / {n['node']}" for n in report["nodes"]]
+        width = max([len(label) for label in labels] + [20])
+        print(_header("Nodes (by total time)", width, f" {'type':>8}"))
+        for label, node in zip(labels, report["nodes"]):
+            print(_row(label, node, width, f"  {node['type']}"))
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", default="n8n_data", help="n8n_data directory or one log file")
+    parser.add_argument("--by", choices=("type", "node", "all"), default="all")
+    parser.add_argument("--max-open", type=int, default=10000, help="executions tracked at once")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report, files = profile_logs(args.path, args.max_open)
+    if not files:
+        parser.exit(1, f"no n8nEventLog*.log files under {args.path}\n")
+    print_report(report, files, args.by)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    run()